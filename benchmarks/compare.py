@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+"""
+Compares two result files of run.py, for example of two commits.
+"""
+
+import json
+
+
+def compare_results(old, new):
+    """
+    Returns (name, old best, new best, ratio) of the benchmarks in both
+    results, the ratio new / old, so below 1 is faster.
+    """
+    rows = []
+    for name, result in new['benchmarks'].items():
+        if name not in old['benchmarks']:
+            continue
+        old_best = old['benchmarks'][name]['best']
+        rows.append((name, old_best, result['best'], result['best'] / old_best if old_best else None))
+    return rows
+
+
+def format_comparison(old, new):
+    """
+    Returns the lines of a comparison for the console, with a warning for
+    every parameter the results were run with that differs.
+    """
+    lines = []
+    for parameter in sorted(set(old['parameters']) | set(new['parameters'])):
+        if old['parameters'].get(parameter) != new['parameters'].get(parameter):
+            lines.append("warning: %s differs: %s and %s" % (parameter, old['parameters'].get(parameter),
+                                                             new['parameters'].get(parameter)))
+    lines.append("%-32s %12s %12s %8s" % ('benchmark', 'old', 'new', 'new/old'))
+    for name, old_best, new_best, ratio in compare_results(old, new):
+        lines.append("%-32s %10.4f s %10.4f s %8s" % (name, old_best, new_best,
+                                                        '%.2f' % ratio if ratio is not None else '-'))
+    return lines
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument('old', help="Result file of the baseline")
+    parser.add_argument('new', help="Result file to compare with it")
+    args = parser.parse_args()
+
+    with open(args.old, encoding='utf-8') as old_file, open(args.new, encoding='utf-8') as new_file:
+        old, new = json.load(old_file), json.load(new_file)
+    for line in format_comparison(old, new):
+        print(line)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+"""
+Micro-benchmark for joining the segments of a way (glom_all) on synthetic
+ways. Each way is a single chain of segments, shuffled and with random
+segments reversed, like the EDGES of a long county road.
+
+The quadratic glom_once() loop that glom_all used to run is timed alongside
+for comparison, up to --max-legacy segments.
+"""
+
+import os
+import sys
+import random
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from lib.helpers import glom_all, glom_once
+
+
+def synthetic_way(num_segments, points_per_segment=4, seed=0):
+    """
+    Returns the shuffled segments of one way with num_segments segments.
+    """
+    rnd = random.Random(seed)
+    lon, lat = -76.5, 36.3
+    segments = []
+    for _ in range(num_segments):
+        segment = [(lon, lat)]
+        for _ in range(points_per_segment - 1):
+            lon += rnd.uniform(0.0001, 0.001)
+            lat += rnd.uniform(-0.001, 0.001)
+            segment.append((lon, lat))
+        if rnd.random() < 0.5:
+            segment.reverse()
+        segments.append(segment)
+    rnd.shuffle(segments)
+    return segments
+
+
+def legacy_glom_all(segments):
+    unsorted = segments
+    chunks = []
+    while unsorted != []:
+        chunk, unsorted = glom_once(unsorted)
+        chunks.append(chunk)
+    return chunks
+
+
+def best_of(func, segments, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(segments)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark glom_all on synthetic ways.")
+    parser.add_argument('sizes', nargs='*', type=int, default=[10, 100, 10000],
+                        help="Number of segments per way")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per size, the best is reported")
+    parser.add_argument('--max-legacy', type=int, default=1000,
+                        help="Largest way to also time with the quadratic glom_once loop")
+    args = parser.parse_args()
+
+    print("%10s %14s %14s" % ('segments', 'glom_all (s)', 'legacy (s)'))
+    for size in args.sizes:
+        segments = synthetic_way(size)
+        elapsed, chunks = best_of(glom_all, segments, args.repeat)
+        assert len(chunks) == 1, "synthetic way should join into a single chain"
+        if size <= args.max_legacy:
+            legacy_elapsed, legacy_chunks = best_of(legacy_glom_all, segments, args.repeat)
+            assert legacy_chunks == chunks
+            legacy = "%14.6f" % legacy_elapsed
+        else:
+            legacy = "%14s" % 'skipped'
+        print("%10d %14.6f %s" % (size, elapsed, legacy))
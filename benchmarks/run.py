@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+
+"""
+Runs the benchmark suite and saves the results as JSON.
+
+Function benchmarks time one step of the conversion on a synthetic county
+(see synthetic.py) held in memory: joining segments (glom_all), building
+the node and way lists, the address ways as ranges and as house numbers,
+interpolating along lines, and the centroids of the ranges.
+End-to-end benchmarks convert the synthetic county and the Perquimans
+fixture from the shapefile, like the CLI scripts do.
+
+Every benchmark runs --repeat times, best and median are reported. Results
+are written to benchmarks/results/<commit>.json unless --output is given.
+Pass a saved result to --compare to see the change against it, or compare
+two saved results with compare.py.
+"""
+
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from benchmarks.synthetic import generate_features, write_shapefile, write_zip_db
+from benchmarks.glom_all import synthetic_way
+from benchmarks.compare import format_comparison
+from lib.parse import get_tags_from_values, iter_shp_for_geom_and_tags
+from lib.nodes import NodeStore
+from lib.convert import compile_lists, addressways, collect_points, collect_segment, way_attributes, \
+                        cumulative_lengths, interpolate_along_line
+from lib.centroids import collect_midpoints, centroid, street_key, postcode_key
+from lib.helpers import glom_all
+from lib.output import write_to_csv, RANGE_FIELDNAMES
+from lib.pipeline import convert_file
+from lib.zip_code_lookup import ZipCodeLookup
+
+FIXTURE = os.path.join(ROOT, 'tests', 'fixtures', 'tl_2020_37143_edges', 'tl_2020_37143_edges.shp')
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+# Segments of the single long way of the glom_all_long_way benchmark
+LONG_WAY_SEGMENTS = 10000
+
+# House numbers interpolated along every line by interpolate_along_line
+HOUSES_PER_LINE = 50
+
+
+class Data:
+    """
+    The synthetic county of a run, generated once for all benchmarks.
+    """
+
+    def __init__(self, workdir, args):
+        self.workdir = workdir
+        self.args = args
+        raw_features, zips = generate_features(args.features, args.vertices_per_edge,
+                                               args.segments_per_tlid, args.range_width, seed=args.seed)
+        self.shp_filename = os.path.join(workdir, 'tl_2020_37143_edges.shp')
+        write_shapefile(self.shp_filename, raw_features)
+        zip_filename = os.path.join(workdir, 'zip_db.csv')
+        write_zip_db(zip_filename, zips)
+        self.zip_lookup = ZipCodeLookup(zip_filename)
+
+        # The features as iter_shp_for_geom_and_tags() returns them
+        self.features = [(points, get_tags_from_values(attributes, '37143')) for points, attributes in raw_features]
+
+        with quiet():
+            self.i, self.nodes, self.waylist = compile_lists(iter(self.features))
+        self.vertices = sum(len(points) for points, _tags in self.features)
+
+        self.ranges_csv = os.path.join(workdir, 'ranges.csv')
+        with quiet():
+            write_to_csv(self.ranges_csv, addressways(self.waylist, self.nodes, self.i, self.zip_lookup, True),
+                         RANGE_FIELDNAMES)
+
+
+@contextlib.contextmanager
+def quiet():
+    """
+    Swallows the progress messages of the converter and the centroids.
+    """
+    logging.disable(logging.WARNING)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        logging.disable(logging.NOTSET)
+
+
+def bench_glom_all(data):
+    # The segments of every way as node indexes, joined like glom_waylist() does
+    nodes = NodeStore()
+    waylist = {}
+    for geom, tags in data.features:
+        collect_segment(waylist, collect_points(nodes, geom), way_attributes(tags))
+    ways = [segments for tlid_ways in waylist.values() for _attributes, segments in tlid_ways]
+
+    def run():
+        for segments in ways:
+            glom_all(segments, key=None)
+    return run, sum(len(segments) for segments in ways), 'segments'
+
+
+def bench_glom_all_long_way(_data):
+    segments = synthetic_way(LONG_WAY_SEGMENTS)
+    return lambda: glom_all(segments), LONG_WAY_SEGMENTS, 'segments'
+
+
+def bench_compile_lists(data):
+    return lambda: compile_lists(iter(data.features)), data.vertices, 'vertices'
+
+
+def bench_addressways_ranges(data):
+    def run():
+        return sum(1 for _row in addressways(data.waylist, data.nodes, data.i, data.zip_lookup, True))
+    return run, len(data.waylist), 'ways'
+
+
+def bench_addressways_ranges_vectorized(data):
+    def run():
+        return sum(1 for _row in addressways(data.waylist, data.nodes, data.i, data.zip_lookup, True, True))
+    return run, len(data.waylist), 'ways'
+
+
+def bench_addressways_points(data):
+    def run():
+        return sum(1 for _row in addressways(data.waylist, data.nodes, data.i, data.zip_lookup, False))
+    return run, len(data.waylist), 'ways'
+
+
+def bench_interpolate_along_line(data):
+    lines = []
+    for ways in data.waylist.values():
+        for _attributes, segments in ways:
+            for segment in segments:
+                lines.append([data.nodes.coordinates(index) for index in segment])
+
+    def run():
+        for line in lines:
+            lengths = cumulative_lengths(line)
+            for hnr in range(HOUSES_PER_LINE):
+                interpolate_along_line(line, 0, HOUSES_PER_LINE - 1, hnr, lengths)
+    return run, len(lines) * HOUSES_PER_LINE, 'house numbers'
+
+
+def bench_centroids(data):
+    def run():
+        with quiet():
+            streets, postcodes = collect_midpoints(data.ranges_csv, [street_key, postcode_key])
+            for summary in (streets, postcodes):
+                for key, points in summary.items():
+                    centroid(key, points.points())
+    with open(data.ranges_csv, encoding='utf-8') as file:
+        ranges = sum(1 for _line in file) - 1
+    return run, ranges, 'ranges'
+
+
+def end_to_end(dataset, compile_as_ranges):
+    """
+    Returns a benchmark converting the 'synthetic' county or the 'fixture'.
+    """
+    def factory(data):
+        if dataset == 'fixture':
+            shp_filename = FIXTURE
+            features = sum(1 for _feature in iter_shp_for_geom_and_tags(FIXTURE))
+        else:
+            shp_filename = data.shp_filename
+            features = len(data.features)
+        output = os.path.join(data.workdir, 'end_to_end.csv')
+
+        def run():
+            with quiet():
+                convert_file(shp_filename, output, data.zip_lookup, compile_as_ranges)
+        return run, features, 'features'
+    return factory
+
+
+BENCHMARKS = {
+    'glom_all': bench_glom_all,
+    'glom_all_long_way': bench_glom_all_long_way,
+    'compile_lists': bench_compile_lists,
+    'addressways_ranges': bench_addressways_ranges,
+    'addressways_ranges_vectorized': bench_addressways_ranges_vectorized,
+    'addressways_points': bench_addressways_points,
+    'interpolate_along_line': bench_interpolate_along_line,
+    'centroids': bench_centroids,
+    'convert_ranges_synthetic': end_to_end('synthetic', True),
+    'convert_points_synthetic': end_to_end('synthetic', False),
+    'convert_ranges_fixture': end_to_end('fixture', True),
+    'convert_points_fixture': end_to_end('fixture', False),
+}
+
+
+def run_benchmark(factory, data, repeat):
+    """
+    Returns the timings of a benchmark as a dict.
+    """
+    func, items, unit = factory(data)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    return {
+        'best': best,
+        'median': statistics.median(timings),
+        'timings': timings,
+        'items': items,
+        'unit': unit,
+        'items_per_second': items / best if best else None,
+    }
+
+
+def git_commit():
+    """
+    Returns the commit of the working tree, with '+dirty' if it has changes,
+    or None outside of a git checkout.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ('+dirty' if status else '')
+
+
+def run(args):
+    """
+    Runs the selected benchmarks, returns the results as a dict.
+    """
+    names = [name for name in BENCHMARKS if not args.only or any(part in name for part in args.only)]
+    results = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'parameters': {
+            'features': args.features,
+            'vertices_per_edge': args.vertices_per_edge,
+            'segments_per_tlid': args.segments_per_tlid,
+            'range_width': args.range_width,
+            'seed': args.seed,
+            'repeat': args.repeat,
+        },
+        'benchmarks': {},
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        data = Data(workdir, args)
+        for name in names:
+            result = run_benchmark(BENCHMARKS[name], data, args.repeat)
+            results['benchmarks'][name] = result
+            print("%-32s %10.4f s %10.4f s %12.0f %s/s" % (
+                name, result['best'], result['median'], result['items_per_second'] or 0, result['unit']))
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the benchmarks and save the results as JSON.")
+    parser.add_argument('--features', type=int, default=20000,
+                        help="Features of the synthetic county (default: %(default)s)")
+    parser.add_argument('--vertices-per-edge', type=int, default=8,
+                        help="Vertices of every feature (default: %(default)s)")
+    parser.add_argument('--segments-per-tlid', type=int, default=2,
+                        help="Features of every TLID (default: %(default)s)")
+    parser.add_argument('--range-width', type=int, default=100,
+                        help="Width of the address ranges (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed (default: %(default)s)")
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="Runs per benchmark, the best and the median are reported (default: %(default)s)")
+    parser.add_argument('--only', nargs='+', metavar='NAME',
+                        help="Only run the benchmarks whose name contains one of these, of: %s"
+                             % ", ".join(BENCHMARKS))
+    parser.add_argument('--output', help="Result file (default: %s/<commit>.json)" % os.path.relpath(RESULTS_DIR))
+    parser.add_argument('--compare', metavar='FILE', help="Compare the results with a saved result file")
+    args = parser.parse_args()
+
+    print("%-32s %12s %12s %14s" % ('benchmark', 'best', 'median', 'throughput'))
+    results = run(args)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, '%s.json' % (results['commit'] or time.strftime('%Y%m%d-%H%M%S')))
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2)
+        file.write('\n')
+    print("results written to %s" % output)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            baseline = json.load(file)
+        for line in format_comparison(baseline, results):
+            print(line)
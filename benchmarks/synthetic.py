@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+
+"""
+Generates synthetic TIGER EDGES-like shapefiles of a configurable size.
+
+Streets are random walks through a county-sized area in NAD83 degrees.
+Every street is cut into TLIDs, every TLID into --segments-per-tlid
+features (shuffled and partly reversed, like the EDGES of a long road)
+of --vertices-per-edge vertices each. The next TLID of a street starts
+where the last one ended, so ways share nodes like real streets do.
+
+Address ranges are --range-width wide: odd on the right, even on the
+left, some descending, some with a missing side and some without any.
+The shapefile is written with the standard library only, together with a
+ZIP code CSV for the ZIP codes used.
+
+The same arguments and --seed always give the same files.
+"""
+
+import csv
+import math
+import os
+import random
+import struct
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from lib.convert import PROJCS_WKT
+
+# Attributes of the features: dBASE name, type, length
+FIELDS = [
+    ('TLID', 'N', 10),
+    ('FULLNAME', 'C', 100),
+    ('LFROMHN', 'C', 12),
+    ('LTOHN', 'C', 12),
+    ('RFROMHN', 'C', 12),
+    ('RTOHN', 'C', 12),
+    ('ZIPL', 'C', 5),
+    ('ZIPR', 'C', 5),
+    ('PLUS4L', 'C', 4),
+    ('PLUS4R', 'C', 4),
+]
+
+STREET_NAMES = ['Main', 'Oak', 'Pine', 'Maple', 'Cedar', 'Elm', 'Church', 'Mill', 'Hickory', 'Holly',
+                'Lake', 'Hill', 'River', 'Park', 'Spring', 'Walnut']
+STREET_TYPES = ['St', 'Rd', 'Ave', 'Ln', 'Dr', 'Ct']
+
+# South west corner and size, in degrees, of the area the streets are in
+ORIGIN = (-76.6, 36.1)
+EXTENT = 0.4
+
+# Shares of the TLIDs with a descending range, a missing side, no range
+DESCENDING_RATIO = 0.2
+ONE_SIDED_RATIO = 0.1
+NO_RANGE_RATIO = 0.2
+
+SHAPE_POLYLINE = 3
+
+# Date of the last update in the .dbf header, fixed so files are reproducible
+DBF_DATE = (120, 1, 1)
+
+
+def generate_features(num_features, vertices_per_edge=8, segments_per_tlid=1, range_width=100,
+                      tlids_per_street=10, num_zips=20, seed=0):
+    """
+    Returns the features as (points, attributes) tuples, attributes keyed
+    by the names of FIELDS (blank ones left out, as they read back as
+    null), and the ZIP codes used.
+    """
+    rnd = random.Random(seed)
+    zips = ['%05d' % (27000 + 37 * i) for i in range(num_zips)]
+    features = []
+    tlid = 100000000
+    step = EXTENT / 2000
+
+    while len(features) < num_features:
+        name = '%s %s' % (rnd.choice(STREET_NAMES), rnd.choice(STREET_TYPES))
+        if rnd.random() < 0.3:
+            name = '%s %s' % (rnd.choice(['N', 'S', 'E', 'W']), name)
+        position = (ORIGIN[0] + rnd.random() * EXTENT, ORIGIN[1] + rnd.random() * EXTENT)
+        heading = rnd.uniform(-3.14, 3.14)
+        zip_code = rnd.choice(zips)
+        number = rnd.randrange(1, 50) * 100
+
+        for _ in range(tlids_per_street):
+            if len(features) >= num_features:
+                break
+            tlid += 1
+            attributes = address_range(rnd, tlid, name, zip_code, number, range_width)
+            number += 2 * range_width
+
+            segments = []
+            for _ in range(segments_per_tlid):
+                segment = [position]
+                for _ in range(vertices_per_edge - 1):
+                    heading += rnd.uniform(-0.3, 0.3)
+                    x, y = position
+                    position = (x + step * rnd.uniform(0.5, 1.5) * math.cos(heading),
+                                y + step * rnd.uniform(0.5, 1.5) * math.sin(heading))
+                    segment.append(position)
+                if rnd.random() < 0.5:
+                    segment.reverse()
+                segments.append(segment)
+            rnd.shuffle(segments)
+            features.extend((segment, attributes) for segment in segments)
+
+    return features[:num_features], zips
+
+
+def address_range(rnd, tlid, name, zip_code, number, range_width):
+    """
+    Returns the attributes of a TLID with house numbers from number on.
+    """
+    attributes = {'TLID': tlid, 'FULLNAME': name, 'ZIPL': zip_code, 'ZIPR': zip_code}
+    if rnd.random() < NO_RANGE_RATIO:
+        return attributes
+
+    right = (number + 1, number + range_width - 1)
+    left = (number, number + range_width - 2)
+    if rnd.random() < DESCENDING_RATIO:
+        right, left = right[::-1], left[::-1]
+    sides = [('R', right), ('L', left)]
+    if rnd.random() < ONE_SIDED_RATIO:
+        sides.pop(rnd.randrange(2))
+    for side, (from_hnr, to_hnr) in sides:
+        attributes[side + 'FROMHN'] = str(from_hnr)
+        attributes[side + 'TOHN'] = str(to_hnr)
+    return attributes
+
+
+def write_shapefile(shp_filename, features):
+    """
+    Writes (points, attributes) features as a PolyLine shapefile with the
+    .shx, .dbf and .prj files next to it.
+    """
+    base = os.path.splitext(shp_filename)[0]
+
+    records = []
+    for points, _attributes in features:
+        xs = [x for x, _y in points]
+        ys = [y for _x, y in points]
+        content = struct.pack('<i4dii', SHAPE_POLYLINE, min(xs), min(ys), max(xs), max(ys), 1, len(points))
+        content += struct.pack('<i', 0)
+        content += b''.join(struct.pack('<2d', x, y) for x, y in points)
+        records.append(content)
+
+    all_x = [x for points, _attributes in features for x, _y in points]
+    all_y = [y for points, _attributes in features for _x, y in points]
+    bbox = (min(all_x), min(all_y), max(all_x), max(all_y)) if features else (0.0, 0.0, 0.0, 0.0)
+
+    shp_length = 100 + sum(8 + len(content) for content in records)
+    with open(base + '.shp', 'wb') as shp, open(base + '.shx', 'wb') as shx:
+        shp.write(_shapefile_header(shp_length, bbox))
+        shx.write(_shapefile_header(100 + 8 * len(records), bbox))
+        offset = 100
+        for number, content in enumerate(records, 1):
+            shp.write(struct.pack('>ii', number, len(content) // 2))
+            shp.write(content)
+            shx.write(struct.pack('>ii', offset // 2, len(content) // 2))
+            offset += 8 + len(content)
+
+    write_dbf(base + '.dbf', [attributes for _points, attributes in features])
+
+    with open(base + '.prj', 'w', encoding='ascii') as prj:
+        prj.write(' '.join(PROJCS_WKT.split()))
+
+
+def _shapefile_header(length, bbox):
+    return struct.pack('>i5ii', 9994, 0, 0, 0, 0, 0, length // 2) \
+        + struct.pack('<ii', 1000, SHAPE_POLYLINE) \
+        + struct.pack('<8d', *bbox, 0.0, 0.0, 0.0, 0.0)
+
+
+def write_dbf(dbf_filename, rows):
+    """
+    Writes the attributes of the features as a dBASE III table.
+    """
+    record_length = 1 + sum(length for _name, _type, length in FIELDS)
+    header_length = 32 + 32 * len(FIELDS) + 1
+    with open(dbf_filename, 'wb') as dbf:
+        dbf.write(struct.pack('<B3BIHH20x', 3, *DBF_DATE, len(rows), header_length, record_length))
+        for name, field_type, length in FIELDS:
+            dbf.write(struct.pack('<11sc4xBB14x', name.encode('ascii'), field_type.encode('ascii'), length, 0))
+        dbf.write(b'\r')
+        for row in rows:
+            record = [b' ']
+            for name, field_type, length in FIELDS:
+                value = row.get(name)
+                value = '' if value is None else str(value)
+                if field_type == 'N':
+                    record.append(value.rjust(length).encode('ascii'))
+                else:
+                    record.append(value.ljust(length).encode('utf-8')[:length])
+            dbf.write(b''.join(record))
+        dbf.write(b'\x1a')
+
+
+def write_zip_db(csv_filename, zips):
+    """
+    Writes a ZIP code database with a city for every ZIP code.
+    """
+    with open(csv_filename, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(['zip', 'primary_city', 'acceptable_cities', 'unacceptable_cities', 'state', 'county'])
+        for number, zip_code in enumerate(zips):
+            writer.writerow([zip_code, 'City %d' % number, '', '', 'NC', 'Perquimans County'])
+
+
+def generate(output_dir, num_features, vertices_per_edge=8, segments_per_tlid=1, range_width=100,
+             fips='37143', seed=0):
+    """
+    Writes a synthetic county to output_dir. Returns the paths of the
+    shapefile and of the ZIP code CSV.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    features, zips = generate_features(num_features, vertices_per_edge, segments_per_tlid, range_width,
+                                       seed=seed)
+    shp_filename = os.path.join(output_dir, 'tl_2020_%s_edges.shp' % fips)
+    zip_filename = os.path.join(output_dir, 'zip_db.csv')
+    write_shapefile(shp_filename, features)
+    write_zip_db(zip_filename, zips)
+    return shp_filename, zip_filename
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate a synthetic TIGER EDGES shapefile.")
+    parser.add_argument('output_dir', help="Directory for the shapefile and the ZIP code CSV")
+    parser.add_argument('--features', type=int, default=10000, help="Number of features (default: %(default)s)")
+    parser.add_argument('--vertices-per-edge', type=int, default=8,
+                        help="Vertices of every feature (default: %(default)s)")
+    parser.add_argument('--segments-per-tlid', type=int, default=1,
+                        help="Features of every TLID (default: %(default)s)")
+    parser.add_argument('--range-width', type=int, default=100,
+                        help="Width of the address ranges (default: %(default)s)")
+    parser.add_argument('--fips', default='37143', help="County FIPS code of the file name (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed (default: %(default)s)")
+    args = parser.parse_args()
+
+    shp_filename, zip_filename = generate(args.output_dir, args.features, args.vertices_per_edge,
+                                          args.segments_per_tlid, args.range_width, args.fips, args.seed)
+    print("wrote %s and %s" % (shp_filename, zip_filename))
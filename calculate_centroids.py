@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+"""
+Calculates street and postcode centroids of all range CSV files in one
+pass, reading the files in parallel.
+
+Writes streets.csv (like calculate_street_centroid.py) and postals.csv
+(like calculate_postcode_centroids.py) for all files together.
+"""
+
+import glob
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from lib.centroids import collect_midpoints, merge_midpoints, street_key, postcode_key, \
+                          write_street_centroids, write_postcode_centroids
+
+LOG = logging.getLogger()
+LOG.setLevel(logging.WARNING)
+
+def collect_file(input_file, max_points=None):
+    return collect_midpoints(input_file, [street_key, postcode_key], max_points)
+
+def process_files(input_files, output_dir, workers=None, max_points=None):
+    os.makedirs(output_dir, exist_ok=True)
+
+    street_summary = {}
+    postal_summary = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Merged in the order of the files, so the result doesn't depend
+        # on which worker finishes first
+        for streets, postals in executor.map(partial(collect_file, max_points=max_points), input_files):
+            merge_midpoints(street_summary, streets, max_points)
+            merge_midpoints(postal_summary, postals, max_points)
+
+    write_street_centroids(street_summary, os.path.join(output_dir, 'streets.csv'))
+    write_postcode_centroids(postal_summary, os.path.join(output_dir, 'postals.csv'))
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Calculate street and postcode centroids from range CSV files.")
+    parser.add_argument('inputs', nargs='+', help="Input CSV files or directories of them")
+    parser.add_argument('output_dir', help="Output directory path")
+    parser.add_argument('--workers', type=int,
+                        help="Number of worker processes (default: number of CPUs)")
+    parser.add_argument('--max-points', type=int,
+                        help="Keep a random sample of at most this many points per street "
+                             "and postcode to bound memory use (default: keep all)")
+    args = parser.parse_args()
+
+    input_files = []
+    for path in args.inputs:
+        if os.path.isdir(path):
+            input_files.extend(sorted(glob.glob(os.path.join(path, '*.csv'))))
+        else:
+            input_files.append(path)
+
+    process_files(input_files, args.output_dir, args.workers, args.max_points)
@@ -14,8 +14,6 @@ if [[ ! -d "$OUTPATH" ]]; then
 fi
 
 INREGEX='_([0-9]{5})_(addrfeat|edges).zip'
-WORKPATH="$OUTPATH/tmp-workdir/"
-mkdir -p "$WORKPATH"
 
 INFILES=($INPATH/*.zip)
 echo "Found ${#INFILES[*]} files."
@@ -24,24 +22,16 @@ echo "Found ${#INFILES[*]} files."
 NUMCPU=2
 echo "Using $NUMCPU parallel processes."
 
-export INREGEX WORKPATH OUTPATH
+export INREGEX OUTPATH
 
 process_file() {
     local F=$1
     if [[ "$F" =~ $INREGEX ]]; then
         local COUNTYID=${BASH_REMATCH[1]}_${BASH_REMATCH[2]}
-        local SHAPEFILE="$WORKPATH/$(basename "$F" '.zip').shp"
         local CSVFILE="$OUTPATH/$COUNTYID.csv"
 
-        unzip -o -q -d "$WORKPATH" "$F"
-        if [[ ! -e "$SHAPEFILE" ]]; then
-            echo "Unzip failed. $SHAPEFILE not found."
-            exit 1
-        fi
-
-        ./tiger_address_convert.py "$SHAPEFILE" "$CSVFILE"
-        local SHAPEFILE_ALL="$WORKPATH/$(basename "$F" '.zip').*"
-        rm -rf $SHAPEFILE_ALL
+        # The zip archive is read in place, no need to unpack it
+        ./tiger_address_convert.py "$F" "$CSVFILE"
     fi
 }
 
@@ -52,5 +42,3 @@ printf "%s\n" "${INFILES[@]}" | xargs -n 1 -P "$NUMCPU" -I {} bash -c 'process_f
 
 OUTFILES=($OUTPATH/*.csv)
 echo "Wrote ${#OUTFILES[*]} files."
-
-rmdir "$WORKPATH"
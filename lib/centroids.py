@@ -0,0 +1,228 @@
+"""
+Street and postcode centroids from the middle points of address ranges
+"""
+
+import csv
+import logging
+import math
+import random
+import re
+from array import array
+from collections import defaultdict
+
+import numpy as np
+
+from .helpers import linestring_midpoint
+
+LOG = logging.getLogger()
+
+# Distances from the median (in degrees) tried in turn to drop outliers
+MAX_DISTANCES = [0.1, 0.3, 0.5, 0.9]
+
+# Share of the points that have to be within one of MAX_DISTANCES
+MIN_KEEP_RATIO = 0.7
+
+STREET_FIELDNAMES = ['street', 'lat', 'lon', 'county', 'state', 'postcode']
+POSTCODE_FIELDNAMES = ['postcode', 'city', 'county', 'state', 'lat', 'lon']
+
+POSTCODE_REGEX = re.compile(r'^\d\d\d\d\d$')
+
+
+class MidpointBuffer:
+    """
+    The (lon, lat) points of one key in a flat array of doubles. With
+    max_points, only a uniform random sample of at most max_points of all
+    added points is kept (reservoir sampling), so memory per key is bounded.
+    """
+    __slots__ = ('coordinates', 'count')
+
+    def __init__(self):
+        self.coordinates = array('d')
+        # Number of points added, including those not kept
+        self.count = 0
+
+    def add(self, point, max_points=None, rng=random):
+        self.count += 1
+        if max_points is None or len(self.coordinates) < 2 * max_points:
+            self.coordinates.extend(point)
+            return
+        index = rng.randrange(self.count)
+        if index < max_points:
+            self.coordinates[2 * index] = point[0]
+            self.coordinates[2 * index + 1] = point[1]
+
+    def merge(self, other, max_points=None, rng=random):
+        """
+        Adds the points of another buffer. With max_points, the merged
+        sample picks from each buffer in proportion to the points added to it.
+        """
+        total = self.count + other.count
+        if max_points is None or len(self.coordinates) + len(other.coordinates) <= 2 * max_points:
+            self.coordinates.extend(other.coordinates)
+            self.count = total
+            return
+
+        own, others = self.points().tolist(), other.points().tolist()
+        rng.shuffle(own)
+        rng.shuffle(others)
+        own_count, other_count = self.count, other.count
+        merged = array('d')
+        while len(merged) < 2 * max_points and (own or others):
+            if others and (not own or rng.random() * (own_count + other_count) >= own_count):
+                merged.extend(others.pop())
+                other_count -= 1
+            else:
+                merged.extend(own.pop())
+                own_count -= 1
+        self.coordinates = merged
+        self.count = total
+
+    def points(self):
+        """
+        Returns the points as an (n, 2) NumPy array without copying them.
+        """
+        return np.frombuffer(self.coordinates, dtype=float).reshape(-1, 2)
+
+    def __len__(self):
+        return len(self.coordinates) // 2
+
+
+def street_key(row):
+    """
+    Returns 'street:county:state:postcode' of a range, None without street.
+    """
+    if not row['street']:
+        return None
+    return f"{row['street']}:{row['county']}:{row['state']}:{row['postcode']}".lower()
+
+
+def postcode_key(row):
+    """
+    Returns 'city:county:state:postcode' of a range, None without a valid
+    postcode.
+    """
+    postcode = row['postcode']
+    # In rare cases the postcode might be empty
+    if not postcode or not POSTCODE_REGEX.match(postcode):
+        return None
+    return f"{row['city']}:{row['county']}:{row['state']}:{postcode}".lower()
+
+
+def collect_midpoints(input_file, key_functions, max_points=None, seed=0):
+    """
+    Reads a range CSV file once and collects the middle points of the
+    ranges by the key each of key_functions returns for a row. Returns one
+    dict of key to MidpointBuffer per key function. With max_points, keep
+    a random sample of at most that many points per key.
+    """
+    summaries = [defaultdict(MidpointBuffer) for _key_function in key_functions]
+    rng = random.Random(seed)
+
+    with open(input_file, mode='r', newline='') as infile:
+        reader = csv.DictReader(infile, delimiter=';')
+
+        cnt = 0
+        for row in reader:
+            if row['geometry'] == 'geometry':  # Skip header lines if present in the middle of the file
+                continue
+
+            point = None
+            for key_function, summary in zip(key_functions, summaries):
+                key = key_function(row)
+                if key:
+                    if point is None:
+                        point = linestring_midpoint(row['geometry'])
+                    summary[key].add(point, max_points, rng)
+
+            cnt += 1
+            if cnt % 1000000 == 0:
+                LOG.warning("Processed %s lines.", cnt)
+
+        LOG.warning("%s lines read from %s.", cnt, input_file)
+
+    return summaries
+
+
+def merge_midpoints(summary, partial, max_points=None, seed=0):
+    """
+    Adds the points collected from another file to a summary.
+    """
+    rng = random.Random(seed)
+    for key, points in partial.items():
+        if key in summary:
+            summary[key].merge(points, max_points, rng)
+        else:
+            summary[key] = points
+
+
+def centroid(key, points):
+    """
+    Returns the centroid of a key's (lon, lat) points as [lon, lat], after
+    dropping outliers, or None if there are too many outliers.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    median_point = np.median(points, axis=0)
+    distances = np.sqrt(((points - median_point)**2).sum(axis=1))
+
+    for mxd in MAX_DISTANCES:
+        inside = distances < mxd
+        num_inside = int(np.count_nonzero(inside))
+        if num_inside < MIN_KEEP_RATIO * len(points):
+            continue
+
+        if num_inside < len(points):
+            LOG.warning("%s: Found %d outliers in %d points.", key, len(points) - num_inside, len(points))
+            points = points[inside]
+
+        return [math.fsum(points[:, 0]) / len(points), math.fsum(points[:, 1]) / len(points)]
+
+    LOG.warning("%s: Dropped.", key)
+    return None
+
+
+def write_street_centroids(street_summary, output_file):
+    """
+    Writes the centroids of the streets collected with street_key().
+    """
+    with open(output_file, mode='w', newline='') as outfile:
+        writer = csv.DictWriter(outfile, delimiter=',', fieldnames=STREET_FIELDNAMES, lineterminator='\n')
+        writer.writeheader()
+
+        for street in sorted(street_summary):
+            point = centroid(street, street_summary[street].points())
+            split = str(street).split(":")
+            if point is not None and len(split) == 4:
+                writer.writerow({
+                    'street': split[0],
+                    'lat': round(point[1], 6),
+                    'lon': round(point[0], 6),
+                    'county': split[1],
+                    'state': split[2],
+                    'postcode': split[3]
+                })
+
+    LOG.warning("Output written to %s", output_file)
+
+
+def write_postcode_centroids(postal_summary, output_file):
+    """
+    Writes the centroids of the postcodes collected with postcode_key().
+    """
+    with open(output_file, mode='w', newline='') as outfile:
+        writer = csv.DictWriter(outfile, delimiter=',', fieldnames=POSTCODE_FIELDNAMES, lineterminator='\n')
+        writer.writeheader()
+
+        for postcode in sorted(postal_summary):
+            point = centroid(postcode, postal_summary[postcode].points())
+            split = str(postcode).split(":")
+            if point is not None and len(split) == 4:
+                writer.writerow({
+                    'postcode': split[3],
+                    'city': split[0],
+                    'county': split[1],
+                    'state': split[2],
+                    'lat': round(point[1], 6),
+                    'lon': round(point[0], 6)
+                })
+
+    LOG.warning("Output written to %s", output_file)
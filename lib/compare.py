@@ -0,0 +1,123 @@
+"""
+Comparison of two centroid files (postcodes or streets), for example of
+two years of TIGER data
+"""
+
+import csv
+
+import numpy as np
+
+# Earth radius in meters
+EARTH_RADIUS = 6372800
+
+# Distances in meters reported as "moved more than"
+DEFAULT_THRESHOLDS = [100, 1000, 10000]
+
+DEFAULT_PERCENTILES = [50, 90, 95, 99]
+
+# Lower edges of the histogram bins of the distances, in meters
+DEFAULT_BINS = [0, 1, 10, 100, 1000, 10000, 100000]
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """
+    Returns the great circle distances in meters between two arrays of
+    points.
+    https://janakiev.com/blog/gps-points-distance-python/
+    """
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = np.radians(np.subtract(lat2, lat1))
+    dlambda = np.radians(np.subtract(lon2, lon1))
+
+    a = np.sin(dphi/2)**2 + np.cos(phi1)*np.cos(phi2)*np.sin(dlambda/2)**2
+
+    return 2*EARTH_RADIUS*np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def load_centroids(filename, key_columns=('postcode',)):
+    """
+    Reads a centroid CSV file into an array of keys, sorted, and arrays of
+    latitudes and longitudes. Keys are the key_columns joined with ':'.
+    Of rows with the same key the last one counts.
+    """
+    keys = []
+    lats = []
+    lons = []
+    with open(filename, newline='') as file:
+        reader = csv.reader(file)
+        header = next(reader)
+        key_indexes = [header.index(column) for column in key_columns]
+        lat_index = header.index('lat')
+        lon_index = header.index('lon')
+        for row in reader:
+            keys.append(':'.join([row[i] for i in key_indexes]))
+            lats.append(row[lat_index])
+            lons.append(row[lon_index])
+
+    # An object array shares the strings of the list, a str array would copy
+    # them at 4 bytes per character of the longest key
+    keys = np.array(keys, dtype=object)
+    lats = np.array(lats, dtype=float)
+    lons = np.array(lons, dtype=float)
+    # np.unique() returns the first of equal keys, so search them backwards
+    keys, index = np.unique(keys[::-1], return_index=True)
+    index = len(lats) - 1 - index
+    return keys, lats[index], lons[index]
+
+
+def compare(old, new, thresholds=DEFAULT_THRESHOLDS, percentiles=DEFAULT_PERCENTILES, bins=DEFAULT_BINS):
+    """
+    Compares two results of load_centroids(). Returns a report as a dict
+    that can be written as JSON. Distances are of the positions that moved.
+    """
+    old_keys, old_lat, old_lon = old
+    new_keys, new_lat, new_lon = new
+    _common, old_index, new_index = np.intersect1d(old_keys, new_keys, assume_unique=True, return_indices=True)
+
+    old_lat, old_lon = old_lat[old_index], old_lon[old_index]
+    new_lat, new_lon = new_lat[new_index], new_lon[new_index]
+    moved = (old_lat != new_lat) | (old_lon != new_lon)
+    distances = haversine(old_lat[moved], old_lon[moved], new_lat[moved], new_lon[moved])
+
+    bins = sorted(bins)
+    counts = np.bincount(np.searchsorted(bins, distances, side='right'), minlength=len(bins) + 1)
+
+    return {
+        'old': len(old_keys),
+        'new': len(new_keys),
+        'added': len(new_keys) - len(old_index),
+        'deleted': len(old_keys) - len(old_index),
+        'moved': int(np.count_nonzero(moved)),
+        'moved_more_than': {str(threshold): int(np.count_nonzero(distances > threshold))
+                            for threshold in thresholds},
+        'mean_distance': float(distances.mean()) if len(distances) else None,
+        'percentiles': {str(percentile): float(value) for percentile, value
+                        in zip(percentiles, np.percentile(distances, percentiles))} if len(distances) else {},
+        'histogram': [{'min': low, 'max': high, 'count': int(count)} for low, high, count
+                      in zip(bins, bins[1:] + [None], counts[1:])],
+    }
+
+
+def percent(count, total):
+    return count / total * 100 if total else 0.0
+
+
+def format_report(report, name='postcodes'):
+    """
+    Returns the lines of a report for the console.
+    """
+    total = report['new']
+    lines = [
+        'Added: %d (%.3f%%)' % (report['added'], percent(report['added'], total)),
+        'Deleted: %d (%.3f%%)' % (report['deleted'], percent(report['deleted'], total)),
+        'Position moved: %d (%.3f%%)' % (report['moved'], percent(report['moved'], total)),
+    ]
+    for threshold, count in report['moved_more_than'].items():
+        lines.append('Position moved more than %s meters: %d (%.3f%%)' % (threshold, count, percent(count, total)))
+    if report['mean_distance'] is None:
+        lines.append('Average distance difference of all updates: no %s moved' % name)
+    else:
+        lines.append('Average distance difference of all updates: %0.2f meters' % report['mean_distance'])
+    for percentile, distance in report['percentiles'].items():
+        lines.append('Percentile %s of the distances: %0.2f meters' % (percentile, distance))
+    return lines
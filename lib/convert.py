@@ -1,10 +1,20 @@
 
 import math
+import sys
+from bisect import bisect_left
+from collections import namedtuple
+from functools import lru_cache
+from itertools import accumulate, chain, islice
+
+import numpy as np
 
 from lib.zip_code_lookup import ZipCodeLookup
 
 from .project import CoordinateTransformer
-from .helpers import parse_house_number, round_point, glom_all, length, check_if_integers, interpolation_type, create_wkt_linestring
+from .geometry import offset_lines, segment_lengths
+from .nodes import NodeStore
+from .profiling import profile_stage
+from .helpers import parse_house_number, glom_all, length, interpolation_type, create_wkt_linestring
 
 
 PROJCS_WKT = """GEOGCS["GCS_North_American_1983",
@@ -24,11 +34,42 @@ ADDRESS_PULLBACK = 20
 # The approximate number of feet in one degree of latitude
 LAT_FEET = 364320
 
+# The same, as helpers.length() measures the ways to pull back
+LENGTH_LAT_FEET = 364613
+
+# Ways whose address ways offset_ways() calculates together with vectorized
+OFFSET_BATCH_SIZE = 10000
+
+# The attributes of a way (TLID) addressways() uses, stored once per way
+WayAttributes = namedtuple('WayAttributes', [
+    'way_id', 'name', 'county', 'state',
+    'lfromadd', 'ltoadd', 'rfromadd', 'rtoadd',
+    'zip_left', 'zip_right', 'zip4_left', 'zip4_right',
+])
+
+# Number of nodes compile_nodelist() transforms to decide whether the
+# transformation can be skipped (see CoordinateTransformer.check_identity)
+IDENTITY_SAMPLE_SIZE = 1000
+
 # Helper Functions
-def interpolate_along_line(coordinates, from_hnr, to_hnr, hnr):
+def cumulative_lengths(coordinates):
+    """
+    Precomputes the lengths interpolate_along_line() needs, so they are
+    calculated once per line instead of once per house number.
+    Returns the distance from the start of the line to each point, the
+    length of each segment and the total length.
+    """
+    segment_lengths = [dist(coordinates[i], coordinates[i + 1]) for i in range(len(coordinates) - 1)]
+    cumulative = list(accumulate(segment_lengths, initial=0))
+    return cumulative, segment_lengths, sum(segment_lengths)
+
+
+def interpolate_along_line(coordinates, from_hnr, to_hnr, hnr, lengths=None):
     """
     Interpolates latitude and longitude for a given house number along a line.
     Fallback to the centroid of the line if interpolation fails.
+    Pass the result of cumulative_lengths(coordinates) as lengths when
+    interpolating many house numbers along the same line.
     """
     if from_hnr == to_hnr:
         return calculate_centroid(coordinates)
@@ -40,40 +81,40 @@ def interpolate_along_line(coordinates, from_hnr, to_hnr, hnr):
     # Ensure hnr is within bounds
     if hnr < from_hnr or hnr > to_hnr:
         return calculate_centroid(coordinates)
-    
+
+    if lengths is None:
+        lengths = cumulative_lengths(coordinates)
+    cumulative, segment_lengths, total_length = lengths
 
     ratio = (hnr - from_hnr) / (to_hnr - from_hnr)
-    total_length = sum(dist(coordinates[i], coordinates[i + 1]) for i in range(len(coordinates) - 1))
     target_length = ratio * total_length
-    current_length = 0
 
-    for i in range(len(coordinates) - 1):
-        segment_length = dist(coordinates[i], coordinates[i + 1])
-        if current_length + segment_length >= target_length:
-            segment_ratio = (target_length - current_length) / segment_length
-            lat = coordinates[i][0] + segment_ratio * (coordinates[i + 1][0] - coordinates[i][0])
-            lon = coordinates[i][1] + segment_ratio * (coordinates[i + 1][1] - coordinates[i][1])
-            return lat, lon
-        current_length += segment_length
+    # First segment whose end is at or beyond the target
+    i = bisect_left(cumulative, target_length, 1) - 1
+    if i < len(segment_lengths):
+        segment_ratio = (target_length - cumulative[i]) / segment_lengths[i]
+        lat = coordinates[i][0] + segment_ratio * (coordinates[i + 1][0] - coordinates[i][0])
+        lon = coordinates[i][1] + segment_ratio * (coordinates[i + 1][1] - coordinates[i][1])
+        return lat, lon
 
     return calculate_centroid(coordinates)
 
 
-def should_include(hnr, interpolationtype):
+def parse_address_range(fromadd, toadd):
     """
-    Checks if a house number should be included based on interpolation type.
+    Parses both ends of an address range with parse_house_number().
+    Returns None if either end is missing or not a house number.
     """
-    _, numeric_hnr, _ = parse_house_number(hnr)
-    if numeric_hnr is None:
-        return False
-
-    if interpolationtype == 'all':
-        return True
-    if interpolationtype == 'even' and numeric_hnr % 2 == 0:
-        return True
-    if interpolationtype == 'odd' and numeric_hnr % 2 != 0:
-        return True
-    return False
+    parsed = []
+    for number in (fromadd, toadd):
+        if number is None:
+            return None
+        parsed_number = parse_house_number(number)
+        if parsed_number[1] is None:
+            print("Non integer address: %s" % number)
+            return None
+        parsed.append(parsed_number)
+    return parsed
 
 
 def calculate_centroid(coordinates):
@@ -93,165 +134,293 @@ def dist(p1, p2):
     """Calculates the distance between two points."""
     return math.sqrt((p1[0] - p2[0])**2 + (p1[1] - p2[1])**2)
 
-def addressways(waylist, nodelist, first_way_id, zip_lookup: ZipCodeLookup, compile_as_ranges: bool):
-    way_id = first_way_id
+def offset_segment(segment, nodes, pullback, left, right, way_id):
+    """
+    Calculates the address ways on the left and right of a segment of node
+    indexes. Returns both as lists of (id, (lat, lon)), with new ids for
+    the points of the address ways, and the next free id.
+    """
     distance = ADDRESS_DISTANCE
-    output = []
-
-    for tags, segments in waylist.items():
-        tags = dict(tags)
-        
-        for segment in segments:
-            lsegment = []
-            rsegment = []
-            lastpoint = []
-
-            # Don't pull back the ends of very short ways too much
-            seglength = length(segment, nodelist)
-            if seglength < float(ADDRESS_PULLBACK) * 3.0:
-                pullback = seglength / 3.0
+    lsegment = []
+    rsegment = []
+    lastpoint = []
+
+    first = True
+    first_index = segment[0]
+    final_index = segment[len(segment) - 1]
+    firstpoint = nodes.coordinates(first_index)
+    finalpoint = nodes.coordinates(final_index)
+
+    for index in segment:
+        lat, lon = nodes.lat[index], nodes.lon[index]
+
+        # The approximate number of feet in one degree of longitude
+        lrad = math.radians(lat)
+        LON_FEET = 365527.822 * math.cos(lrad) - 306.75853 * math.cos(3 * lrad) + 0.3937 * math.cos(5 * lrad)
+
+        # Calculate the points of the offset ways
+        if lastpoint:
+            # Skip points too close to start
+            if math.sqrt((lat * LAT_FEET - firstpoint[0] * LAT_FEET)**2 + (lon * LON_FEET - firstpoint[1] * LON_FEET)**2) < pullback:
+                # Preserve very short ways (but will be rendered backwards)
+                if index != final_index:
+                    continue
+            # Skip points too close to end
+            if math.sqrt((lat * LAT_FEET - finalpoint[0] * LAT_FEET)**2 + (lon * LON_FEET - finalpoint[1] * LON_FEET)**2) < pullback:
+                # Preserve very short ways (but will be rendered backwards)
+                if index not in (first_index, final_index):
+                    continue
+
+            X = (lon - lastpoint[1]) * LON_FEET
+            Y = (lat - lastpoint[0]) * LAT_FEET
+            if Y != 0:
+                theta = math.pi/2 - math.atan( X / Y)
+                Xp = math.sin(theta) * distance
+                Yp = math.cos(theta) * distance
             else:
-                pullback = float(ADDRESS_PULLBACK)
-
-            lfromadd = tags.get("tiger:lfromadd")
-            ltoadd = tags.get("tiger:ltoadd")
-            rfromadd = tags.get("tiger:rfromadd")
-            rtoadd = tags.get("tiger:rtoadd")
-
-            right = check_if_integers([rfromadd, rtoadd])
-            left = check_if_integers([lfromadd, ltoadd])
-
-            if not left and not right:
-                continue
-
-            # Parse house numbers once
-            parsed_lfromadd = parse_house_number(lfromadd)
-            parsed_ltoadd = parse_house_number(ltoadd)
-            parsed_rfromadd = parse_house_number(rfromadd)
-            parsed_rtoadd = parse_house_number(rtoadd)
-
-            first = True
-            firstpointid, firstpoint = nodelist[ round_point( segment[0] ) ]
-            finalpointid, finalpoint = nodelist[ round_point( segment[len(segment) - 1] ) ]
-
-            for point in segment:
-                pointid, (lat, lon) = nodelist[ round_point( point ) ]
-
-                # The approximate number of feet in one degree of longitude
-                lrad = math.radians(lat)
-                LON_FEET = 365527.822 * math.cos(lrad) - 306.75853 * math.cos(3 * lrad) + 0.3937 * math.cos(5 * lrad)
-
-                # Calculate the points of the offset ways
-                if lastpoint:
-                    # Skip points too close to start
-                    if math.sqrt((lat * LAT_FEET - firstpoint[0] * LAT_FEET)**2 + (lon * LON_FEET - firstpoint[1] * LON_FEET)**2) < pullback:
-                        # Preserve very short ways (but will be rendered backwards)
-                        if pointid != finalpointid:
-                            continue
-                    # Skip points too close to end
-                    if math.sqrt((lat * LAT_FEET - finalpoint[0] * LAT_FEET)**2 + (lon * LON_FEET - finalpoint[1] * LON_FEET)**2) < pullback:
-                        # Preserve very short ways (but will be rendered backwards)
-                        if pointid not in (firstpointid, finalpointid):
-                            continue
-
-                    X = (lon - lastpoint[1]) * LON_FEET
-                    Y = (lat - lastpoint[0]) * LAT_FEET
-                    if Y != 0:
-                        theta = math.pi/2 - math.atan( X / Y)
-                        Xp = math.sin(theta) * distance
-                        Yp = math.cos(theta) * distance
-                    else:
-                        Xp = 0
-                        if X > 0:
-                            Yp = -distance
-                        else:
-                            Yp = distance
-
-                    if Y > 0:
-                        Xp = -Xp
-                    else:
-                        Yp = -Yp
-
-                    if first:
-                        first = False
-                        dX =  - (Yp * (pullback / distance)) / LON_FEET #Pull back the first point
-                        dY = (Xp * (pullback / distance)) / LAT_FEET
-                        if left:
-                            lpoint = (lastpoint[0] + (Yp / LAT_FEET) - dY, lastpoint[1] + (Xp / LON_FEET) - dX)
-                            lsegment.append( (way_id, lpoint) )
-                            way_id += 1
-                        if right:
-                            rpoint = (lastpoint[0] - (Yp / LAT_FEET) - dY, lastpoint[1] - (Xp / LON_FEET) - dX)
-                            rsegment.append( (way_id, rpoint) )
-                            way_id += 1
+                Xp = 0
+                if X > 0:
+                    Yp = -distance
+                else:
+                    Yp = distance
+
+            if Y > 0:
+                Xp = -Xp
+            else:
+                Yp = -Yp
+
+            if first:
+                first = False
+                dX =  - (Yp * (pullback / distance)) / LON_FEET #Pull back the first point
+                dY = (Xp * (pullback / distance)) / LAT_FEET
+                if left:
+                    lpoint = (lastpoint[0] + (Yp / LAT_FEET) - dY, lastpoint[1] + (Xp / LON_FEET) - dX)
+                    lsegment.append( (way_id, lpoint) )
+                    way_id += 1
+                if right:
+                    rpoint = (lastpoint[0] - (Yp / LAT_FEET) - dY, lastpoint[1] - (Xp / LON_FEET) - dX)
+                    rsegment.append( (way_id, rpoint) )
+                    way_id += 1
 
-                    else:
-                        #round the curves
-                        if delta[1] != 0:
-                            theta = abs(math.atan(delta[0] / delta[1]))
-                        else:
-                            theta = math.pi / 2
-                        if Xp != 0:
-                            theta = theta - abs(math.atan(Yp / Xp))
-                        else: theta = theta - math.pi / 2
-                        r = 1 + abs(math.tan(theta/2))
-                        if left:
-                            lpoint = (lastpoint[0] + (Yp + delta[0]) * r / (LAT_FEET * 2), lastpoint[1] + (Xp + delta[1]) * r / (LON_FEET * 2))
-                            lsegment.append( (way_id, lpoint) )
-                            way_id += 1
-                        if right:
-                            rpoint = (lastpoint[0] - (Yp + delta[0]) * r / (LAT_FEET * 2), lastpoint[1] - (Xp + delta[1]) * r / (LON_FEET * 2))
-                            rsegment.append( (way_id, rpoint) )
-                            way_id += 1
-
-                    delta = (Yp, Xp)
-
-                lastpoint = (lat, lon)
-
-
-            # Add in the last node
-            dX =  - (Yp * (pullback / distance)) / LON_FEET
-            dY = (Xp * (pullback / distance)) / LAT_FEET
-            if left:
-                lpoint = (lastpoint[0] + (Yp + delta[0]) / (LAT_FEET * 2) + dY, lastpoint[1] + (Xp + delta[1]) / (LON_FEET * 2) + dX )
-                lsegment.append( (way_id, lpoint) )
-                way_id += 1
-            if right:
-                rpoint = (lastpoint[0] - Yp / LAT_FEET + dY, lastpoint[1] - Xp / LON_FEET + dX)
-                rsegment.append( (way_id, rpoint) )
-                way_id += 1
-
-            # Generate the tags for ways and nodes
-            zipr = tags.get("tiger:zip_right", '')
-            zipl = tags.get("tiger:zip_left", '')
-            zip4r = tags.get("tiger:zip4_right", '')
-            zip4l = tags.get("tiger:zip4_left", '')
-            name = tags.get("name", '')
-
-            if zipr:
-                cityr = zip_lookup.get_fallback_city(zipr)
-                if not cityr:
-                    print(f"failed to lookup city for {tags}")
-            
-            if zipl:
-                cityl = zip_lookup.get_fallback_city(zipl)
-                if not cityl:
-                    print(f"failed to lookup city for {tags}")
-                
-            county = tags.get("tiger:county", '')
-            state = tags.get("tiger:state", '')
-            id = tags.get("tiger:way_id", '')
+            else:
+                #round the curves
+                if delta[1] != 0:
+                    theta = abs(math.atan(delta[0] / delta[1]))
+                else:
+                    theta = math.pi / 2
+                if Xp != 0:
+                    theta = theta - abs(math.atan(Yp / Xp))
+                else: theta = theta - math.pi / 2
+                r = 1 + abs(math.tan(theta/2))
+                if left:
+                    lpoint = (lastpoint[0] + (Yp + delta[0]) * r / (LAT_FEET * 2), lastpoint[1] + (Xp + delta[1]) * r / (LON_FEET * 2))
+                    lsegment.append( (way_id, lpoint) )
+                    way_id += 1
+                if right:
+                    rpoint = (lastpoint[0] - (Yp + delta[0]) * r / (LAT_FEET * 2), lastpoint[1] - (Xp + delta[1]) * r / (LON_FEET * 2))
+                    rsegment.append( (way_id, rpoint) )
+                    way_id += 1
+
+            delta = (Yp, Xp)
+
+        lastpoint = (lat, lon)
+
+
+    # Add in the last node
+    dX =  - (Yp * (pullback / distance)) / LON_FEET
+    dY = (Xp * (pullback / distance)) / LAT_FEET
+    if left:
+        lpoint = (lastpoint[0] + (Yp + delta[0]) / (LAT_FEET * 2) + dY, lastpoint[1] + (Xp + delta[1]) / (LON_FEET * 2) + dX )
+        lsegment.append( (way_id, lpoint) )
+        way_id += 1
+    if right:
+        rpoint = (lastpoint[0] - Yp / LAT_FEET + dY, lastpoint[1] - Xp / LON_FEET + dX)
+        rsegment.append( (way_id, rpoint) )
+        way_id += 1
+
+    return lsegment, rsegment, way_id
+
+def point_tuples(points):
+    """
+    Returns the rows of an (n, 2) array as a list of tuples.
+    """
+    return list(zip(points[:, 0].tolist(), points[:, 1].tolist()))
+
+def number_offset_points(lpoints, rpoints, left, right, way_id):
+    """
+    Numbers the (lat, lon) points of the address ways of a segment like
+    offset_segment(): left and right alternate. Returns both as lists of
+    (id, (lat, lon)) and the next free id.
+    """
+    step = 2 if left and right else 1
+    count = len(lpoints)
+    lsegment = []
+    rsegment = []
+    if left:
+        lsegment = list(zip(range(way_id, way_id + step * count, step), lpoints))
+    if right:
+        first_id = way_id + 1 if left else way_id
+        rsegment = list(zip(range(first_id, first_id + step * count, step), rpoints))
+    return lsegment, rsegment, way_id + step * count
+
+def offset_segments_vectorized(segments, nodes, way_id):
+    """
+    Calculates the address ways of many segments with a single call of
+    geometry.offset_lines(), so the NumPy overhead is paid once per batch
+    instead of once per segment. segments is a list of (segment, left,
+    right). Returns a list of (lsegment, rsegment) like offset_segment()
+    and the next free id.
+    """
+    if not segments:
+        return [], way_id
+    latitudes, longitudes = nodes.arrays()
+    counts = np.fromiter((len(segment) for segment, _left, _right in segments), dtype=np.int64,
+                         count=len(segments))
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    indexes = np.fromiter(chain.from_iterable(segment for segment, _left, _right in segments), dtype=np.int64,
+                          count=offsets[-1])
+    lat, lon = latitudes[indexes], longitudes[indexes]
+
+    # Don't pull back the ends of very short ways too much
+    pullback = np.minimum(segment_lengths(lat, lon, offsets, LENGTH_LAT_FEET) / 3.0, float(ADDRESS_PULLBACK))
+
+    lpoints, rpoints, point_offsets = offset_lines(lat, lon, indexes, offsets, pullback, ADDRESS_DISTANCE, LAT_FEET)
+    lpoints, rpoints = point_tuples(lpoints), point_tuples(rpoints)
+
+    results = []
+    bounds = zip(point_offsets[:-1].tolist(), point_offsets[1:].tolist())
+    for (_segment, left, right), (start, end) in zip(segments, bounds):
+        lsegment, rsegment, way_id = number_offset_points(lpoints[start:end], rpoints[start:end], left, right,
+                                                          way_id)
+        results.append((lsegment, rsegment))
+    return results, way_id
+
+def offset_ways(ways, nodes, way_id, vectorized=False):
+    """
+    Yields (attributes, parsed right range, parsed left range, address ways)
+    for (attributes, segments, parsed right range, parsed left range) ways
+    with house numbers on at least one side. The address ways are a
+    (lsegment, rsegment) tuple per segment. With vectorized, those of
+    OFFSET_BATCH_SIZE ways are calculated together.
+    """
+    if not vectorized:
+        for attributes, segments, parsed_right, parsed_left in ways:
+            left = parsed_left is not None
+            right = parsed_right is not None
+            address_ways = []
+            for segment in segments:
+                # Don't pull back the ends of very short ways too much
+                seglength = length(segment, nodes)
+                if seglength < float(ADDRESS_PULLBACK) * 3.0:
+                    pullback = seglength / 3.0
+                else:
+                    pullback = float(ADDRESS_PULLBACK)
+                lsegment, rsegment, way_id = offset_segment(segment, nodes, pullback, left, right, way_id)
+                address_ways.append((lsegment, rsegment))
+            yield attributes, parsed_right, parsed_left, address_ways
+        return
+
+    ways = iter(ways)
+    while True:
+        batch = list(islice(ways, OFFSET_BATCH_SIZE))
+        if not batch:
+            return
+        segments = [(segment, parsed_left is not None, parsed_right is not None)
+                    for _attributes, way_segments, parsed_right, parsed_left in batch for segment in way_segments]
+        address_ways, way_id = offset_segments_vectorized(segments, nodes, way_id)
+        address_ways = iter(address_ways)
+        for attributes, way_segments, parsed_right, parsed_left in batch:
+            yield attributes, parsed_right, parsed_left, list(islice(address_ways, len(way_segments)))
+
+def house_numbers(from_hnr, to_hnr, interpolationtype):
+    """
+    Returns the house numbers of a range in its direction, including both
+    ends. Odd and even ranges step over the numbers of the other parity.
+    """
+    step = 1 if interpolationtype == 'all' else 2
+    if from_hnr <= to_hnr:
+        return range(from_hnr, to_hnr + 1, step)
+    return range(from_hnr, to_hnr - 1, -step)
+
+
+def interpolated_rows(coordinates, parsed_from, parsed_to, interpolationtype, tags):
+    """
+    Yields the rows of all house numbers of one side of a segment, placed
+    along the address way. Prefix and suffix are taken from the start of
+    the range.
+    """
+    prefix, from_hnr, suffix = parsed_from
+    to_hnr = parsed_to[1]
+    lengths = cumulative_lengths(coordinates)
 
+    for hnr in house_numbers(from_hnr, to_hnr, interpolationtype):
+        lat, lon = interpolate_along_line(coordinates, from_hnr, to_hnr, hnr, lengths)
+        row = {"hnr": prefix + str(hnr) + suffix, "lat": round(lat, 6), "lon": round(lon, 6)}
+        row.update(tags)
+        yield row
+
+
+def addressways(waylist, nodes, first_way_id, zip_lookup: ZipCodeLookup, compile_as_ranges: bool, vectorized=False,
+                geometry_encoder=create_wkt_linestring):
+    """
+    Yields the rows of the address ways of all ways, either address ranges
+    or interpolated house numbers. geometry_encoder turns an address way
+    into the geometry column of a range.
+    """
+    # Many ways share a few ZIP codes, look each one up once per run
+    fallback_city = lru_cache(maxsize=None)(zip_lookup.get_fallback_city)
+
+    # Parse house numbers once per way, skip ways without any
+    ways = ((attributes, segments,
+             parse_address_range(attributes.rfromadd, attributes.rtoadd),
+             parse_address_range(attributes.lfromadd, attributes.ltoadd))
+            for attributes, segments in chain.from_iterable(waylist.values()))
+    ways = (way for way in ways if way[2] is not None or way[3] is not None)
+
+    for attributes, parsed_right, parsed_left, address_ways in offset_ways(ways, nodes, first_way_id, vectorized):
+        lfromadd = attributes.lfromadd
+        ltoadd = attributes.ltoadd
+        rfromadd = attributes.rfromadd
+        rtoadd = attributes.rtoadd
+        right = parsed_right is not None
+        left = parsed_left is not None
+
+        parsed_rfromadd, parsed_rtoadd = parsed_right or (None, None)
+        parsed_lfromadd, parsed_ltoadd = parsed_left or (None, None)
+
+        # Generate the tags for ways and nodes
+        zipr = attributes.zip_right
+        zipl = attributes.zip_left
+        zip4r = attributes.zip4_right
+        zip4l = attributes.zip4_left
+        name = attributes.name
+
+        cityr = None
+        if zipr:
+            cityr = fallback_city(zipr)
+            if not cityr:
+                print(f"failed to lookup city for {attributes}")
+
+        cityl = None
+        if zipl:
+            cityl = fallback_city(zipl)
+            if not cityl:
+                print(f"failed to lookup city for {attributes}")
+
+        county = attributes.county
+        state = attributes.state
+
+        for lsegment, rsegment in address_ways:
             # Write the nodes of the offset ways
             if right:
                 interpolationtype = interpolation_type(parsed_rfromadd[1], parsed_rtoadd[1])
                 r_coordinates = [point[1] for point in rsegment]
                 if interpolationtype:
                     if compile_as_ranges:
-                        linestr = create_wkt_linestring(rsegment)
+                        linestr = geometry_encoder(rsegment)
                         way = 'F' if parsed_rfromadd[1] <= parsed_rtoadd[1] else 'R'
                         lat, lon = calculate_centroid(r_coordinates)
-                        output.append({
+                        yield {
                                     "from": rfromadd,
                                     "to": rtoadd,
                                     "interpolation": interpolationtype,
@@ -265,36 +434,26 @@ def addressways(waylist, nodelist, first_way_id, zip_lookup: ZipCodeLookup, comp
                                     "zip4": zip4r,
                                     "geometry": linestr,
                                     "way": way
-                                })
+                                }
                     else:
-                        step = 1 if parsed_rfromadd[1] <= parsed_rtoadd[1] else -1
-                        for hnr in range(parsed_rfromadd[1], parsed_rtoadd[1] + 1, step):
-                            full_hnr = f"{parsed_rfromadd[0]}{hnr}{parsed_rfromadd[2]}".strip()
-                            if should_include(full_hnr, interpolationtype):
-                                lat, lon = interpolate_along_line(
-                                    r_coordinates, parsed_rfromadd[1], parsed_rtoadd[1], hnr
-                                )
-                                yield{
-                                    "hnr": full_hnr,
-                                    "lat": round(lat, 6),
-                                    "lon": round(lon, 6),
+                        yield from interpolated_rows(r_coordinates, parsed_rfromadd, parsed_rtoadd, interpolationtype, {
                                     "street": name,
                                     "county": county,
                                     "city": cityr,
                                     "state": state,
                                     "postcode": zipr,
                                     "zip4": zip4r,
-                                }
+                                })
 
             if left:
                 interpolationtype = interpolation_type(parsed_lfromadd[1], parsed_ltoadd[1])
                 l_coordinates = [point[1] for point in lsegment]
                 if interpolationtype:
                     if compile_as_ranges:
-                        linestr = create_wkt_linestring(lsegment)
+                        linestr = geometry_encoder(lsegment)
                         way = 'F' if parsed_lfromadd[1] <= parsed_ltoadd[1] else 'R'
                         lat, lon = calculate_centroid(l_coordinates)
-                        output.append({
+                        yield {
                                     "from": lfromadd,
                                     "to": ltoadd,
                                     "interpolation": interpolationtype,
@@ -308,61 +467,153 @@ def addressways(waylist, nodelist, first_way_id, zip_lookup: ZipCodeLookup, comp
                                     "zip4": zip4l,
                                     "geometry": linestr,
                                     "way": way
-                                })
+                                }
                     else:
-                        step = 1 if parsed_lfromadd[1] <= parsed_ltoadd[1] else -1
-                        for hnr in range(parsed_lfromadd[1], parsed_ltoadd[1] + 1):
-                            full_hnr = f"{parsed_lfromadd[0]}{hnr}{parsed_lfromadd[2]}"
-                            if should_include(full_hnr, interpolationtype):
-                                lat, lon = interpolate_along_line(
-                                    l_coordinates, parsed_lfromadd[1], parsed_ltoadd[1], hnr
-                                )
-                                yield{
-                                    "hnr": full_hnr,
-                                    "lat": round(lat, 6),
-                                    "lon": round(lon, 6),
+                        yield from interpolated_rows(l_coordinates, parsed_lfromadd, parsed_ltoadd, interpolationtype, {
                                     "street": name,
                                     "county": county,
                                     "city": cityl,
                                     "state": state,
                                     "postcode": zipl,
                                     "zip4": zip4l,
-                                }
-            
-    if compile_as_ranges:
-        return output
+                                })
 
-def compile_nodelist(parsed_gisdata):
-    nodelist = {}
-    transformer = CoordinateTransformer(PROJCS_WKT)
-    i = 1
+def compile_nodelist(parsed_gisdata, identity_tolerance=None):
+    """
+    Assigns indexes to all unique (rounded) points and unprojects them.
+    Returns the next free id and the NodeStore.
+
+    With identity_tolerance (in degrees), a sample of the points is transformed
+    first. If source and target agree within the tolerance, the remaining
+    points are only reordered to (lat, lon) instead of being transformed.
+    """
+    nodes = NodeStore()
     for geom, _tags in parsed_gisdata:
-        for point in geom:
-            r_point = round_point(point)
-            if r_point not in nodelist:
-                nodelist[r_point] = (i, transformer.unproject(point))
-                i += 1
-    transformer.destroy()
-    return (i, nodelist)
+        collect_points(nodes, geom)
+    return unproject_points(nodes, identity_tolerance)
 
 
+def compile_waylist(parsed_gisdata, nodes=None):
+    """
+    Collects and joins the segments of every way, as lists of node indexes.
+    The indexes are those of compile_nodelist() for the same features.
+    """
+    nodes = NodeStore() if nodes is None else nodes
+    waylist = {}
+    for geom, tags in parsed_gisdata:
+        collect_segment(waylist, collect_points(nodes, geom), way_attributes(tags))
+    report_conflicts(waylist)
+    return glom_waylist(waylist)
+
 
-def compile_waylist(parsed_gisdata):
+def compile_lists(features, identity_tolerance=None, profile=None):
+    """
+    Builds the node store and the way list in a single pass over the
+    features, so they can be streamed from the shapefile without keeping
+    the feature list around. Returns the same values as compile_nodelist()
+    and compile_waylist(). profile is a profiling.Profile to account the
+    stages to.
+    """
+    nodes = NodeStore()
     waylist = {}
+    with profile_stage(profile, 'collect'):
+        for geom, tags in features:
+            collect_segment(waylist, collect_points(nodes, geom), way_attributes(tags))
+    report_conflicts(waylist)
 
-    # Group by tiger:way_id
-    for geom, tags in parsed_gisdata:
-        way_key = tags.copy()
-        # {'tiger:way_id': 18403490, 'name': 'Holly St', 'tiger:county': 'Perquimans', 'tiger:state': 'NC'}
-        way_key = ( way_key['tiger:way_id'], tuple( [(k,v) for k,v in way_key.items()] ) )
-        # (18403490, (('tiger:way_id', 18403490), ('name', 'Holly St'), ('tiger:county', 'Perquimans'), ('tiger:state', 'NC')))
+    with profile_stage(profile, 'transform'):
+        i, nodes = unproject_points(nodes, identity_tolerance)
+    if profile is not None:
+        profile.count('transform', 'vertices', len(nodes))
 
-        if way_key not in waylist:
-            waylist[way_key] = []
+    with profile_stage(profile, 'join'):
+        waylist = glom_waylist(waylist)
+    if profile is not None:
+        profile.count('join', 'ways', len(waylist))
+    return i, nodes, waylist
 
-        waylist[way_key].append(geom)
 
-    ret = {}
-    for (_way_id, way_key), segments in waylist.items():
-        ret[way_key] = glom_all( segments )
-    return ret
+def collect_points(nodes, geom):
+    """
+    Adds the points of a geometry to the node store. The first point seen
+    at every rounded position is the one that is unprojected.
+    Returns the geometry as a list of node indexes.
+    """
+    return nodes.add_all(geom)
+
+
+def unproject_points(nodes, identity_tolerance=None):
+    """
+    Unprojects all collected points in one batch.
+    Returns the next free id and the node store.
+    """
+    points = nodes.source_points()
+    transformer = CoordinateTransformer(PROJCS_WKT)
+    if identity_tolerance is not None:
+        sample = points[::max(1, math.ceil(len(points) / IDENTITY_SAMPLE_SIZE))]
+        deviation = transformer.check_identity(sample, identity_tolerance)
+        print("max deviation of %d sampled nodes: %g degrees, %s" % (
+            len(sample), deviation,
+            "skipping transformation" if transformer.identity_swap is not None else "transforming all nodes"))
+    unprojected = transformer.unproject_many(points)
+    identity_swap = transformer.identity_swap
+    transformer.destroy()
+
+    nodes.set_unprojected(unprojected, identity_swap)
+    return (nodes.next_id, nodes)
+
+
+def way_attributes(tags):
+    """
+    Returns the WayAttributes of a feature's tags.
+    """
+    get = tags.get
+    return WayAttributes(
+        tags['tiger:way_id'], get('name', ''), get('tiger:county', ''), get('tiger:state', ''),
+        get('tiger:lfromadd'), get('tiger:ltoadd'), get('tiger:rfromadd'), get('tiger:rtoadd'),
+        get('tiger:zip_left', ''), get('tiger:zip_right', ''), get('tiger:zip4_left', ''), get('tiger:zip4_right', ''),
+    )
+
+
+def collect_segment(waylist, segment, attributes):
+    """
+    Adds a feature's segment (a list of node indexes) to the segments of its
+    way. The way list maps every TLID to a list of (attributes, segments),
+    which holds more than one entry only if features of the TLID have
+    conflicting attributes; those are converted as separate ways, see
+    report_conflicts().
+    """
+    ways = waylist.get(attributes.way_id)
+    if ways is None:
+        waylist[attributes.way_id] = [(attributes, [segment])]
+        return
+
+    for known_attributes, segments in ways:
+        if known_attributes == attributes:
+            segments.append(segment)
+            return
+
+    ways.append((attributes, [segment]))
+
+
+def report_conflicts(waylist):
+    """
+    Reports the TLIDs of a way list collected by collect_segment() that have
+    features with conflicting attributes, once each, on stderr.
+    Returns their number.
+    """
+    conflicting = [way_id for way_id, ways in waylist.items() if len(ways) > 1]
+    if conflicting:
+        print("conflicting attributes for %d TLIDs, converting them as separate ways: %s" % (
+            len(conflicting), ', '.join(str(way_id) for way_id in conflicting)), file=sys.stderr)
+    return len(conflicting)
+
+
+def glom_waylist(waylist):
+    """
+    Joins the collected segments of every way.
+    """
+    return {
+        way_id: [(attributes, glom_all(segments, key=None)) for attributes, segments in ways]
+        for way_id, ways in waylist.items()
+    }
@@ -0,0 +1,131 @@
+"""
+NumPy implementation of the address way geometry in convert.offset_segment,
+for many segments at once
+"""
+
+import numpy as np
+
+
+def lon_feet(lat):
+    """
+    Returns the approximate number of feet in one degree of longitude for an
+    array of latitudes.
+    """
+    lrad = np.radians(lat)
+    return 365527.822 * np.cos(lrad) - 306.75853 * np.cos(3 * lrad) + 0.3937 * np.cos(5 * lrad)
+
+
+def segment_lengths(lat, lon, offsets, lat_feet):
+    """
+    Returns the length in feet of every segment of a batch, like
+    helpers.length() measures it.
+
+    :param lat: Latitudes of the nodes of all segments, one after another.
+    :param lon: Longitudes of the nodes of all segments.
+    :param offsets: Index of the first node of every segment, and the number of nodes.
+    :param lat_feet: Number of feet in one degree of latitude.
+    """
+    steps = np.sqrt(((lat[1:] - lat[:-1]) * lat_feet)**2 + ((lon[1:] - lon[:-1]) * lon_feet(lat[1:]))**2)
+    # The steps from the end of a segment to the start of the next don't count
+    steps = np.append(steps, 0.0)
+    steps[offsets[1:] - 1] = 0.0
+    return np.add.reduceat(steps, offsets[:-1])
+
+
+def offset_lines(lat, lon, ids, offsets, pullback, distance, lat_feet):
+    """
+    Calculates the address ways on both sides of a batch of segments with
+    array operations. Follows convert.offset_segment step by step: points
+    closer than pullback to either end of their segment are dropped, the
+    ends are pulled back and the curves between the remaining points are
+    rounded.
+
+    :param lat: Latitudes of the nodes of all segments, one after another.
+    :param lon: Longitudes of the nodes of all segments.
+    :param ids: Node ids, used to preserve very short ways.
+    :param offsets: Index of the first node of every segment, and the number
+                    of nodes. Every segment has at least two nodes.
+    :param pullback: Distance to pull the ends back by, in feet, per segment.
+    :param distance: Distance of the address ways from the segment, in feet.
+    :param lat_feet: Number of feet in one degree of latitude.
+    :return: Two (n, 2) arrays of (lat, lon), for the left and right address
+             ways, and the index of the first point of every segment in them
+             and their number of points.
+    """
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    ids = np.asarray(ids)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    counts = np.diff(offsets)
+    segment = np.repeat(np.arange(len(counts)), counts)
+    first, final = offsets[:-1][segment], (offsets[1:] - 1)[segment]
+    point_pullback = np.broadcast_to(np.asarray(pullback, dtype=float), counts.shape)[segment]
+    feet = lon_feet(lat)
+
+    # Skip points too close to the start or the end, but preserve very
+    # short ways (which will be rendered backwards)
+    near_first = np.sqrt((lat * lat_feet - lat[first] * lat_feet)**2
+                         + (lon * feet - lon[first] * feet)**2) < point_pullback
+    near_final = np.sqrt((lat * lat_feet - lat[final] * lat_feet)**2
+                         + (lon * feet - lon[final] * feet)**2) < point_pullback
+    skip = (near_first & (ids != ids[final])) | (near_final & (ids != ids[first]) & (ids != ids[final]))
+    skip[offsets[:-1]] = False
+    keep = np.flatnonzero(~skip)
+    lat, lon, feet = lat[keep], lon[keep], feet[keep]
+    point_pullback = point_pullback[keep]
+    kept_offsets = np.concatenate(([0], np.cumsum(np.bincount(segment[keep], minlength=len(counts)))))
+
+    # Perpendicular of every step between two kept points. Steps from the
+    # end of a segment to the start of the next are calculated but not used.
+    X = (lon[1:] - lon[:-1]) * feet[1:]
+    Y = (lat[1:] - lat[:-1]) * lat_feet
+    with np.errstate(divide='ignore', invalid='ignore'):
+        theta = np.pi/2 - np.arctan(X / Y)
+    Xp = np.where(Y != 0, np.sin(theta) * distance, 0.0)
+    Yp = np.where(Y != 0, np.cos(theta) * distance, np.where(X > 0, -distance, distance))
+    Xp = np.where(Y > 0, -Xp, Xp)
+    Yp = np.where(Y > 0, Yp, -Yp)
+
+    left = np.empty((len(lat), 2))
+    right = np.empty((len(lat), 2))
+
+    # Pull back the first point, with the step after it
+    start = kept_offsets[:-1]
+    ratio = point_pullback[start] / distance
+    dX = - (Yp[start] * ratio) / feet[start + 1]
+    dY = (Xp[start] * ratio) / lat_feet
+    left[start, 0] = lat[start] + (Yp[start] / lat_feet) - dY
+    left[start, 1] = lon[start] + (Xp[start] / feet[start + 1]) - dX
+    right[start, 0] = lat[start] - (Yp[start] / lat_feet) - dY
+    right[start, 1] = lon[start] - (Xp[start] / feet[start + 1]) - dX
+
+    # Round the curves, using the perpendiculars before and after each point
+    middle = np.ones(len(lat), dtype=bool)
+    middle[kept_offsets[:-1]] = False
+    middle[kept_offsets[1:] - 1] = False
+    middle = np.flatnonzero(middle)
+    prev_Yp, prev_Xp = Yp[middle - 1], Xp[middle - 1]
+    cur_Yp, cur_Xp = Yp[middle], Xp[middle]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        theta = np.where(prev_Xp != 0, np.abs(np.arctan(prev_Yp / prev_Xp)), np.pi / 2)
+        theta = theta - np.where(cur_Xp != 0, np.abs(np.arctan(cur_Yp / cur_Xp)), np.pi / 2)
+    r = 1 + np.abs(np.tan(theta/2))
+    step_lat = (cur_Yp + prev_Yp) * r / (lat_feet * 2)
+    step_lon = (cur_Xp + prev_Xp) * r / (feet[middle + 1] * 2)
+    left[middle, 0] = lat[middle] + step_lat
+    left[middle, 1] = lon[middle] + step_lon
+    right[middle, 0] = lat[middle] - step_lat
+    right[middle, 1] = lon[middle] - step_lon
+
+    # Add in the last node, with the step before it
+    end = kept_offsets[1:] - 1
+    ratio = point_pullback[end] / distance
+    end_Yp, end_Xp = Yp[end - 1], Xp[end - 1]
+    dX = - (end_Yp * ratio) / feet[end]
+    dY = (end_Xp * ratio) / lat_feet
+    left[end, 0] = lat[end] + (end_Yp + end_Yp) / (lat_feet * 2) + dY
+    left[end, 1] = lon[end] + (end_Xp + end_Xp) / (feet[end] * 2) + dX
+    right[end, 0] = lat[end] - end_Yp / lat_feet + dY
+    right[end, 1] = lon[end] - end_Xp / feet[end] + dX
+
+    return left, right, kept_offsets
@@ -1,5 +1,10 @@
 import math
 import re
+import sys
+import resource
+import struct
+from collections import deque
+from functools import lru_cache
 
 def parse_house_number(hnr):
     """
@@ -99,28 +104,127 @@ def glom_once( segments ):
 
     return x, unsorted
 
-def glom_all( segments ):
+def glom_all( segments, key=round_point ):
     """
     Takes a list of segments and combines as many as possible together. Returns
     a list of (now combined) segments.
+
+    Segment ends are joined where key() gives the same value for them. Pass
+    key=None for segments of node indexes, which are equal as they are.
+
+    Produces the same chains as repeatedly calling glom_once(), but indexes the
+    segment endpoints once instead of rescanning all remaining segments
+    for every join, so the cost is linear in the number of segments.
     """
-    unsorted = segments
+    segments = list( segments )
+    if key is None:
+        ends = [ ( segment[0], segment[-1] ) for segment in segments ]
+    else:
+        ends = [ ( key(segment[0]), key(segment[-1]) ) for segment in segments ]
+
+    # endpoint -> indexes of the segments starting or ending there, in
+    # input order. glom_once() always joins the first adjacent segment of the
+    # remaining list, which is the lowest unused index found at either end.
+    by_endpoint = {}
+    for i, (start, end) in enumerate( ends ):
+        by_endpoint.setdefault( start, [] ).append( i )
+        if end != start:
+            by_endpoint.setdefault( end, [] ).append( i )
+
+    # Position of the first possibly unused entry in each endpoint list
+    heads = dict.fromkeys( by_endpoint, 0 )
+    used = [False] * len( segments )
+
+    def first_unused( point ):
+        candidates = by_endpoint[point]
+        head = heads[point]
+        while head < len( candidates ) and used[candidates[head]]:
+            head += 1
+        heads[point] = head
+        return candidates[head] if head < len( candidates ) else None
+
     chunks = []
+    for start in range( len( segments ) ):
+        if used[start]:
+            continue
+        used[start] = True
+
+        # The chain is kept in a deque so joins at either end don't copy it.
+        # 'flipped' means the chain reads back to front, which saves the
+        # reversal glom() does when joining at the chain's first point.
+        chain = deque( segments[start] )
+        flipped = False
+        chain_left, chain_right = ends[start]
 
-    while unsorted != []:
-        chunk, unsorted = glom_once( unsorted )
+        while True:
+            left_match = first_unused( chain_left )
+            right_match = first_unused( chain_right )
+            if left_match is None and right_match is None:
+                break
+            if left_match is None or ( right_match is not None and right_match < left_match ):
+                i = right_match
+            else:
+                i = left_match
+            used[i] = True
+            segment = segments[i]
+            right_left, right_right = ends[i]
+
+            # Same case order as glom()
+            if chain_left == right_left:
+                # Reverse the chain, then append the segment at its end
+                flipped = not flipped
+                _chain_pop( chain, flipped, at_end=True )
+                _chain_extend( chain, flipped, segment, at_end=True )
+                chain_left, chain_right = chain_right, right_right
+            elif chain_left == right_right:
+                _chain_extend( chain, flipped, segment[0:-1], at_end=False )
+                chain_left = right_left
+            elif chain_right == right_left:
+                _chain_pop( chain, flipped, at_end=True )
+                _chain_extend( chain, flipped, segment, at_end=True )
+                chain_right = right_right
+            else:
+                _chain_pop( chain, flipped, at_end=True )
+                _chain_extend( chain, flipped, segment[::-1], at_end=True )
+                chain_right = right_left
+
+        chunk = list( chain )
+        if flipped:
+            chunk.reverse()
         chunks.append( chunk )
 
     return chunks
 
+def _chain_pop( chain, flipped, at_end ):
+    """
+    Removes the first or last point of a chain as read in its current direction.
+    """
+    if at_end != flipped:
+        chain.pop()
+    else:
+        chain.popleft()
+
+def _chain_extend( chain, flipped, points, at_end ):
+    """
+    Adds points to the start or end of a chain as read in its current direction.
+    """
+    if flipped:
+        points = points[::-1]
+    if at_end != flipped:
+        chain.extend( points )
+    else:
+        # extendleft() adds the points one by one, reversing their order
+        chain.extendleft( reversed( points ) )
+
 
-def length(segment, nodelist):
-    '''Returns the length (in feet) of a segment'''
+def length(segment, nodes):
+    '''Returns the length (in feet) of a segment of node indexes'''
     first = True
     distance = 0
     lat_feet = 364613  # The approximate number of feet in one degree of latitude
-    for point in segment:
-        _pointid, (lat, lon) = nodelist[ round_point( point ) ]
+    latitudes, longitudes = nodes.lat, nodes.lon
+    for index in segment:
+        lat, lon = latitudes[index], longitudes[index]
         if first:
             first = False
         else:
@@ -137,22 +241,6 @@ def length(segment, nodelist):
     return distance
 
 
-def check_if_integers(numbers):
-    """
-    Returns true if all members of lists are integers.
-    """
-    for number in numbers:
-        if number is None:
-            return False
-        try:
-            _, hnr, _ = parse_house_number(number)
-            int(hnr)
-        except:
-            print("Non integer address: %s" % number)
-            return False
-
-    return True
-
 def interpolation_type(this_from, this_to):
     if this_from is None or this_to is None:
         return None
@@ -164,11 +252,161 @@ def interpolation_type(this_from, this_to):
         return "all"
 
 
+@lru_cache(maxsize=256)
+def wkt_linestring_template(count):
+    """
+    Format string of a WKT LINESTRING with count points
+    """
+    return 'LINESTRING(' + ','.join(['%f %f'] * count) + ')'
+
+
 def create_wkt_linestring(segment):
     """
     Create well known text LINESTRING()
     """
-    coord_pairs = []
+    coordinates = []
+    for _i, point in segment:
+        coordinates.append(point[1])
+        coordinates.append(point[0])
+    return wkt_linestring_template(len(segment)) % tuple(coordinates)
+
+
+# Geometry type of a LINESTRING in WKB and the EWKB flag for an included SRID
+WKB_LINESTRING = 2
+EWKB_SRID_FLAG = 0x20000000
+
+def create_ewkb_linestring(segment, srid=4326):
+    """
+    Create a LINESTRING as hex encoded extended well known binary (EWKB), as
+    PostGIS reads and writes it in COPY. Coordinates are rounded to the same
+    6 decimals as create_wkt_linestring().
+    """
+    coordinates = []
+    for _i, point in segment:
+        coordinates.append(round(point[1], 6))
+        coordinates.append(round(point[0], 6))
+    return struct.pack('<BIII%dd' % len(coordinates), 1, WKB_LINESTRING | EWKB_SRID_FLAG, srid,
+                       len(segment), *coordinates).hex().upper()
+
+
+# Decimals of the encoded polylines, the same as in the WKT
+POLYLINE_PRECISION = 6
+
+# Characters ending the encoding of a number in a polyline
+POLYLINE_LAST_CHUNK = re.compile('[?-^]')
+
+def create_polyline(segment, precision=POLYLINE_PRECISION):
+    """
+    Create an encoded polyline (the format of the Google Maps API, with
+    6 instead of 5 decimals by default). Less than half the size of WKT,
+    but slower to decode. Coordinates are rounded like in
+    create_wkt_linestring().
+    """
+    factor = 10 ** precision
+    chunks = []
+    last_lat = last_lon = 0
     for _i, point in segment:
-        coord_pairs.append( "%f %f" % (point[1], point[0]) )
-    return 'LINESTRING(' + ','.join(coord_pairs) + ')'
+        lat = round(round(point[0], precision) * factor)
+        lon = round(round(point[1], precision) * factor)
+        for delta in (lat - last_lat, lon - last_lon):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            chunks.append(chr(value + 63))
+        last_lat, last_lon = lat, lon
+    return ''.join(chunks)
+
+
+def decode_polyline(polyline, precision=POLYLINE_PRECISION, count=None):
+    """
+    Returns the first count (default: all) points of an encoded polyline
+    as (lat, lon).
+    """
+    factor = 10 ** precision
+    points = []
+    values = []
+    result = shift = 0
+    for chunk in polyline.encode('ascii'):
+        chunk -= 63
+        result |= (chunk & 0x1f) << shift
+        if chunk >= 0x20:
+            shift += 5
+            continue
+        values.append(~(result >> 1) if result & 1 else result >> 1)
+        result = shift = 0
+        if len(values) == 2:
+            lat = values[0] + (points[-1][0] if points else 0)
+            lon = values[1] + (points[-1][1] if points else 0)
+            points.append((lat, lon))
+            values = []
+            if len(points) == count:
+                break
+    return [(lat / factor, lon / factor) for lat, lon in points]
+
+
+def decode_linestring(geometry):
+    """
+    Returns all points of a line as (lon, lat), from WKT, hex (E)WKB or an
+    encoded polyline, like linestring_midpoint().
+    """
+    if geometry.startswith('LINESTRING('):
+        return [tuple(map(float, point.split(' '))) for point in geometry[len('LINESTRING('):-1].split(',')]
+
+    if geometry.startswith(('00', '01')):
+        wkb = bytes.fromhex(geometry)
+        byte_order = '<' if wkb[0] == 1 else '>'
+        geometry_type, = struct.unpack_from(byte_order + 'I', wkb, 1)
+        if geometry_type & 0xffff != WKB_LINESTRING:
+            raise ValueError("Not a LINESTRING: %s" % geometry[:26])
+        offset = 9 if geometry_type & EWKB_SRID_FLAG else 5
+        count, = struct.unpack_from(byte_order + 'I', wkb, offset)
+        return list(struct.iter_unpack(byte_order + 'dd', wkb[offset + 4:offset + 4 + 16 * count]))
+
+    if geometry:
+        return [(lon, lat) for lat, lon in decode_polyline(geometry)]
+
+    raise ValueError("Invalid geometry format: %s" % geometry)
+
+
+def linestring_midpoint(geometry):
+    """
+    Returns the middle point of a line as (lon, lat), from WKT, hex (E)WKB
+    or an encoded polyline. Only the middle point is decoded.
+    """
+    if geometry.startswith('LINESTRING('):
+        body = geometry[len('LINESTRING('):-1]
+        middle = (body.count(',') + 1) // 2
+        x, y = body.split(',', middle + 1)[middle].split(' ')
+        return float(x), float(y)
+
+    if geometry.startswith(('00', '01')):
+        header = bytes.fromhex(geometry[:26])
+        byte_order = '<' if header[0] == 1 else '>'
+        geometry_type, = struct.unpack_from(byte_order + 'I', header, 1)
+        if geometry_type & 0xffff != WKB_LINESTRING:
+            raise ValueError("Not a LINESTRING: %s" % geometry[:26])
+        # The SRID comes before the number of points
+        offset = 9 if geometry_type & EWKB_SRID_FLAG else 5
+        count, = struct.unpack_from(byte_order + 'I', header, offset)
+        start = 2 * (offset + 4 + 16 * (count // 2))
+        return struct.unpack(byte_order + 'dd', bytes.fromhex(geometry[start:start + 32]))
+
+    if geometry:
+        # Every point ends in two chunks below 0x20
+        count = len(POLYLINE_LAST_CHUNK.findall(geometry)) // 2
+        lat, lon = decode_polyline(geometry, count=count // 2 + 1)[-1]
+        return lon, lat
+
+    raise ValueError("Invalid geometry format: %s" % geometry)
+
+
+def peak_rss_mb():
+    """
+    Returns the peak resident set size of the current process in megabytes.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    if sys.platform == 'darwin':
+        peak /= 1024
+    return peak / 1024
@@ -0,0 +1,212 @@
+"""
+Incremental conversion: reuses the rows of the ways (TLIDs) that did not
+change since the last conversion of a county.
+
+The state of a county is kept in a pickle file: fingerprints of the input
+file and the settings, a digest of the features of every TLID, and the
+rows of every TLID in output order, as tuples of the values of the output
+columns. The rows of a TLID only depend on its
+own features and the ZIP code database, so unchanged TLIDs don't have to
+go through glom_all()/addressways() again.
+"""
+
+import hashlib
+import os
+import pickle
+
+from .parse import iter_shp_for_geom_and_tags
+from .nodes import NodeStore
+from .convert import addressways, unproject_points, collect_points, collect_segment, way_attributes, \
+                     report_conflicts
+from .helpers import glom_all, peak_rss_mb
+from .profiling import Profile, profile_stage, profile_iterate, feature_vertices, write_json
+from .output import WRITERS, GEOMETRY_ENCODERS, DEFAULT_GEOMETRY, HNR_FIELDNAMES, RANGE_FIELDNAMES
+
+# Increase when the rows produced for the same input or the layout of the
+# state change
+STATE_VERSION = 4
+
+# Columns of the delta file in front of the columns of the output
+DELTA_FIELDNAMES = ['change', 'tlid']
+
+# Files of a shapefile that hold its features
+SHAPEFILE_EXTENSIONS = ['.shp', '.shx', '.dbf']
+
+
+def file_fingerprint(filename):
+    """
+    Returns a SHA-256 hex digest of a file. For a shapefile the .shx and
+    .dbf files next to it are included.
+    """
+    digest = hashlib.sha256()
+    base, extension = os.path.splitext(filename)
+    filenames = [base + ext for ext in SHAPEFILE_EXTENSIONS] if extension == '.shp' else [filename]
+    for name in filenames:
+        if not os.path.exists(name):
+            continue
+        with open(name, 'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def feature_digest(digest, geom, tags):
+    """
+    Adds a feature to the digest of its TLID.
+    """
+    digest.update(repr((geom, tuple(tags.items()))).encode('utf-8'))
+
+
+def same_settings(old_settings, settings):
+    """
+    Whether a state was written with the given settings. The identity
+    transform decision ('identity_swap') is only known after the nodes are
+    unprojected and is compared then.
+    """
+    return {key: value for key, value in old_settings.items() if key != 'identity_swap'} == settings
+
+
+def row_values(row, headers):
+    """
+    Returns the values of a row of addressways() as stored in the state.
+    """
+    return tuple(row.get(name) for name in headers)
+
+
+def load_state(state_file):
+    """
+    Returns the saved state of a county, None if there is none.
+    """
+    if not os.path.exists(state_file):
+        return None
+    with open(state_file, 'rb') as file:
+        return pickle.load(file)
+
+
+def save_state(state_file, state):
+    """
+    Writes the state of a county, replacing the old one only once the new
+    one is complete.
+    """
+    tmp_file = state_file + '.tmp'
+    with open(tmp_file, 'wb') as file:
+        pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, state_file)
+
+
+def convert_file_incremental(shp_filename, csv_filename, delta_filename, state_file, zip_lookup, zip_fingerprint,
+                             compile_as_ranges, identity_tolerance=None, vectorized=False, use_arrow=False,
+                             output_format='csv', geometry_format=None, profile_file=None):
+    """
+    Same as pipeline.convert_file(), reusing the rows of unchanged ways
+    from state_file and updating it afterwards. Also writes the rows of
+    added and changed TLIDs and the deleted TLIDs to delta_filename.
+    zip_fingerprint identifies the ZIP code database, see file_fingerprint().
+    With profile_file, the time and throughput of every stage are written
+    there as JSON (see profiling.Profile).
+    Returns the number of TLIDs and the number of changed TLIDs.
+    """
+    profile = Profile() if profile_file else None
+    geometry_format = geometry_format or DEFAULT_GEOMETRY[output_format]
+    settings = {
+        'version': STATE_VERSION,
+        'ranges': compile_as_ranges,
+        'geometry': geometry_format,
+        'identity_tolerance': identity_tolerance,
+        'vectorized': vectorized,
+        'zip_db': zip_fingerprint,
+    }
+    fingerprint = file_fingerprint(shp_filename)
+    headers = RANGE_FIELDNAMES if compile_as_ranges else HNR_FIELDNAMES
+
+    old_state = load_state(state_file)
+    if old_state is None or not same_settings(old_state['settings'], settings):
+        old_state = {'digests': {}, 'ways': []}
+    old_rows = dict(old_state['ways'])
+
+    if old_state.get('fingerprint') == fingerprint:
+        print("%s unchanged" % shp_filename)
+        state = old_state
+        changed = set()
+    else:
+        print("parsing shpfile %s" % shp_filename)
+        digests = {}
+        # All nodes, so every vertex is unprojected exactly as in a full run,
+        # and the segments of all TLIDs, in the order of the output
+        nodes = NodeStore()
+        waylist = {}
+        features = iter_shp_for_geom_and_tags(shp_filename, use_arrow)
+        with profile_stage(profile, 'collect'):
+            for geom, tags in profile_iterate(profile, 'parse', features, 'features', feature_vertices):
+                collect_segment(waylist, collect_points(nodes, geom), way_attributes(tags))
+                tlid = tags['tiger:way_id']
+                if tlid not in digests:
+                    digests[tlid] = hashlib.blake2b(digest_size=16)
+                feature_digest(digests[tlid], geom, tags)
+            digests = {tlid: digest.digest() for tlid, digest in digests.items()}
+            changed = {tlid for tlid, digest in digests.items() if old_state['digests'].get(tlid) != digest}
+        report_conflicts(waylist)
+
+        with profile_stage(profile, 'transform'):
+            i, nodes = unproject_points(nodes, identity_tolerance)
+        settings['identity_swap'] = nodes.identity_swap
+        if old_state['digests'] and old_state['settings']['identity_swap'] != nodes.identity_swap:
+            # The nodes were unprojected differently, none of the old rows fit
+            print("identity transform decision changed, converting all ways")
+            changed = set(digests)
+
+        ways = []
+        geometry_encoder = GEOMETRY_ENCODERS[geometry_format]
+        for tlid, tlid_ways in waylist.items():
+            if tlid in changed:
+                with profile_stage(profile, 'join'):
+                    glommed = [(attributes, glom_all(segments, key=None)) for attributes, segments in tlid_ways]
+                # The ids of the address way nodes don't appear in the
+                # output, so every TLID can start from the same one
+                with profile_stage(profile, 'addressways'):
+                    rows = [row_values(row, headers) for row in addressways(
+                        {tlid: glommed}, nodes, i, zip_lookup, compile_as_ranges, vectorized, geometry_encoder)]
+                if profile is not None:
+                    profile.count('addressways', 'rows', len(rows))
+            else:
+                rows = old_rows[tlid]
+            ways.append((tlid, rows))
+
+        state = {
+            'settings': settings,
+            'fingerprint': fingerprint,
+            'digests': digests,
+            'ways': ways,
+        }
+        print("%d of %d ways changed" % (len(changed), len(digests)))
+
+    print("writing %s" % csv_filename)
+    with profile_stage(profile, 'write'):
+        rows = (dict(zip(headers, row)) for _tlid, rows in state['ways'] for row in rows)
+        WRITERS[output_format](csv_filename, rows, headers)
+
+        deleted = [tlid for tlid in old_state['digests'] if tlid not in state['digests']]
+        print("writing %s" % delta_filename)
+        WRITERS[output_format](delta_filename, iter_delta(state, old_state, changed, deleted, headers),
+                               DELTA_FIELDNAMES + headers)
+
+        save_state(state_file, state)
+    print("peak memory usage %d MB" % peak_rss_mb())
+
+    if profile is not None:
+        write_json(profile_file, profile.report(input=shp_filename, output=csv_filename,
+                                                ways=len(state['digests']), changed=len(changed)))
+    return len(state['digests']), len(changed)
+
+
+def iter_delta(state, old_state, changed, deleted, headers):
+    """
+    Yields the rows of the changed TLIDs, then one row per deleted TLID.
+    """
+    for tlid, rows in state['ways']:
+        if tlid in changed:
+            change = 'changed' if tlid in old_state['digests'] else 'added'
+            for row in rows:
+                yield dict(zip(headers, row), change=change, tlid=tlid)
+    for tlid in deleted:
+        yield {'change': 'deleted', 'tlid': tlid}
@@ -0,0 +1,121 @@
+"""
+Array-backed store of the unique nodes of a county
+"""
+
+from array import array
+
+import numpy as np
+
+# Decimals of the node grid, the same as helpers.round_point()
+NODE_DECIMALS = 8
+NODE_SCALE = 10 ** NODE_DECIMALS
+
+# Quantized coordinates are packed into one integer as x * 2**NODE_BITS + y,
+# which is unique while |y| < 2**(NODE_BITS - 1): degrees within +-340 fit.
+NODE_BITS = 36
+
+
+def quantize(point):
+    """
+    Returns an integer key of a point on the grid of round_point(): two
+    points get the same key exactly when round_point() makes them equal.
+    """
+    return (round(round(point[0], NODE_DECIMALS) * NODE_SCALE) << NODE_BITS) \
+        + round(round(point[1], NODE_DECIMALS) * NODE_SCALE)
+
+
+class NodeStore:
+    """
+    The unique nodes of a county. Every node has an index, in the order
+    the nodes were first seen; its id is index + 1. Segments refer to
+    nodes by index.
+
+    Until set_unprojected() is called the store holds the first point seen at
+    every position, afterwards the unprojected (lat, lon) of every node.
+    identity_swap records how they were unprojected, see set_unprojected().
+    """
+
+    def __init__(self):
+        self.index = {}
+        self.x = array('d')
+        self.y = array('d')
+        self.lat = array('d')
+        self.lon = array('d')
+        self.identity_swap = None
+
+    def __len__(self):
+        return len(self.index)
+
+    def add(self, point):
+        """
+        Returns the index of the node at a point, adding it if it is new.
+        """
+        key = quantize(point)
+        index = self.index.get(key)
+        if index is None:
+            index = self.index[key] = len(self.x)
+            self.x.append(point[0])
+            self.y.append(point[1])
+        return index
+
+    def add_all(self, points):
+        """
+        Same as add() for all points of a geometry, returns a list of indexes.
+        """
+        index = self.index
+        x, y = self.x, self.y
+        indexes = []
+        for point in points:
+            key = quantize(point)
+            node = index.get(key)
+            if node is None:
+                node = index[key] = len(x)
+                x.append(point[0])
+                y.append(point[1])
+            indexes.append(node)
+        return indexes
+
+    def lookup(self, point):
+        """
+        Returns the index of the node at a point.
+        """
+        return self.index[quantize(point)]
+
+    def source_points(self):
+        """
+        Returns the points first seen at every node, in index order.
+        """
+        return list(zip(self.x, self.y))
+
+    def set_unprojected(self, points, identity_swap=None):
+        """
+        Stores the unprojected (lat, lon) of every node, in index order,
+        and drops the source points. identity_swap is the
+        CoordinateTransformer.identity_swap the points were unprojected
+        with: None if they were transformed.
+        """
+        self.identity_swap = identity_swap
+        self.lat = array('d', [point[0] for point in points])
+        self.lon = array('d', [point[1] for point in points])
+        self.x = array('d')
+        self.y = array('d')
+
+    @property
+    def next_id(self):
+        """
+        The first id after the ids of all nodes.
+        """
+        return len(self) + 1
+
+    def coordinates(self, index):
+        """
+        Returns the (lat, lon) of a node.
+        """
+        return self.lat[index], self.lon[index]
+
+    def arrays(self):
+        """
+        Returns the latitudes and longitudes of all nodes as NumPy arrays,
+        without copying them.
+        """
+        return np.frombuffer(self.lat, dtype=float), np.frombuffer(self.lon, dtype=float)
@@ -0,0 +1,176 @@
+"""
+Writers for the rows produced by convert.addressways
+"""
+
+import csv
+import sys
+from contextlib import contextmanager
+from itertools import islice
+
+from .helpers import create_wkt_linestring, create_ewkb_linestring, create_polyline
+
+# Columns of the interpolated house number output (tiger_address_convert.py)
+HNR_FIELDNAMES = [
+    'hnr',
+    'lat',
+    'lon',
+    'street',
+    'county',
+    'city',
+    'state',
+    'postcode',
+    'zip4',
+]
+
+# Columns of the address range output (tiger_address_range_convert.py)
+RANGE_FIELDNAMES = [
+    'from',
+    'to',
+    "interpolation",
+    'lat',
+    'lon',
+    'street',
+    'county',
+    'city',
+    'state',
+    'postcode',
+    'zip4',
+    'geometry',
+    'way'
+]
+
+# Columns holding floating point numbers, all others are strings
+FLOAT_FIELDS = {'lat', 'lon'}
+
+# Number of rows per Parquet row group
+ROW_GROUP_SIZE = 65536
+
+# Escapes of special characters in PostgreSQL's COPY text format
+COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+@contextmanager
+def open_output(file_name):
+    """
+    Opens an output file for writing text. '-' is stdout, file objects
+    are used as they are.
+    """
+    if hasattr(file_name, 'write'):
+        yield file_name
+    elif file_name == '-':
+        yield sys.stdout
+    else:
+        with open(file_name, mode='w', encoding='utf-8') as file:
+            yield file
+
+
+def write_to_csv(file_name, generator, headers):
+    """
+    Write results from a generator to a CSV file. Rows are written as the
+    generator produces them, so the output is never held in memory.
+
+    Parameters:
+    - file_name: The CSV file to write to.
+    - generator: A generator yielding rows of data (as dictionaries).
+    - headers: A list of column headers for the CSV file.
+    """
+    with open_output(file_name) as csvfile:
+        writer = csv.DictWriter(csvfile, delimiter=';', fieldnames=headers)
+        writer.writeheader()
+        writer.writerows(generator)
+
+
+def parquet_schema(headers):
+    """
+    Arrow schema for a list of column headers.
+    """
+    import pyarrow as pa
+
+    return pa.schema([(name, pa.float64() if name in FLOAT_FIELDS else pa.string()) for name in headers])
+
+
+def write_to_parquet(file_name, generator, headers, row_group_size=ROW_GROUP_SIZE):
+    """
+    Write results from a generator to a Parquet file, one row group per
+    row_group_size rows. Needs pyarrow.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    generator = iter(generator)
+    schema = parquet_schema(headers)
+    if file_name == '-':
+        file_name = sys.stdout
+    # Parquet is binary, write to the buffer below a text stream
+    file_name = getattr(file_name, 'buffer', file_name)
+    with pq.ParquetWriter(file_name, schema) as writer:
+        while True:
+            rows = list(islice(generator, row_group_size))
+            if not rows:
+                break
+            columns = []
+            for name in headers:
+                values = [row.get(name) for row in rows]
+                if name not in FLOAT_FIELDS:
+                    values = [None if value is None else str(value) for value in values]
+                columns.append(values)
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+
+
+def export_parquet_to_csv(parquet_file, csv_file):
+    """
+    Write a Parquet file created by write_to_parquet() as the same CSV file
+    write_to_csv() would have written.
+    """
+    import pyarrow.parquet as pq
+
+    parquet = pq.ParquetFile(parquet_file)
+    with open(csv_file, mode='w', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile, delimiter=';')
+        writer.writerow(parquet.schema_arrow.names)
+        for batch in parquet.iter_batches(batch_size=ROW_GROUP_SIZE):
+            columns = [column.to_pylist() for column in batch.columns]
+            writer.writerows(zip(*columns))
+
+
+def copy_value(value):
+    """
+    Formats a value for PostgreSQL's COPY text format.
+    """
+    if value is None:
+        return '\\N'
+    return str(value).translate(COPY_ESCAPES)
+
+
+def write_to_copy(file_name, generator, headers):
+    """
+    Write results from a generator in the text format of PostgreSQL's
+    COPY ... FROM STDIN: tab separated columns in the order of headers, no
+    header line and \\N for NULL.
+    """
+    with open_output(file_name) as output:
+        output.writelines('\t'.join([copy_value(row.get(name)) for name in headers]) + '\n'
+                          for row in generator)
+
+
+# Writers by output format
+WRITERS = {
+    'csv': write_to_csv,
+    'parquet': write_to_parquet,
+    'copy': write_to_copy,
+}
+
+# Encodings of the geometry of address ranges. Nominatim imports WKT,
+# the centroid scripts read all of them.
+GEOMETRY_ENCODERS = {
+    'wkt': create_wkt_linestring,
+    'ewkb': create_ewkb_linestring,
+    'polyline': create_polyline,
+}
+
+# Default geometry encoding by output format. COPY loads hex EWKB into a
+# PostGIS geometry column without parsing text.
+DEFAULT_GEOMETRY = {
+    'csv': 'wkt',
+    'parquet': 'wkt',
+    'copy': 'ewkb',
+}
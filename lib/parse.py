@@ -5,6 +5,8 @@ Parse ESRI Shapefile and extract geometries and tags (key-value pairs)
 import os.path
 import json
 import re
+import struct
+from functools import lru_cache
 
 try:
     from osgeo import ogr
@@ -38,14 +40,48 @@ def extract_fips_code(filename):
         return match.group(1)  # Return the captured FIPS code
     return None  # No match found
 
+def get_shapefile_path(filename):
+    """
+    Returns the path to open with OGR. Zip archives as published by the
+    Census Bureau are read in place through GDAL's /vsizip/ file system,
+    using the shapefile with the archive's name inside.
+
+    Args:
+        filename (str): Path to a .shp file or a .zip archive.
+
+    Returns:
+        str: The path OGR should open.
+    """
+    if filename.lower().endswith('.zip'):
+        inner_name = os.path.splitext(os.path.basename(filename))[0] + '.shp'
+        return '/vsizip/' + filename + '/' + inner_name
+    return filename
+
 def parse_shp_for_geom_and_tags(filename):
+    """
+    Returns a list of (geometry, tags) tuples for all features of a shapefile.
+    """
+    return list(iter_shp_for_geom_and_tags(filename))
+
+def iter_shp_for_geom_and_tags(filename, use_arrow=False):
+    """
+    Yields (geometry, tags) tuples one feature at a time while reading the
+    shapefile (or the zip archive containing it), so the features never have
+    to be held in memory together.
+
+    With use_arrow, attributes and geometries are read in batches of
+    columns through OGR's Arrow stream interface where GDAL supports it
+    (GDAL >= 3.6), falling back to reading feature by feature otherwise.
+    """
     # ogr.RegisterAll()
 
+    filename = get_shapefile_path(filename)
+
     ogr_driver = ogr.GetDriverByName("ESRI Shapefile")
     po_ds = ogr_driver.Open(filename)
 
     if po_ds is None:
-        raise "Open failed."
+        raise IOError("Open failed: %s" % filename)
 
     po_layer = po_ds.GetLayer(0)
 
@@ -57,23 +93,42 @@ def parse_shp_for_geom_and_tags(filename):
 
     po_layer.ResetReading()
 
-    ret = []
-
     fips = extract_fips_code(filename)
     if fips is None:
         print("Fips None for file {}", filename)
-        return ret
+        return
     
+    if use_arrow and hasattr(po_layer, "GetArrowStreamAsNumPy"):
+        yield from iter_arrow_geom_and_tags(po_layer, fips)
+        return
+
+    field_indexes = get_field_indexes(po_layer.GetLayerDefn())
+
     po_feature = po_layer.GetNextFeature()
     while po_feature:
-        tags = get_tags_from_feature(po_feature, fips)
+        tags = get_tags_from_feature(po_feature, fips, field_indexes)
         geom = get_geometry_from_feature(po_feature)
 
-        ret.append( (geom, tags) )
+        yield (geom, tags)
 
         po_feature = po_layer.GetNextFeature()
 
-    return ret
+def iter_arrow_geom_and_tags(po_layer, fips):
+    """
+    Yields (geometry, tags) tuples like iter_shp_for_geom_and_tags(), but
+    reads whole attribute and geometry columns per batch from the layer's
+    Arrow stream instead of calling into OGR for every field of every feature.
+    """
+    geometry_column = po_layer.GetGeometryColumn() or "wkb_geometry"
+    stream = po_layer.GetArrowStreamAsNumPy(options=["INCLUDE_FID=NO"])
+    for batch in stream:
+        names = [name for name in FIELD_NAMES if name in batch]
+        # tolist() turns masked (null) entries into None
+        columns = [[value.decode('utf-8') if isinstance(value, bytes) else value
+                    for value in batch[name].tolist()]
+                   for name in names]
+        for wkb, row in zip(batch[geometry_column], zip(*columns)):
+            yield get_geometry_from_wkb(wkb), get_tags_from_values(dict(zip(names, row)), fips)
 
 def get_geometry_from_feature(po_feature):
     geom = []
@@ -83,70 +138,121 @@ def get_geometry_from_feature(po_feature):
     return geom
 
 
-def get_field_if_exists(feature, field_name):
+def get_geometry_from_wkb(wkb):
+    """
+    Returns the points of a WKB LineString as a list of (x, y) tuples,
+    like get_geometry_from_feature() does for an OGR feature.
+    """
+    byte_order = '<' if wkb[0] == 1 else '>'
+    geometry_type, count = struct.unpack_from(byte_order + 'II', wkb, 1)
+    if geometry_type == 2:
+        return list(struct.iter_unpack(byte_order + 'dd', wkb[9:9 + 16 * count]))
+    if geometry_type in (1002, 0x80000002):
+        return [(x, y) for x, y, _z in struct.iter_unpack(byte_order + 'ddd', wkb[9:9 + 24 * count])]
+
+    # Anything else is left to OGR
+    rawgeom = ogr.CreateGeometryFromWkb(bytes(wkb))
+    return [(rawgeom.GetX(i), rawgeom.GetY(i)) for i in range(rawgeom.GetPointCount())]
+
+
+# Address fields with fallback
+ADDRESS_FIELDS = [
+    ("LFROMHN", "LFROMADD", "tiger:lfromadd"),
+    ("RFROMHN", "RFROMADD", "tiger:rfromadd"),
+    ("LTOHN", "LTOADD", "tiger:ltoadd"),
+    ("RTOHN", "RTOADD", "tiger:rtoadd"),
+]
+
+# ZIP fields
+ZIP_FIELDS = {
+    "ZIPL": "tiger:zip_left",
+    "ZIPR": "tiger:zip_right",
+    "PLUS4L": "tiger:zip4_left",
+    "PLUS4R": "tiger:zip4_right",
+}
+
+# All fields the tags are built from
+FIELD_NAMES = ["TLID", "FULLNAME"] \
+              + [name for primary, fallback, _tag in ADDRESS_FIELDS for name in (primary, fallback)] \
+              + list(ZIP_FIELDS)
+
+def get_field_indexes(layer_definition):
     """
-    Check if a field exists in an OGR feature and return its value if it does.
+    Look up the indexes of all fields the tags are built from. Done once per
+    layer instead of once per feature and field.
 
-    :param feature: OGR Feature object
-    :param field_name: Name of the field to check
-    :return: The field value if it exists, or None if the field does not exist
+    :param layer_definition: OGR FeatureDefn of the layer
+    :return: Dictionary of field name to index, for the fields that exist
     """
-    if feature.GetFieldIndex(field_name) != -1:
-        return feature.GetField(field_name)
+    indexes = {}
+    for name in FIELD_NAMES:
+        index = layer_definition.GetFieldIndex(name)
+        if index != -1:
+            indexes[name] = index
+    return indexes
+
+@lru_cache(maxsize=None)
+def get_county_and_state(fips):
+    """
+    Look up county name and state abbreviation of a FIPS code.
+
+    :param fips: FIPS code as a string
+    :return: Tuple of county and state, or None if the code is unknown
+    """
+    county_and_state = county_fips_data.get(fips)
+    if county_and_state:  # Example: 'Perquimans, NC'
+        result = re.match(r'^(.+), ([A-Z]{2})$', county_and_state)
+        if result:
+            return result.group(1), result.group(2)
     return None
 
-def get_tags_from_feature(po_feature, fips):
+def get_tags_from_feature(po_feature, fips, field_indexes=None):
     """
     Extract tags from a given feature and optional FIPS code.
 
     :param po_feature: OGR Feature object
     :param fips: FIPS code as a string
+    :param field_indexes: Result of get_field_indexes() for the feature's layer
+    :return: Dictionary of tags
+    """
+    if field_indexes is None:
+        field_indexes = get_field_indexes(po_feature.GetDefnRef())
+
+    values = {name: po_feature.GetField(index) for name, index in field_indexes.items()}
+    return get_tags_from_values(values, fips)
+
+def get_tags_from_values(values, fips):
+    """
+    Build the tags from the field values of a feature.
+
+    :param values: Dictionary of field name to value, missing fields may be left out
+    :param fips: FIPS code as a string
     :return: Dictionary of tags
     """
     tags = {}
 
     # Mandatory tag
-    tags["tiger:way_id"] = int(get_field_if_exists(po_feature, "TLID"))
+    tags["tiger:way_id"] = int(values.get("TLID"))
 
     # Optional name tag
-    fullname = get_field_if_exists(po_feature, "FULLNAME")
+    fullname = values.get("FULLNAME")
     if fullname:
         tags["name"] = fullname
 
     # FIPS-based county and state
     if fips:
-        county_and_state = county_fips_data.get(fips)
-        if county_and_state:  # Example: 'Perquimans, NC'
-            result = re.match(r'^(.+), ([A-Z]{2})$', county_and_state)
-            if result:
-                tags["tiger:county"] = result.group(1)
-                tags["tiger:state"] = result.group(2)
-
-    # Address fields with fallback
-    address_fields = [
-        ("LFROMHN", "LFROMADD", "tiger:lfromadd"),
-        ("RFROMHN", "RFROMADD", "tiger:rfromadd"),
-        ("LTOHN", "LTOADD", "tiger:ltoadd"),
-        ("RTOHN", "RTOADD", "tiger:rtoadd"),
-    ]
-    for primary, fallback, tag_name in address_fields:
-        value = get_field_if_exists(po_feature, primary) or get_field_if_exists(po_feature, fallback)
+        county_and_state = get_county_and_state(fips)
+        if county_and_state:
+            tags["tiger:county"], tags["tiger:state"] = county_and_state
+
+    for primary, fallback, tag_name in ADDRESS_FIELDS:
+        value = values.get(primary) or values.get(fallback)
         if value is not None:
             tags[tag_name] = value
 
-    # ZIP fields
-    zip_fields = {
-        "ZIPL": "tiger:zip_left",
-        "ZIPR": "tiger:zip_right",
-        "PLUS4L": "tiger:zip4_left",
-        "PLUS4R": "tiger:zip4_right",
-    }
-    for field, tag_name in zip_fields.items():
-        value = get_field_if_exists(po_feature, field)
+    for field, tag_name in ZIP_FIELDS.items():
+        value = values.get(field)
         if value is not None:
             tags[tag_name] = value
 
-    
-
     return tags
-
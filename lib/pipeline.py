@@ -0,0 +1,197 @@
+"""
+Conversion of TIGER files into CSV, for a single county or all counties
+in a directory using a pool of worker processes
+"""
+
+import os
+import re
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .parse import iter_shp_for_geom_and_tags
+from .convert import addressways, compile_lists
+from .helpers import peak_rss_mb
+from .output import WRITERS, GEOMETRY_ENCODERS, DEFAULT_GEOMETRY, HNR_FIELDNAMES, RANGE_FIELDNAMES
+from .zip_code_lookup import ZipCodeLookup, is_snapshot
+from .incremental import convert_file_incremental, file_fingerprint
+from .profiling import Profile, profile_stage, profile_iterate, feature_vertices, summarize, format_summary, \
+                       write_json, read_json
+
+# Default location of the ZIP code database
+ZIP_CODE_FILE = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'zip_db.csv'))
+
+# Input files as published by the Census Bureau, e.g. tl_2023_37143_edges.zip
+INPUT_REGEX = r'_([0-9]{5})_(addrfeat|edges)\.(zip|shp)$'
+
+
+def convert_file(shp_filename, csv_filename, zip_lookup, compile_as_ranges,
+                 identity_tolerance=None, vectorized=False, use_arrow=False, output_format='csv',
+                 geometry_format=None, profile_file=None):
+    """
+    Main feature: reads a file, writes a file in one of the formats of
+    output.WRITERS. With csv_filename '-' the rows are written to stdout and
+    all messages to stderr. geometry_format is one of the encodings of
+    output.GEOMETRY_ENCODERS, by default the one of the output format.
+    With profile_file, the time and throughput of every stage are written
+    there as JSON (see profiling.Profile).
+    """
+    if csv_filename == '-':
+        output = sys.stdout
+        with redirect_stdout(sys.stderr):
+            convert_file(shp_filename, output, zip_lookup, compile_as_ranges,
+                         identity_tolerance, vectorized, use_arrow, output_format, geometry_format,
+                         profile_file)
+        return
+
+    profile = Profile() if profile_file else None
+
+    print("parsing shpfile %s" % shp_filename)
+    features = iter_shp_for_geom_and_tags(shp_filename, use_arrow)
+    features = profile_iterate(profile, 'parse', features, 'features', feature_vertices)
+
+    i, nodes, waylist = compile_lists(features, identity_tolerance, profile)
+
+    rows = addressways(waylist, nodes, i, zip_lookup, compile_as_ranges, vectorized,
+                       GEOMETRY_ENCODERS[geometry_format or DEFAULT_GEOMETRY[output_format]])
+    rows = profile_iterate(profile, 'addressways', rows, 'rows')
+
+    print("writing %s" % getattr(csv_filename, 'name', csv_filename))
+    with profile_stage(profile, 'write'):
+        WRITERS[output_format](csv_filename, rows, RANGE_FIELDNAMES if compile_as_ranges else HNR_FIELDNAMES)
+    print("peak memory usage %d MB" % peak_rss_mb())
+
+    if profile is not None:
+        write_json(profile_file, profile.report(input=shp_filename,
+                                                output=getattr(csv_filename, 'name', csv_filename)))
+
+
+def find_input_files(input_dir):
+    """
+    Returns (path, output name) of all TIGER files in a directory, largest
+    first so the big counties don't end up running alone at the end.
+    A county found both as .zip and as extracted .shp is converted once,
+    from the .shp, as both would write the same output files.
+    """
+    counties = {}
+    for name in sorted(os.listdir(input_dir)):
+        match = re.search(INPUT_REGEX, name)
+        if match:
+            county_id = "%s_%s" % (match.group(1), match.group(2))
+            if county_id in counties and match.group(3) != 'shp':
+                continue
+            path = os.path.join(input_dir, name)
+            counties[county_id] = (os.path.getsize(path), path, county_id)
+    files = sorted(counties.values(), reverse=True)
+    return [(path, county_id) for _size, path, county_id in files]
+
+
+# ZIP code lookup of a worker process, loaded once by init_worker()
+_zip_lookup = None
+
+def init_worker(zip_code_file):
+    """
+    Loads the lookups shared by all counties a worker process converts.
+    """
+    global _zip_lookup
+    _zip_lookup = ZipCodeLookup(zip_code_file)
+
+
+def convert_county(shp_filename, csv_filename, compile_as_ranges, options, incremental=None, profile_file=None):
+    """
+    Converts one county in a worker process. Returns the time it took in
+    seconds and the peak memory usage of the worker so far.
+    incremental is (state file, delta file, ZIP code database fingerprint)
+    to convert with convert_file_incremental().
+    """
+    start = time.perf_counter()
+    if incremental:
+        state_file, delta_filename, zip_fingerprint = incremental
+        convert_file_incremental(shp_filename, csv_filename, delta_filename, state_file, _zip_lookup,
+                                 zip_fingerprint, compile_as_ranges, profile_file=profile_file, **options)
+    else:
+        convert_file(shp_filename, csv_filename, _zip_lookup, compile_as_ranges, profile_file=profile_file,
+                     **options)
+    return time.perf_counter() - start, peak_rss_mb()
+
+
+def convert_all(input_dir, output_dir, compile_as_ranges, workers=None, zip_code_file=ZIP_CODE_FILE,
+                state_dir=None, profile_dir=None, **options):
+    """
+    Converts all TIGER files of a directory in parallel, one output file
+    per county. Takes the same options as convert_file().
+    With state_dir, only ways that changed since the last run with the same
+    state_dir are converted again, and a delta file is written per county
+    (see incremental.convert_file_incremental).
+    With profile_dir, a profile is written there per county, and a summary
+    of all of them to summary.json (see profiling.summarize).
+    Returns the list of counties that failed.
+    """
+    workers = workers or os.cpu_count()
+    files = find_input_files(input_dir)
+    print("Found %d files." % len(files))
+    print("Using %d parallel processes." % workers)
+
+    zip_fingerprint = None
+    if state_dir:
+        os.makedirs(state_dir, exist_ok=True)
+        zip_fingerprint = file_fingerprint(zip_code_file)
+    if profile_dir:
+        os.makedirs(profile_dir, exist_ok=True)
+
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        # Parse the ZIP code CSV once, the workers map the snapshot
+        if not is_snapshot(zip_code_file):
+            snapshot_file = os.path.join(snapshot_dir, 'zip_db.snapshot')
+            ZipCodeLookup(zip_code_file).save_snapshot(snapshot_file)
+            zip_code_file = snapshot_file
+        return _convert_files(files, output_dir, compile_as_ranges, workers, zip_code_file, options,
+                              state_dir, zip_fingerprint, profile_dir)
+
+
+def _convert_files(files, output_dir, compile_as_ranges, workers, zip_code_file, options,
+                   state_dir=None, zip_fingerprint=None, profile_dir=None):
+    extension = '.' + options.get('output_format', 'csv')
+    start = time.perf_counter()
+    timings = []
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(zip_code_file,)) as executor:
+        futures = {}
+        for path, county_id in files:
+            csv_filename = os.path.join(output_dir, county_id + extension)
+            incremental = None
+            if state_dir:
+                incremental = (os.path.join(state_dir, county_id + '.state'),
+                               os.path.join(output_dir, county_id + '.delta' + extension),
+                               zip_fingerprint)
+            profile_file = os.path.join(profile_dir, county_id + '.json') if profile_dir else None
+            future = executor.submit(convert_county, path, csv_filename, compile_as_ranges, options, incremental,
+                                     profile_file)
+            futures[future] = county_id
+
+        for future in as_completed(futures):
+            county_id = futures[future]
+            try:
+                elapsed, peak = future.result()
+            except Exception as exc:
+                print("%s failed: %s" % (county_id, exc))
+                failed.append(county_id)
+                continue
+            timings.append((elapsed, county_id))
+            print("%s done in %.1f s, worker peak memory %d MB" % (county_id, elapsed, peak))
+
+    print("Wrote %d files in %.1f s." % (len(timings), time.perf_counter() - start))
+    for elapsed, county_id in sorted(timings, reverse=True)[:10]:
+        print("  %s: %.1f s" % (county_id, elapsed))
+    if failed:
+        print("Failed: %s" % ", ".join(sorted(failed)))
+
+    if profile_dir:
+        summary = summarize({county_id: read_json(os.path.join(profile_dir, county_id + '.json'))
+                             for _elapsed, county_id in timings})
+        write_json(os.path.join(profile_dir, 'summary.json'), summary)
+        for line in format_summary(summary):
+            print(line)
+    return failed
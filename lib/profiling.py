@@ -0,0 +1,217 @@
+"""
+Per-stage wall time and throughput of a conversion, written as JSON
+
+The stages of a county are:
+
+    parse        reading the features from the shapefile
+    collect      numbering the nodes and grouping the segments by way
+    transform    unprojecting the nodes
+    join         joining the segments of every way (glom_all)
+    addressways  calculating the address ways and their rows
+    write        writing the rows
+
+Reading, converting and writing are streamed into each other, so time is
+accounted to one stage at a time: pulling the next feature or row through
+an iterator wrapped by Profile.iterate() pauses the stage that pulls it.
+"""
+
+import json
+import time
+from contextlib import contextmanager, nullcontext
+
+from .helpers import peak_rss_mb
+
+# The stages in pipeline order, the order they are reported in
+STAGES = ['parse', 'collect', 'transform', 'join', 'addressways', 'write']
+
+# Counts of a stage that a rate per second is reported for
+UNITS = ['features', 'vertices', 'ways', 'rows']
+
+# Number of counties listed in the slowest counties of a summary
+SUMMARY_TOP = 10
+
+
+class Profile:
+    """
+    Collects the wall time and counts of the stages of one conversion.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.current = None
+        self.start = self.last = time.perf_counter()
+
+    def _stage(self, name):
+        return self.stages.setdefault(name, {'seconds': 0.0})
+
+    def switch(self, name):
+        """
+        Accounts the time since the last switch to the current stage and
+        makes name the current stage. Returns the stage that was current.
+        """
+        now = time.perf_counter()
+        if self.current is not None:
+            self._stage(self.current)['seconds'] += now - self.last
+        self.last = now
+        previous, self.current = self.current, name
+        return previous
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Accounts the time spent in the with block to a stage.
+        """
+        previous = self.switch(name)
+        try:
+            yield
+        finally:
+            self.switch(previous)
+            self._stage(name)['peak_rss_mb'] = peak_rss_mb()
+
+    def count(self, name, unit, number):
+        """
+        Adds number to the count of unit (one of UNITS) of a stage.
+        """
+        stage = self._stage(name)
+        stage[unit] = stage.get(unit, 0) + number
+
+    def iterate(self, name, iterable, unit, vertices=None):
+        """
+        Yields the items of iterable, accounting the time to produce them to
+        a stage and counting them as unit. vertices returns the number of
+        vertices of an item, to count those too.
+        """
+        iterator = iter(iterable)
+        items = 0
+        total_vertices = 0
+        try:
+            while True:
+                previous = self.switch(name)
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    self.switch(previous)
+                items += 1
+                if vertices is not None:
+                    total_vertices += vertices(item)
+                yield item
+        finally:
+            self.count(name, unit, items)
+            if vertices is not None:
+                self.count(name, 'vertices', total_vertices)
+            self._stage(name)['peak_rss_mb'] = peak_rss_mb()
+
+    def report(self, **info):
+        """
+        Returns the profile as a dict that can be written as JSON, with the
+        keys of info in front. Peak RSS is that of the process so far, for
+        a worker process of convert_all() including earlier counties.
+        """
+        return dict(info, seconds=time.perf_counter() - self.start, peak_rss_mb=peak_rss_mb(),
+                    stages={name: with_rates(self.stages[name]) for name in ordered(self.stages)})
+
+
+def profile_stage(profile, name):
+    """
+    Profile.stage() of profile, if there is one.
+    """
+    return nullcontext() if profile is None else profile.stage(name)
+
+
+def profile_iterate(profile, name, iterable, unit, vertices=None):
+    """
+    Profile.iterate() of profile, if there is one.
+    """
+    return iterable if profile is None else profile.iterate(name, iterable, unit, vertices)
+
+
+def feature_vertices(feature):
+    """
+    Returns the number of vertices of a (geometry, tags) feature.
+    """
+    return len(feature[0])
+
+
+def ordered(stages):
+    """
+    Returns the names of stages in the order of STAGES, others last.
+    """
+    return sorted(stages, key=lambda name: STAGES.index(name) if name in STAGES else len(STAGES))
+
+
+def with_rates(stage):
+    """
+    Returns a copy of a stage with the rate per second of every count.
+    """
+    stage = dict(stage)
+    for unit in UNITS:
+        if unit in stage:
+            stage[unit + '_per_second'] = stage[unit] / stage['seconds'] if stage['seconds'] else None
+    return stage
+
+
+def summarize(reports, top=SUMMARY_TOP):
+    """
+    Aggregates the reports of many counties (a dict of county id to
+    Profile.report()). Lists the slowest counties, and those slowest per
+    vertex read, which stand out when a county is pathological rather
+    than large.
+    """
+    seconds = sum(report['seconds'] for report in reports.values())
+    stages = {}
+    for report in reports.values():
+        for name, stage in report['stages'].items():
+            total = stages.setdefault(name, {'seconds': 0.0})
+            for key in ['seconds'] + UNITS:
+                if key in stage:
+                    total[key] = total.get(key, 0) + stage[key]
+
+    def county(county_id):
+        report = reports[county_id]
+        parse = report['stages'].get('parse', {})
+        return {
+            'county': county_id,
+            'seconds': report['seconds'],
+            'features': parse.get('features'),
+            'vertices': parse.get('vertices'),
+            'peak_rss_mb': report['peak_rss_mb'],
+        }
+
+    def seconds_per_vertex(county_id):
+        vertices = reports[county_id]['stages'].get('parse', {}).get('vertices')
+        return reports[county_id]['seconds'] / vertices if vertices else 0.0
+
+    return {
+        'counties': len(reports),
+        'seconds': seconds,
+        'max_peak_rss_mb': max((report['peak_rss_mb'] for report in reports.values()), default=None),
+        'stages': {name: dict(with_rates(stages[name]), share=stages[name]['seconds'] / seconds if seconds else None)
+                   for name in ordered(stages)},
+        'slowest': [county(county_id) for county_id
+                    in sorted(reports, key=lambda county_id: reports[county_id]['seconds'], reverse=True)[:top]],
+        'slowest_per_vertex': [dict(county(county_id), seconds_per_vertex=seconds_per_vertex(county_id))
+                               for county_id in sorted(reports, key=seconds_per_vertex, reverse=True)[:top]],
+    }
+
+
+def format_summary(summary):
+    """
+    Returns the lines of a summary for the console.
+    """
+    lines = ["Profiled %d counties, %.1f s in total:" % (summary['counties'], summary['seconds'])]
+    for name, stage in summary['stages'].items():
+        lines.append("  %-12s %8.1f s %5.1f%%" % (name, stage['seconds'], 100 * (stage['share'] or 0)))
+    return lines
+
+
+def write_json(filename, data):
+    with open(filename, 'w', encoding='utf-8') as file:
+        json.dump(data, file, indent=2)
+        file.write('\n')
+
+
+def read_json(filename):
+    with open(filename, encoding='utf-8') as file:
+        return json.load(file)
@@ -20,6 +20,37 @@ class CoordinateTransformer:
 
         self.transformer = osr.CoordinateTransformation(self.source_proj, self.target_proj)
 
+        # Set by check_identity() when the transformation can be skipped:
+        # False keeps the axis order, True swaps x and y.
+        self.identity_swap = None
+        self.max_deviation = None
+
+    def check_identity(self, sample, tolerance):
+        """
+        Transform a sample of points and compare the results with the input.
+        If every point is within the tolerance of its input, either as is or
+        with the axes swapped, later calls to unproject() and unproject_many()
+        skip the transformation and only reorder the axes.
+
+        :param sample: A sequence of (x, y) coordinates in the source projection.
+        :param tolerance: Largest accepted difference per coordinate, in target units.
+        :return: The maximum deviation measured on the sample, for the axis
+                 order that fits best.
+        """
+        self.identity_swap = None
+        projected = self.unproject_many(sample)
+
+        deviation = max((max(abs(p[0] - s[0]), abs(p[1] - s[1]))
+                         for p, s in zip(projected, sample)), default=0.0)
+        swapped_deviation = max((max(abs(p[0] - s[1]), abs(p[1] - s[0]))
+                                 for p, s in zip(projected, sample)), default=0.0)
+
+        swap = swapped_deviation < deviation
+        self.max_deviation = min(deviation, swapped_deviation)
+        if sample and self.max_deviation <= tolerance:
+            self.identity_swap = swap
+        return self.max_deviation
+
     def unproject(self, point):
         """
         Convert a point from the source projection to the target projection.
@@ -27,9 +58,29 @@ class CoordinateTransformer:
         :param point: A tuple of (x, y) coordinates in the source projection.
         :return: A tuple of (longitude, latitude) in the target projection.
         """
+        if self.identity_swap is not None:
+            return (point[1], point[0]) if self.identity_swap else (point[0], point[1])
         projected = self.transformer.TransformPoint(point[0], point[1])
         return (projected[0], projected[1])
 
+    def unproject_many(self, points):
+        """
+        Convert a batch of points from the source projection to the target projection
+        with a single call into GDAL instead of one call per point.
+
+        :param points: A sequence of (x, y) coordinates in the source projection.
+        :return: A list of (longitude, latitude) tuples in the target projection,
+                 in the same order as the input.
+        """
+        if self.identity_swap is not None:
+            if self.identity_swap:
+                return [(point[1], point[0]) for point in points]
+            return [(point[0], point[1]) for point in points]
+        if len(points) == 0:
+            return []
+        projected = self.transformer.TransformPoints(points)
+        return [(point[0], point[1]) for point in projected]
+
     def destroy(self):
         """
         Clean up the resources used by the transformer.
@@ -0,0 +1,443 @@
+"""
+Reverse geocoding against the address ranges of tiger_address_range_convert.py
+
+build_index() writes a spatial index of the address ways of range files
+to a directory of .npy files, which RangeIndex maps into memory:
+
+    vertices, line_offsets   the points (lon, lat) of all address ways and
+                             where every way starts (CSR)
+    measures                 distance of every point from the start of its
+                             way, as cumulative_lengths() measures it
+    from_hnr, to_hnr, steps  the numeric house number range of every way
+    cell_keys, cell_offsets, the segments whose bounding box overlaps each
+    cell_segments            grid cell, for the occupied cells only (CSR)
+    <column>.blob/.offsets   the text columns of the ranges
+
+RangeIndex.query() looks up the nearest address way of many points at once
+with array operations. Every range is an address way on one side of the
+street, so the nearest one is on the side of the point. The house number
+is found by inverting interpolate_along_line(): numbers are spread
+evenly along the way from its lowest number at the first point, in the
+steps of the range's interpolation.
+"""
+
+import csv
+import json
+import math
+import os
+from array import array
+
+import numpy as np
+
+from .helpers import parse_house_number, decode_linestring
+
+INDEX_VERSION = 1
+
+# Size of the grid cells, in degrees
+DEFAULT_CELL_SIZE = 0.002
+
+# Points further than this from any address way, in meters, have no result
+DEFAULT_MAX_DISTANCE = 200
+
+# Points looked up together, and the largest number of candidate segments
+# compared at once, to bound the memory of a batch
+DEFAULT_BATCH_SIZE = 100000
+MAX_CANDIDATES = 4000000
+
+# Meters per degree of latitude, for the local equirectangular distances
+METERS_PER_DEGREE = 111320
+
+INTERPOLATION_STEPS = {'odd': 2, 'even': 2, 'all': 1}
+
+STRING_COLUMNS = ['from', 'to', 'interpolation', 'street', 'county', 'city', 'state', 'postcode', 'zip4']
+
+# Columns query_csv() adds to the rows of the points
+RESULT_FIELDNAMES = ['housenumber', 'street', 'city', 'county', 'state', 'postcode', 'zip4', 'distance']
+
+
+class StringColumnWriter:
+    """
+    Collects the values of a text column as one UTF-8 blob and offsets.
+    """
+
+    def __init__(self):
+        self.blob = bytearray()
+        self.offsets = array('q', [0])
+
+    def append(self, value):
+        self.blob.extend(value.encode('utf-8'))
+        self.offsets.append(len(self.blob))
+
+    def save(self, index_dir, column):
+        np.save(os.path.join(index_dir, column + '.blob.npy'), np.frombuffer(bytes(self.blob), dtype=np.uint8))
+        np.save(os.path.join(index_dir, column + '.offsets.npy'), np.frombuffer(self.offsets, dtype=np.int64))
+
+
+def build_index(range_files, index_dir, cell_size=DEFAULT_CELL_SIZE):
+    """
+    Reads the CSV files written by tiger_address_range_convert.py and writes
+    the index of their address ways to index_dir. Ranges without numeric
+    house numbers are left out. Returns the number of ranges indexed.
+    """
+    coordinates = array('d')
+    line_offsets = array('q', [0])
+    from_hnr = array('q')
+    to_hnr = array('q')
+    steps = array('b')
+    strings = {column: StringColumnWriter() for column in STRING_COLUMNS}
+
+    for filename in range_files:
+        with open(filename, newline='', encoding='utf-8') as file:
+            for row in csv.DictReader(file, delimiter=';'):
+                if row['geometry'] == 'geometry':  # Header lines of concatenated files
+                    continue
+                step = INTERPOLATION_STEPS.get(row['interpolation'])
+                numeric_from = parse_house_number(row['from'])[1]
+                numeric_to = parse_house_number(row['to'])[1]
+                if step is None or numeric_from is None or numeric_to is None:
+                    continue
+                points = decode_linestring(row['geometry'])
+                if len(points) < 2:
+                    continue
+
+                for point in points:
+                    coordinates.extend(point)
+                line_offsets.append(len(coordinates) // 2)
+                from_hnr.append(numeric_from)
+                to_hnr.append(numeric_to)
+                steps.append(step)
+                for column, values in strings.items():
+                    values.append(row[column] or '')
+
+    os.makedirs(index_dir, exist_ok=True)
+    vertices = np.frombuffer(coordinates, dtype=float).reshape(-1, 2)
+    line_offsets = np.frombuffer(line_offsets, dtype=np.int64)
+
+    # Distances along the ways in degrees of (lat, lon), like cumulative_lengths()
+    lengths = np.sqrt((np.diff(vertices, axis=0)**2).sum(axis=1))
+    measures = np.concatenate(([0.0], np.cumsum(lengths)))[:len(vertices)]
+    measures -= np.repeat(measures[line_offsets[:-1]], np.diff(line_offsets))
+
+    # Segments start at every point but the last of a way
+    is_start = np.ones(len(vertices), dtype=bool)
+    is_start[line_offsets[1:] - 1] = False
+    segments = np.flatnonzero(is_start)
+
+    origin = vertices.min(axis=0) if len(vertices) else np.zeros(2)
+    cells = np.floor((vertices - origin) / cell_size).astype(np.int64)
+    nx, ny = (cells.max(axis=0) + 1).tolist() if len(vertices) else (0, 0)
+    cell_keys, cell_offsets, cell_segments = segment_cells(cells, segments, nx)
+
+    arrays = {
+        'vertices': vertices,
+        'line_offsets': line_offsets,
+        'measures': measures,
+        'from_hnr': np.frombuffer(from_hnr, dtype=np.int64),
+        'to_hnr': np.frombuffer(to_hnr, dtype=np.int64),
+        'steps': np.frombuffer(steps, dtype=np.int8),
+        'cell_keys': cell_keys,
+        'cell_offsets': cell_offsets,
+        'cell_segments': cell_segments,
+    }
+    for name, values in arrays.items():
+        np.save(os.path.join(index_dir, name + '.npy'), values)
+    for column, values in strings.items():
+        values.save(index_dir, column)
+
+    meta = {
+        'version': INDEX_VERSION,
+        'cell_size': cell_size,
+        'origin': origin.tolist(),
+        'nx': nx,
+        'ny': ny,
+        'ranges': len(from_hnr),
+    }
+    with open(os.path.join(index_dir, 'index.json'), 'w', encoding='utf-8') as file:
+        json.dump(meta, file, indent=2)
+    return len(from_hnr)
+
+
+def segment_cells(cells, segments, nx):
+    """
+    Returns the sorted keys (y * nx + x) of the grid cells overlapped by the
+    bounding box of any segment, the offsets of every cell's segments and
+    the segments, by the cells of their points.
+    """
+    start, end = cells[segments], cells[segments + 1]
+    low, high = np.minimum(start, end), np.maximum(start, end)
+    width = high[:, 0] - low[:, 0] + 1
+    counts = width * (high[:, 1] - low[:, 1] + 1)
+
+    owners = np.repeat(segments, counts)
+    local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    width = np.repeat(width, counts)
+    keys = (np.repeat(low[:, 1], counts) + local // width) * nx + np.repeat(low[:, 0], counts) + local % width
+
+    order = np.argsort(keys, kind='stable')
+    cell_keys, cell_counts = np.unique(keys[order], return_counts=True)
+    cell_offsets = np.concatenate(([0], np.cumsum(cell_counts))).astype(np.int64)
+    return cell_keys.astype(np.int64), cell_offsets, owners[order].astype(np.int64)
+
+
+def expand_ranges(starts, counts):
+    """
+    Returns the concatenation of range(start, start + count) of all pairs.
+    """
+    return np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(starts, counts)
+
+
+class StringColumn:
+    """
+    A text column of the index, mapped into memory.
+    """
+
+    def __init__(self, index_dir, column):
+        self.blob = np.load(os.path.join(index_dir, column + '.blob.npy'), mmap_mode='r')
+        self.offsets = np.load(os.path.join(index_dir, column + '.offsets.npy'), mmap_mode='r')
+
+    def __getitem__(self, index):
+        return bytes(self.blob[self.offsets[index]:self.offsets[index + 1]]).decode('utf-8')
+
+
+class RangeIndex:
+    """
+    The index written by build_index(), mapped into memory.
+    """
+
+    def __init__(self, index_dir):
+        with open(os.path.join(index_dir, 'index.json'), encoding='utf-8') as file:
+            meta = json.load(file)
+        if meta['version'] != INDEX_VERSION:
+            raise ValueError("Index version %s, expected %s: %s" % (meta['version'], INDEX_VERSION, index_dir))
+        self.cell_size = meta['cell_size']
+        self.origin = np.array(meta['origin'])
+        self.nx = meta['nx']
+        self.ny = meta['ny']
+
+        def load(name):
+            # A plain view of the memory map, faster to index
+            return np.asarray(np.load(os.path.join(index_dir, name + '.npy'), mmap_mode='r'))
+
+        self.vertices = load('vertices')
+        self.line_offsets = load('line_offsets')
+        self.measures = load('measures')
+        self.from_hnr = load('from_hnr')
+        self.to_hnr = load('to_hnr')
+        self.steps = load('steps')
+        self.cell_keys = load('cell_keys')
+        self.cell_offsets = load('cell_offsets')
+        self.cell_segments = load('cell_segments')
+        self.strings = {column: StringColumn(index_dir, column) for column in STRING_COLUMNS}
+
+    def __len__(self):
+        return len(self.from_hnr)
+
+    def query(self, lon, lat, max_distance=DEFAULT_MAX_DISTANCE, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Looks up the nearest address way of every point. Returns a dict of
+        arrays: 'range' (-1 where there is none within max_distance meters),
+        'distance' in meters, 'fraction' of the way to the nearest point on
+        it and the numeric 'housenumber' there (-1 without a range).
+        """
+        lon = np.asarray(lon, dtype=float).reshape(-1)
+        lat = np.asarray(lat, dtype=float).reshape(-1)
+        results = [self._query_batch(lon[start:start + batch_size], lat[start:start + batch_size], max_distance)
+                   for start in range(0, len(lon), batch_size)]
+        if not results:
+            results = [self._query_batch(lon, lat, max_distance)]
+        return {key: np.concatenate([result[key] for result in results]) for key in results[0]}
+
+    def _candidate_cells(self, lon, lat, max_distance):
+        """
+        Returns the start and the number of the segments of the cells within
+        max_distance of every point, as (points, cells) arrays.
+        """
+        # Cells are narrower in meters towards the poles
+        min_cos = max(np.cos(np.radians(np.abs(lat).max())), 1e-6) if len(lat) else 1.0
+        reach_x = math.ceil(max_distance / (self.cell_size * METERS_PER_DEGREE * min_cos))
+        reach_y = math.ceil(max_distance / (self.cell_size * METERS_PER_DEGREE))
+        dx, dy = np.meshgrid(np.arange(-reach_x, reach_x + 1), np.arange(-reach_y, reach_y + 1))
+
+        cx = np.floor((lon - self.origin[0]) / self.cell_size).astype(np.int64)[:, None] + dx.ravel()
+        cy = np.floor((lat - self.origin[1]) / self.cell_size).astype(np.int64)[:, None] + dy.ravel()
+        inside = (cx >= 0) & (cx < self.nx) & (cy >= 0) & (cy < self.ny)
+        keys = np.where(inside, cy * self.nx + cx, -1)
+
+        position = np.minimum(np.searchsorted(self.cell_keys, keys), max(len(self.cell_keys) - 1, 0))
+        found = inside & (len(self.cell_keys) > 0)
+        if len(self.cell_keys):
+            found &= self.cell_keys[position] == keys
+            starts = np.where(found, self.cell_offsets[position], 0)
+            counts = np.where(found, self.cell_offsets[position + 1] - self.cell_offsets[position], 0)
+        else:
+            starts = counts = np.zeros(keys.shape, dtype=np.int64)
+        return starts, counts
+
+    def _query_batch(self, lon, lat, max_distance):
+        count = len(lon)
+        best_segment = np.full(count, -1, dtype=np.int64)
+        best_distance = np.full(count, np.inf)
+        best_t = np.zeros(count)
+
+        starts, counts = self._candidate_cells(lon, lat, max_distance)
+        # Compare the candidates of as many points at a time as fit
+        totals = np.cumsum(counts.sum(axis=1))
+        first = 0
+        while first < count:
+            done = totals[first - 1] if first else 0
+            last = max(int(np.searchsorted(totals, done + MAX_CANDIDATES, side='right')), first + 1)
+            points = slice(first, last)
+            self._nearest(lon[points], lat[points], starts[points], counts[points],
+                          best_segment[points], best_distance[points], best_t[points])
+            first = last
+
+        found = best_distance <= max_distance
+        line = np.where(found, np.searchsorted(self.line_offsets, best_segment, side='right') - 1, -1)
+        fraction, housenumber = self._housenumbers(line, best_segment, best_t, found)
+        return {
+            'range': line,
+            'distance': np.where(found, best_distance, np.nan),
+            'fraction': fraction,
+            'housenumber': housenumber,
+        }
+
+    def _nearest(self, lon, lat, starts, counts, best_segment, best_distance, best_t):
+        """
+        Finds the nearest candidate segment of every point, in place.
+        """
+        counts = counts.ravel()
+        point = np.repeat(np.repeat(np.arange(len(lon)), starts.shape[1]), counts)
+        if not len(point):
+            return
+        segment = self.cell_segments[expand_ranges(starts.ravel(), counts)]
+
+        # Local equirectangular coordinates in meters around every point
+        scale_x = np.cos(np.radians(lat[point])) * METERS_PER_DEGREE
+        start = self.vertices[segment]
+        end = self.vertices[segment + 1]
+        ax = (start[:, 0] - lon[point]) * scale_x
+        ay = (start[:, 1] - lat[point]) * METERS_PER_DEGREE
+        dx = (end[:, 0] - start[:, 0]) * scale_x
+        dy = (end[:, 1] - start[:, 1]) * METERS_PER_DEGREE
+        squared_length = dx * dx + dy * dy
+        with np.errstate(invalid='ignore', divide='ignore'):
+            t = np.where(squared_length > 0, np.clip(-(ax * dx + ay * dy) / squared_length, 0.0, 1.0), 0.0)
+        distance = np.hypot(ax + t * dx, ay + t * dy)
+
+        # Candidates are grouped by point: the nearest of every group, the
+        # lowest segment of equally near ones
+        point_counts = np.bincount(point, minlength=len(lon))
+        points = np.flatnonzero(point_counts)
+        group_starts = (np.cumsum(point_counts) - point_counts)[points]
+        nearest_distance = np.minimum.reduceat(distance, group_starts)
+        is_nearest = distance == np.repeat(nearest_distance, point_counts[points])
+        nearest_segment = np.minimum.reduceat(np.where(is_nearest, segment, np.iinfo(np.int64).max), group_starts)
+        nearest = np.flatnonzero(is_nearest & (segment == np.repeat(nearest_segment, point_counts[points])))
+        nearest = nearest[np.r_[True, point[nearest][1:] != point[nearest][:-1]]]
+        best_segment[points] = segment[nearest]
+        best_distance[points] = distance[nearest]
+        best_t[points] = t[nearest]
+
+    def _housenumbers(self, line, segment, t, found):
+        """
+        Returns the fraction of the way and the house number at the points
+        found, the inverse of interpolate_along_line().
+        """
+        line = np.where(found, line, 0)
+        segment = np.where(found, segment, 0)
+        measures = self.measures
+        if not len(measures):
+            return np.full(len(line), np.nan), np.full(len(line), -1, dtype=np.int64)
+        position = measures[segment] + t * (measures[np.minimum(segment + 1, len(measures) - 1)] - measures[segment])
+        total = measures[self.line_offsets[line + 1] - 1]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            fraction = np.where(total > 0, position / total, 0.0)
+
+        from_hnr = self.from_hnr[line]
+        to_hnr = self.to_hnr[line]
+        step = self.steps[line].astype(np.int64)
+        low = np.minimum(from_hnr, to_hnr)
+        high = np.maximum(from_hnr, to_hnr)
+        number = low + np.round(fraction * (high - low) / step).astype(np.int64) * step
+        number = np.where(from_hnr == to_hnr, from_hnr, np.clip(number, low, high))
+        return np.where(found, fraction, np.nan), np.where(found, number, -1)
+
+    def address(self, range_index, housenumber):
+        """
+        Returns the address of a house number of a range as a dict. Prefix
+        and suffix are taken from the start of the range, like
+        interpolated_rows() does.
+        """
+        prefix, _number, suffix = parse_house_number(self.strings['from'][range_index])
+        address = {column: self.strings[column][range_index] for column in STRING_COLUMNS}
+        address['housenumber'] = (prefix or '') + str(housenumber) + (suffix or '')
+        return address
+
+    def lookup(self, lon, lat, max_distance=DEFAULT_MAX_DISTANCE):
+        """
+        Returns the address at a single point with its distance in meters,
+        None if there is no address way within max_distance meters.
+        """
+        result = self.query([lon], [lat], max_distance)
+        if result['range'][0] < 0:
+            return None
+        address = self.address(int(result['range'][0]), int(result['housenumber'][0]))
+        address['distance'] = float(result['distance'][0])
+        return address
+
+
+def query_csv(index, input_file, output_file, max_distance=DEFAULT_MAX_DISTANCE, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Reverse geocodes the points of a CSV file with 'lon' and 'lat' columns.
+    Writes its rows with the columns of RESULT_FIELDNAMES added, empty where
+    there is no address way within max_distance. Returns the number of
+    points found.
+    """
+    found = 0
+    with open(input_file, newline='', encoding='utf-8') as infile, \
+         open(output_file, 'w', newline='', encoding='utf-8') as outfile:
+        reader = csv.DictReader(infile)
+        writer = csv.DictWriter(outfile, fieldnames=reader.fieldnames + RESULT_FIELDNAMES, lineterminator='\n')
+        writer.writeheader()
+
+        while True:
+            rows = [row for _i, row in zip(range(batch_size), reader)]
+            if not rows:
+                break
+            result = index.query([float(row['lon']) for row in rows], [float(row['lat']) for row in rows],
+                                 max_distance, batch_size)
+            for i, row in enumerate(rows):
+                if result['range'][i] >= 0:
+                    address = index.address(int(result['range'][i]), int(result['housenumber'][i]))
+                    row.update({column: address[column] for column in RESULT_FIELDNAMES if column in address})
+                    row['distance'] = round(float(result['distance'][i]), 2)
+                    found += 1
+                writer.writerow(row)
+    return found
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Reverse geocode points against TIGER address ranges.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help="Build the index of range files")
+    build_parser.add_argument('index_dir', help="Directory for the index")
+    build_parser.add_argument('range_files', nargs='+', help="CSV files of tiger_address_range_convert.py")
+    build_parser.add_argument('--cell-size', type=float, default=DEFAULT_CELL_SIZE,
+                              help="Size of the grid cells in degrees (default: %(default)s)")
+
+    query_parser = subparsers.add_parser('query', help="Look up the addresses of the points of a CSV file")
+    query_parser.add_argument('index_dir', help="Directory of the index")
+    query_parser.add_argument('input_file', help="CSV file with lon and lat columns")
+    query_parser.add_argument('output_file', help="Output CSV file")
+    query_parser.add_argument('--max-distance', type=float, default=DEFAULT_MAX_DISTANCE,
+                              help="Largest distance to an address way in meters (default: %(default)s)")
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        print("indexed %d ranges" % build_index(args.range_files, args.index_dir, args.cell_size))
+    else:
+        print("found %d points" % query_csv(RangeIndex(args.index_dir), args.input_file, args.output_file,
+                                            args.max_distance))
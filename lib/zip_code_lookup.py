@@ -1,39 +1,165 @@
 import csv
-from typing import Optional, Dict, List
+import mmap
+import struct
+from typing import Optional, Dict, List, Tuple
+
+# Columns kept for every zip code. The fallback city is computed once at
+# load time, the other columns are taken from the CSV file.
+FIELDS = ('fallback_city', 'primary_city', 'acceptable_cities', 'unacceptable_cities', 'state', 'county')
+
+# Binary snapshot layout (all integers little endian uint32):
+#   magic, number of zip codes, number of fields
+#   zip codes, 5 ASCII bytes each, sorted
+#   offsets of every field of every zip code into the string data, plus the end
+#   UTF-8 string data
+SNAPSHOT_MAGIC = b'ZIPSNAP1'
+SNAPSHOT_HEADER = struct.Struct('<8sII')
+ZIP_LENGTH = 5
+
+
+def is_snapshot(file_name: str) -> bool:
+    """Whether a file is a binary snapshot rather than a CSV file."""
+    with open(file_name, mode='rb') as file:
+        return file.read(len(SNAPSHOT_MAGIC)) == SNAPSHOT_MAGIC
 
 
 class ZipCodeLookup:
     def __init__(self, csv_file: str):
-        self.zip_data: Dict[str, Dict[str, str]] = {}
-        self._load_csv(csv_file)
+        """
+        Load a zip code database, either the CSV file or a binary snapshot
+        written by save_snapshot(). Snapshots are memory mapped, so processes
+        opening the same snapshot share its pages.
+        """
+        self.zip_data: Dict[str, Tuple[str, ...]] = {}
+        self._snapshot = None
+        if is_snapshot(csv_file):
+            self._load_snapshot(csv_file)
+        else:
+            self._load_csv(csv_file)
 
     def _load_csv(self, csv_file: str):
         """Load data from a CSV file into a dictionary."""
         with open(csv_file, mode='r') as file:
             reader = csv.DictReader(file)
             for row in reader:
-                self.zip_data[row['zip']] = row
+                columns = [row.get(field) or '' for field in FIELDS[1:]]
+                self.zip_data[row['zip']] = (self._fallback_city(row),) + tuple(columns)
+
+    @staticmethod
+    def _fallback_city(row) -> str:
+        """The primary city or, if that is empty, the first acceptable city."""
+        primary_city = row.get('primary_city')
+        if primary_city:
+            return primary_city
+        acceptable_cities = row.get('acceptable_cities') or ""
+        acceptable_list = [city.strip() for city in acceptable_cities.split(',') if city.strip()]
+        return acceptable_list[0] if acceptable_list else ''
+
+    def save_snapshot(self, snapshot_file: str) -> int:
+        """
+        Write the loaded data as a binary snapshot. Zip codes that are not
+        5 ASCII characters can't be stored and are left out, their number is
+        returned.
+        """
+        all_zip_codes = self._zip_codes()
+        zip_codes = sorted(zip_code for zip_code in all_zip_codes
+                           if len(zip_code) == ZIP_LENGTH and zip_code.isascii())
+        skipped = len(all_zip_codes) - len(zip_codes)
+        if skipped:
+            print("skipping %d zip codes that are not %d ASCII characters" % (skipped, ZIP_LENGTH))
+        strings = bytearray()
+        offsets = [0]
+        for zip_code in zip_codes:
+            for value in self._record(zip_code):
+                strings += value.encode('utf-8')
+                offsets.append(len(strings))
+
+        with open(snapshot_file, mode='wb') as file:
+            file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, len(zip_codes), len(FIELDS)))
+            file.write(''.join(zip_codes).encode('ascii'))
+            file.write(struct.pack('<%dI' % len(offsets), *offsets))
+            file.write(strings)
+        return skipped
+
+    def _load_snapshot(self, snapshot_file: str):
+        """Memory map a binary snapshot."""
+        with open(snapshot_file, mode='rb') as file:
+            self._snapshot = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        _magic, self._count, num_fields = SNAPSHOT_HEADER.unpack_from(self._snapshot)
+        if num_fields != len(FIELDS):
+            raise ValueError("Unexpected number of fields in snapshot %s" % snapshot_file)
+        self._offsets_start = SNAPSHOT_HEADER.size + ZIP_LENGTH * self._count
+        self._strings_start = self._offsets_start + 4 * (self._count * len(FIELDS) + 1)
+
+    def _snapshot_index(self, zip_code: str) -> Optional[int]:
+        """Binary search for a zip code in the snapshot."""
+        if len(zip_code) != ZIP_LENGTH or not zip_code.isascii():
+            return None
+        key = zip_code.encode('ascii')
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = SNAPSHOT_HEADER.size + ZIP_LENGTH * mid
+            if self._snapshot[start:start + ZIP_LENGTH] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        start = SNAPSHOT_HEADER.size + ZIP_LENGTH * lo
+        if lo < self._count and self._snapshot[start:start + ZIP_LENGTH] == key:
+            return lo
+        return None
+
+    def _snapshot_field(self, index: int, field: int) -> str:
+        """Decode one field of the zip code at the given snapshot position."""
+        start, end = struct.unpack_from('<II', self._snapshot, self._offsets_start + 4 * (index * len(FIELDS) + field))
+        return self._snapshot[self._strings_start + start:self._strings_start + end].decode('utf-8')
+
+    def _zip_codes(self) -> List[str]:
+        """All zip codes in the database."""
+        if self._snapshot is None:
+            return list(self.zip_data)
+        return [self._snapshot[start:start + ZIP_LENGTH].decode('ascii')
+                for start in range(SNAPSHOT_HEADER.size, self._offsets_start, ZIP_LENGTH)]
+
+    def _record(self, zip_code: str) -> Optional[Tuple[str, ...]]:
+        """All fields of a zip code, None if the zip code is unknown."""
+        if self._snapshot is None:
+            return self.zip_data.get(zip_code)
+        index = self._snapshot_index(zip_code)
+        if index is None:
+            return None
+        return tuple(self._snapshot_field(index, field) for field in range(len(FIELDS)))
+
+    def _field(self, zip_code: str, field: str) -> Optional[str]:
+        """A single field of a zip code, None if the zip code is unknown."""
+        if self._snapshot is None:
+            record = self.zip_data.get(zip_code)
+            return record[FIELDS.index(field)] if record else None
+        index = self._snapshot_index(zip_code)
+        if index is None:
+            return None
+        return self._snapshot_field(index, FIELDS.index(field))
 
     def get_primary_city(self, zip_code: str) -> Optional[str]:
         """Retrieve the primary city for a given zip code."""
-        return self.zip_data.get(zip_code, {}).get('primary_city')
+        return self._field(zip_code, 'primary_city')
 
     def get_state(self, zip_code: str) -> Optional[str]:
         """Retrieve the state for a given zip code."""
-        return self.zip_data.get(zip_code, {}).get('state')
+        return self._field(zip_code, 'state')
 
     def get_county(self, zip_code: str) -> Optional[str]:
         """Retrieve the county for a given zip code."""
-        return self.zip_data.get(zip_code, {}).get('county')
+        return self._field(zip_code, 'county')
 
     def get_acceptable_cities(self, zip_code: str) -> List[str]:
         """Retrieve the list of acceptable cities for a given zip code."""
-        acceptable_cities = self.zip_data.get(zip_code, {}).get('acceptable_cities', "")
+        acceptable_cities = self._field(zip_code, 'acceptable_cities')
         return [city.strip() for city in acceptable_cities.split(',')] if acceptable_cities else []
 
     def get_unacceptable_cities(self, zip_code: str) -> List[str]:
         """Retrieve the list of unacceptable cities for a given zip code."""
-        unacceptable_cities = self.zip_data.get(zip_code, {}).get('unacceptable_cities', "")
+        unacceptable_cities = self._field(zip_code, 'unacceptable_cities')
         return [city.strip() for city in unacceptable_cities.split(',')] if unacceptable_cities else []
 
     def get_fallback_city(self, zip_code: str) -> Optional[str]:
@@ -44,17 +170,23 @@ class ZipCodeLookup:
         """
         if not zip_code:
             return None
-        
-        data = self.zip_data.get(zip_code, {})
-        primary_city = data.get('primary_city')
-        if primary_city:  # If primary city exists and is not empty
-            return primary_city
 
-        # Retrieve acceptable cities and pick the first one if available
-        acceptable_cities = data.get('acceptable_cities', "")
-        acceptable_list = [city.strip() for city in acceptable_cities.split(',') if city.strip()]
-        return acceptable_list[0] if acceptable_list else None
+        return self._field(zip_code, 'fallback_city') or None
 
     def lookup(self, zip_code: str) -> Optional[Dict[str, str]]:
         """Retrieve all information for a given zip code."""
-        return self.zip_data.get(zip_code)
+        record = self._record(zip_code)
+        if record is None:
+            return None
+        return dict(zip(FIELDS[1:], record[1:]), zip=zip_code)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write a binary snapshot of the zip code database.")
+    parser.add_argument('input_file', help="zip_db.csv")
+    parser.add_argument('output_file', help="Snapshot file path")
+    args = parser.parse_args()
+
+    ZipCodeLookup(args.input_file).save_snapshot(args.output_file)
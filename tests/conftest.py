@@ -0,0 +1,10 @@
+import pytest
+
+# ZIP code database for the fixture county
+ZIP_DB = 'zip,primary_city,acceptable_cities\n27944,Hertford,\n'
+
+@pytest.fixture
+def zip_db(tmp_path):
+    path = tmp_path / 'zip_db.csv'
+    path.write_text(ZIP_DB)
+    return str(path)
@@ -0,0 +1,11 @@
+from benchmarks.synthetic import generate, generate_features
+from lib.parse import iter_shp_for_geom_and_tags, get_tags_from_values
+
+def test_synthetic_shapefile(tmp_path):
+    shp_filename, zip_filename = generate(str(tmp_path), 50, vertices_per_edge=5, segments_per_tlid=2, seed=3)
+    features, zips = generate_features(50, vertices_per_edge=5, segments_per_tlid=2, seed=3)
+
+    assert len({attributes['TLID'] for _points, attributes in features}) == 25
+    assert [(points, get_tags_from_values(attributes, '37143')) for points, attributes in features] \
+        == list(iter_shp_for_geom_and_tags(shp_filename))
+    assert len(open(zip_filename).read().splitlines()) == len(zips) + 1
@@ -0,0 +1,53 @@
+from lib.centroids import street_key, postcode_key, collect_midpoints, merge_midpoints, centroid, \
+                          MidpointBuffer
+
+HEADER = 'from;to;interpolation;lat;lon;street;county;city;state;postcode;zip4;geometry;way\n'
+
+def test_keys():
+    row = {'street': 'Main Rd', 'county': 'Perquimans', 'city': 'Hertford', 'state': 'NC', 'postcode': '27944'}
+    assert street_key(row) == 'main rd:perquimans:nc:27944'
+    assert postcode_key(row) == 'hertford:perquimans:nc:27944'
+
+    assert street_key(dict(row, street='')) is None
+    assert postcode_key(dict(row, postcode='')) is None
+    assert postcode_key(dict(row, postcode='2794')) is None
+
+def test_collect_midpoints(tmp_path):
+    first = tmp_path / 'a.csv'
+    first.write_text(HEADER +
+                     '1;9;odd;0;0;Main Rd;C;Town;NC;27944;;LINESTRING(1.0 2.0,3.0 4.0,5.0 6.0);F\n'
+                     '2;8;even;0;0;;C;Town;NC;;;LINESTRING(0.0 0.0,1.0 1.0);F\n')
+    second = tmp_path / 'b.csv'
+    second.write_text(HEADER +
+                      '1;9;odd;0;0;Main Rd;C;Town;NC;27944;;LINESTRING(3.0 4.0,3.5 4.5);F\n')
+
+    streets, postals = collect_midpoints(str(first), [street_key, postcode_key])
+    assert list(streets) == ['main rd:c:nc:27944']
+    assert streets['main rd:c:nc:27944'].points().tolist() == [[3.0, 4.0]]
+    assert postals['town:c:nc:27944'].points().tolist() == [[3.0, 4.0]]
+
+    merge_midpoints(streets, collect_midpoints(str(second), [street_key])[0])
+    assert streets['main rd:c:nc:27944'].points().tolist() == [[3.0, 4.0], [3.5, 4.5]]
+
+def test_centroid():
+    points = [(1.0, 1.0), (1.02, 1.0), (1.04, 1.0), (5.0, 5.0)]
+    assert centroid('key', points) == [1.02, 1.0]
+
+    # Too many points far away from the median
+    assert centroid('key', [(0.0, 0.0), (1.0, 1.0), (2.0, 2.0)]) is None
+
+def test_midpoint_buffer_sample():
+    first = MidpointBuffer()
+    for i in range(1000):
+        first.add((float(i), 0.0), max_points=100)
+    assert len(first) == 100 and first.count == 1000
+    assert len(set(first.points()[:, 0])) == 100
+
+    second = MidpointBuffer()
+    for i in range(3000):
+        second.add((-1.0, 0.0), max_points=100)
+
+    first.merge(second, max_points=100)
+    assert len(first) == 100 and first.count == 4000
+    # Most of the merged sample comes from the larger buffer
+    assert 50 < sum(first.points()[:, 0] == -1.0) < 95
@@ -0,0 +1,58 @@
+import pytest
+
+from lib.compare import haversine, load_centroids, compare, format_report
+
+HEADER = 'postcode,city,county,state,lat,lon\n'
+
+def test_haversine():
+    # One degree of latitude
+    assert haversine([0.0, 36.0], [0.0, -76.0], [1.0, 36.0], [0.0, -76.0]).tolist() == \
+        [pytest.approx(111226.3, abs=0.1), 0.0]
+
+def test_load_centroids(tmp_path):
+    centroids = tmp_path / 'postals.csv'
+    centroids.write_text(HEADER +
+                         '27944,hertford,perquimans,nc,36.1,-76.4\n'
+                         '27919,belvidere,perquimans,nc,36.3,-76.5\n'
+                         '27944,winfall,perquimans,nc,36.2,-76.4\n')
+
+    keys, lat, lon = load_centroids(str(centroids))
+    assert keys.tolist() == ['27919', '27944']
+    assert lat.tolist() == [36.3, 36.2]
+    assert lon.tolist() == [-76.5, -76.4]
+
+    keys, _lat, _lon = load_centroids(str(centroids), ['city', 'postcode'])
+    assert keys.tolist() == ['belvidere:27919', 'hertford:27944', 'winfall:27944']
+
+def test_compare(tmp_path):
+    old = tmp_path / 'old.csv'
+    old.write_text(HEADER +
+                   '27919,,,,36.3,-76.5\n'
+                   '27932,,,,36.1,-76.5\n'
+                   '27944,,,,36.1,-76.4\n')
+    new = tmp_path / 'new.csv'
+    new.write_text(HEADER +
+                   '27944,,,,36.11,-76.4\n'
+                   '27932,,,,36.1,-76.5\n'
+                   '27946,,,,36.4,-76.6\n')
+
+    report = compare(load_centroids(str(old)), load_centroids(str(new)), bins=[0, 1000, 10000])
+    assert report['old'] == 3 and report['new'] == 3
+    assert report['added'] == 1 and report['deleted'] == 1
+    assert report['moved'] == 1
+    assert report['moved_more_than'] == {'100': 1, '1000': 1, '10000': 0}
+    assert report['mean_distance'] == pytest.approx(1112.26, abs=0.01)
+    assert report['histogram'] == [
+        {'min': 0, 'max': 1000, 'count': 0},
+        {'min': 1000, 'max': 10000, 'count': 1},
+        {'min': 10000, 'max': None, 'count': 0},
+    ]
+
+def test_compare_nothing_moved(tmp_path):
+    centroids = tmp_path / 'postals.csv'
+    centroids.write_text(HEADER + '27944,,,,36.1,-76.4\n')
+
+    report = compare(load_centroids(str(centroids)), load_centroids(str(centroids)))
+    assert report['moved'] == 0
+    assert report['mean_distance'] is None
+    assert format_report(report)[-1] == 'Average distance difference of all updates: no postcodes moved'
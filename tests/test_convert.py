@@ -1,4 +1,12 @@
-from lib.convert import compile_nodelist, compile_waylist, addressways
+import pytest
+
+import lib.convert
+from lib.convert import compile_nodelist, compile_waylist, compile_lists, addressways, \
+                        interpolate_along_line, cumulative_lengths, house_numbers, \
+                        offset_segment, offset_segments_vectorized, way_attributes, ADDRESS_PULLBACK
+from lib.helpers import length
+from lib.parse import parse_shp_for_geom_and_tags, iter_shp_for_geom_and_tags
+from lib.zip_code_lookup import ZipCodeLookup
 
 parsed_gisdata = [
     (
@@ -16,29 +24,73 @@ parsed_gisdata = [
 ]
 
 def test_compile_nodelist():
-    nodelist = compile_nodelist(parsed_gisdata)
-    assert nodelist == (
-        5,
-        {
-            (1.1, 2.1): (1, (2.1, 1.1)),
-            (1.2, 2.2): (2, (2.2, 1.2)),
-            (1.2, 2.1): (3, (2.1, 1.2)),
-            (1.2, 2.3): (4, (2.3, 1.2))
-        }
-    )
+    i, nodes = compile_nodelist(parsed_gisdata)
+    assert i == 5
+    assert len(nodes) == 4
+    assert [nodes.coordinates(index) for index in range(len(nodes))] == [
+        (2.1, 1.1), (2.2, 1.2), (2.1, 1.2), (2.3, 1.2)
+    ]
+    assert nodes.lookup((1.2, 2.1)) == 2
+    assert nodes.lookup((1.2000000001, 2.2)) == 1
 
 def test_compile_waylist():
     waylist = compile_waylist(parsed_gisdata)
     assert waylist == {
-        (('tiger:way_id', 98), ('name', 'Main Rd')): [
-            [(1.1, 2.1), (1.2, 2.2)]
-        ],
-        (('tiger:way_id', 99), ('name', 'Tree Rd')): [
-            [(1.2, 2.1), (1.2, 2.2), (1.2, 2.3)]
-        ]
+        98: [(way_attributes({'tiger:way_id': 98, 'name': 'Main Rd'}), [
+            [0, 1]
+        ])],
+        99: [(way_attributes({'tiger:way_id': 99, 'name': 'Tree Rd'}), [
+            [2, 1, 3]
+        ])]
     }
+    assert waylist[99][0][0].name == 'Tree Rd'
+    assert waylist[99][0][0].zip_right == ''
+    assert waylist[99][0][0].rfromadd is None
+
+def test_compile_waylist_conflicting_attributes(capsys):
+    waylist = compile_waylist([
+        ([(1.1, 2.1), (1.2, 2.2)], {'tiger:way_id': 98, 'name': 'Main Rd'}),
+        ([(1.2, 2.2), (1.3, 2.3)], {'tiger:way_id': 98, 'name': 'Oak Rd'}),
+        ([(1.3, 2.3), (1.4, 2.4)], {'tiger:way_id': 98, 'name': 'Main Rd'}),
+        ([(1.4, 2.4), (1.5, 2.5)], {'tiger:way_id': 98, 'name': 'Elm Rd'}),
+    ])
+    assert [(attributes.name, segments) for attributes, segments in waylist[98]] == [
+        ('Main Rd', [[0, 1], [2, 3]]),
+        ('Oak Rd', [[1, 2]]),
+        ('Elm Rd', [[3, 4]]),
+    ]
+    # Reported once, on stderr
+    output = capsys.readouterr()
+    assert output.err == 'conflicting attributes for 1 TLIDs, converting them as separate ways: 98\n'
+    assert output.out == ''
+
+def test_compile_lists():
+    i, nodes, waylist = compile_lists(iter(parsed_gisdata))
+    expected_i, expected_nodes = compile_nodelist(parsed_gisdata)
+    assert i == expected_i
+    assert (nodes.lat, nodes.lon) == (expected_nodes.lat, expected_nodes.lon)
+    assert waylist == compile_waylist(parsed_gisdata)
+
+def test_interpolate_along_line():
+    line = [(0.0, 0.0), (0.0, 1.0), (0.0, 3.0)]
+    lengths = cumulative_lengths(line)
+
+    assert lengths == ([0, 1.0, 3.0], [1.0, 2.0], 3.0)
+    for hnr, expected in [(100, (0.0, 0.0)), (101, (0.0, 0.75)), (103, (0.0, 2.25)), (104, (0.0, 3.0))]:
+        assert interpolate_along_line(line, 100, 104, hnr) == expected
+        assert interpolate_along_line(line, 100, 104, hnr, lengths) == expected
+        assert interpolate_along_line(line, 104, 100, hnr, lengths) == expected
+
+    # Out of range and single house numbers fall back to the centroid
+    assert interpolate_along_line(line, 100, 104, 105, lengths) == (0.0, 4.0 / 3)
+    assert interpolate_along_line(line, 100, 100, 100, lengths) == (0.0, 4.0 / 3)
+
+def test_addressways(tmp_path):
+    zip_db = tmp_path / 'zip_db.csv'
+    zip_db.write_text('zip,primary_city,acceptable_cities\n'
+                      '55555,Springfield,\n'
+                      '55556,,"Shelbyville, Ogdenville"\n')
 
-def test_addressways():
     for _geom, tags in parsed_gisdata:
         tags["tiger:lfromadd"] = 100
         tags["tiger:ltoadd"] = 200
@@ -47,48 +99,147 @@ def test_addressways():
         tags["tiger:zip_left"] = '55555'
         tags["tiger:zip_right"] = '55556'
 
-    i, nodelist = compile_nodelist(parsed_gisdata)
-    waylist = compile_waylist(parsed_gisdata)
-    out = addressways(waylist, nodelist, i)
-    assert out == [
+    i, nodes = compile_nodelist(parsed_gisdata)
+    waylist = compile_waylist(parsed_gisdata, nodes)
+    out = addressways(waylist, nodes, i, ZipCodeLookup(str(zip_db)), True)
+    assert list(out) == [
         {
             'from': 101,
             'to': 201,
             'interpolation': 'odd',
-            'postcode': '55556',
+            'lat': 2.149981,
+            'lon': 1.150019,
             'street': 'Main Rd',
-            'city': '',
+            'county': '',
+            'city': 'Shelbyville',
             'state': '',
-            'geometry': 'LINESTRING(1.100145 2.100029,1.199971 2.199855)'
+            'postcode': '55556',
+            'zip4': '',
+            'geometry': 'LINESTRING(1.100058 2.100019,1.199981 2.199942)',
+            'way': 'F'
         },
         {
-            'to': 200,
             'from': 100,
+            'to': 200,
             'interpolation': 'even',
-            'postcode': '55555',
+            'lat': 2.150019,
+            'lon': 1.149981,
             'street': 'Main Rd',
-            'city': '',
+            'county': '',
+            'city': 'Springfield',
             'state': '',
-            'geometry': 'LINESTRING(1.100029 2.100145,1.199855 2.199971)'
+            'postcode': '55555',
+            'zip4': '',
+            'geometry': 'LINESTRING(1.100019 2.100058,1.199942 2.199981)',
+            'way': 'F'
         },
         {
             'from': 101,
             'to': 201,
             'interpolation': 'odd',
-            'postcode': '55556',
+            'lat': 2.2,
+            'lon': 1.200027,
             'street': 'Tree Rd',
-            'city': '',
+            'county': '',
+            'city': 'Shelbyville',
             'state': '',
-            'geometry': 'LINESTRING(1.200082 2.100123,1.200082 2.200000,1.200082 2.299877)'
+            'postcode': '55556',
+            'zip4': '',
+            'geometry': 'LINESTRING(1.200027 2.100055,1.200027 2.200000,1.200027 2.299945)',
+            'way': 'F'
         },
         {
             'from': 100,
             'to': 200,
             'interpolation': 'even',
-            'postcode': '55555',
+            'lat': 2.2,
+            'lon': 1.199973,
             'street': 'Tree Rd',
-            'city': '',
+            'county': '',
+            'city': 'Springfield',
             'state': '',
-            'geometry': 'LINESTRING(1.199918 2.100123,1.199918 2.200000,1.199918 2.299877)'
+            'postcode': '55555',
+            'zip4': '',
+            'geometry': 'LINESTRING(1.199973 2.100055,1.199973 2.200000,1.199973 2.299945)',
+            'way': 'F'
         }
     ]
+
+def test_offset_segments_vectorized_matches_scalar():
+    shapefile = 'tests/fixtures/tl_2020_37143_edges/tl_2020_37143_edges.shp'
+    parsed = parse_shp_for_geom_and_tags(shapefile)
+    i, nodes = compile_nodelist(parsed)
+    waylist = compile_waylist(parsed, nodes)
+
+    sides = [(True, True), (True, False), (False, True)]
+    segments = [(segment, left, right) for ways in waylist.values() for segment in ways[0][1]
+                for left, right in sides]
+    vectorized, next_id = offset_segments_vectorized(segments, nodes, i)
+
+    way_id = i
+    for (segment, left, right), actual in zip(segments, vectorized):
+        pullback = min(length(segment, nodes) / 3.0, float(ADDRESS_PULLBACK))
+        *expected, way_id = offset_segment(segment, nodes, pullback, left, right, way_id)
+        for expected_way, actual_way in zip(expected, actual):
+            assert [p[0] for p in actual_way] == [p[0] for p in expected_way]
+            assert [p[1] for p in actual_way] == [pytest.approx(p[1], abs=1e-9) for p in expected_way]
+    assert next_id == way_id
+
+def test_addressways_vectorized_matches_scalar(monkeypatch, zip_db):
+    shapefile = 'tests/fixtures/tl_2020_37143_edges/tl_2020_37143_edges.shp'
+    i, nodes, waylist = compile_lists(iter_shp_for_geom_and_tags(shapefile))
+    zip_lookup = ZipCodeLookup(zip_db)
+
+    # Several batches
+    monkeypatch.setattr(lib.convert, 'OFFSET_BATCH_SIZE', 500)
+    for compile_as_ranges in (True, False):
+        assert list(addressways(waylist, nodes, i, zip_lookup, compile_as_ranges, True)) == \
+            list(addressways(waylist, nodes, i, zip_lookup, compile_as_ranges, False))
+
+def test_addressways_without_zip(tmp_path):
+    zip_db = tmp_path / 'zip_db.csv'
+    zip_db.write_text('zip,primary_city,acceptable_cities\n'
+                      '55555,Springfield,\n')
+
+    ways = [
+        ([(1.1, 2.1), (1.2, 2.2)], {'tiger:way_id': 98, 'name': 'Main Rd',
+                                    'tiger:rfromadd': '1', 'tiger:rtoadd': '5', 'tiger:zip_right': '55555'}),
+        ([(1.2, 2.1), (1.3, 2.2)], {'tiger:way_id': 99, 'name': 'Tree Rd',
+                                    'tiger:rfromadd': '2', 'tiger:rtoadd': 'x', 'tiger:zip_right': '55555'}),
+        ([(1.3, 2.1), (1.4, 2.2)], {'tiger:way_id': 100, 'name': 'Oak Rd',
+                                    'tiger:rfromadd': 'N1', 'tiger:rtoadd': 'N3', 'tiger:zip_right': ''}),
+    ]
+    i, nodes = compile_nodelist(ways)
+    waylist = compile_waylist(ways, nodes)
+    rows = list(addressways(waylist, nodes, i, ZipCodeLookup(str(zip_db)), False))
+
+    # Tree Rd has no valid range, Oak Rd has no ZIP code and must not
+    # inherit the city of Main Rd
+    assert [(row['street'], row['hnr'], row['city']) for row in rows] == [
+        ('Main Rd', '1', 'Springfield'),
+        ('Main Rd', '3', 'Springfield'),
+        ('Main Rd', '5', 'Springfield'),
+        ('Oak Rd', 'N1', None),
+        ('Oak Rd', 'N3', None),
+    ]
+
+def test_house_numbers():
+    assert list(house_numbers(101, 109, 'odd')) == [101, 103, 105, 107, 109]
+    assert list(house_numbers(110, 100, 'even')) == [110, 108, 106, 104, 102, 100]
+    assert list(house_numbers(5, 2, 'all')) == [5, 4, 3, 2]
+    assert list(house_numbers(7, 7, 'odd')) == [7]
+
+def test_addressways_descending(tmp_path):
+    zip_db = tmp_path / 'zip_db.csv'
+    zip_db.write_text('zip,primary_city,acceptable_cities\n')
+
+    ways = [
+        ([(1.1, 2.1), (1.2, 2.2)], {'tiger:way_id': 98, 'name': 'Main Rd',
+                                    'tiger:lfromadd': '8A', 'tiger:ltoadd': '2A',
+                                    'tiger:rfromadd': '7', 'tiger:rtoadd': '1'}),
+    ]
+    i, nodes = compile_nodelist(ways)
+    waylist = compile_waylist(ways, nodes)
+    rows = list(addressways(waylist, nodes, i, ZipCodeLookup(str(zip_db)), False))
+
+    assert [row['hnr'] for row in rows] == ['7', '5', '3', '1', '8A', '6A', '4A', '2A']
@@ -1,5 +1,7 @@
-from lib.helpers import round_point, adjacent, glom, check_if_integers, \
-                        interpolation_type, create_wkt_linestring
+from lib.helpers import round_point, adjacent, glom, glom_once, glom_all, \
+                        interpolation_type, create_wkt_linestring, \
+                        create_ewkb_linestring, create_polyline, decode_polyline, linestring_midpoint, \
+                        decode_linestring
 
 def test_round_point():
     assert round_point([1.0, 1.0]) == (1.0, 1.0)
@@ -21,11 +23,42 @@ def test_glom():
     # line1 + reversed line2
     assert glom(line1, line2) == [[1,1], [1,2], [1,3], [2,3], [2,2]]
 
-def test_check_if_integers():
-    assert check_if_integers([1, 2, 3])
-    assert check_if_integers(['b']) is False
-    assert check_if_integers([None]) is False
-    assert check_if_integers(['']) is False
+def test_glom_all():
+    line1 = [[1,1], [1,2], [1,3]]
+    line2 = [[2,2], [2,3], [1,3]]
+    line3 = [[5,5], [6,6]]
+    line4 = [[2,2], [3,1]]
+
+    assert glom_all([]) == []
+    assert glom_all([line1, line2, line3, line4]) == [
+        [[1,1], [1,2], [1,3], [2,3], [2,2], [3,1]],
+        [[5,5], [6,6]]
+    ]
+
+def test_glom_all_matches_glom_once():
+    segments = [
+        [[3,0], [4,0]],
+        [[1,0], [0,0]],
+        [[2,0], [3,0]],
+        [[1,0], [2,0]],
+        [[4,0], [4,1], [3,0]],
+        [[9,9], [8,8]],
+        [[0,0], [0,1]],
+    ]
+
+    expected = []
+    unsorted = segments
+    while unsorted != []:
+        chunk, unsorted = glom_once(unsorted)
+        expected.append(chunk)
+
+    assert glom_all(segments) == expected
+
+def test_glom_all_node_indexes():
+    assert glom_all([[0, 1, 2], [3, 4, 2], [5, 6], [3, 7]], key=None) == [
+        [0, 1, 2, 4, 3, 7],
+        [5, 6]
+    ]
 
 def test_interpolation_type():
     assert interpolation_type(100, 200, 101, 201) == "even"
@@ -42,3 +75,39 @@ def test_create_wkt_linestring():
     ]
     assert(create_wkt_linestring(segment)) == \
         'LINESTRING(200.000000 100.000000,201.000000 101.000000)'
+
+def test_create_ewkb_linestring():
+    segment = [
+        (1, (2.0, 1.0)),
+        (2, (4.0, 3.0000001))
+    ]
+    # LINESTRING(1 2,3 4) with SRID 4326, coordinates rounded like the WKT
+    assert create_ewkb_linestring(segment) == \
+        '0102000020E610000002000000' \
+        '000000000000F03F0000000000000040' \
+        '00000000000008400000000000001040'
+
+def test_create_polyline():
+    # Example of the polyline format documentation, with 5 decimals
+    segment = [
+        (1, (38.5, -120.2)),
+        (2, (40.7, -120.95)),
+        (3, (43.252, -126.453))
+    ]
+    assert create_polyline(segment, 5) == '_p~iF~ps|U_ulLnnqC_mqNvxq`@'
+    assert decode_polyline('_p~iF~ps|U_ulLnnqC_mqNvxq`@', 5) == [point for _i, point in segment]
+    assert decode_polyline(create_polyline(segment)) == [point for _i, point in segment]
+    assert decode_polyline(create_polyline(segment), count=2) == [(38.5, -120.2), (40.7, -120.95)]
+
+def test_linestring_midpoint():
+    for count in range(1, 6):
+        segment = [(i, (36.0 + i * 0.0012345, -76.0 - i * 0.0054321)) for i in range(count)]
+        expected = tuple(float(p) for p in ('%f %f' % (segment[count // 2][1][1], segment[count // 2][1][0])).split(' '))
+        for encode in (create_wkt_linestring, create_ewkb_linestring, create_polyline):
+            assert linestring_midpoint(encode(segment)) == expected
+
+def test_decode_linestring():
+    segment = [(i, (36.0 + i * 0.0012345, -76.0 - i * 0.0054321)) for i in range(4)]
+    expected = [tuple(float(p) for p in ('%f %f' % (lon, lat)).split(' ')) for _i, (lat, lon) in segment]
+    for encode in (create_wkt_linestring, create_ewkb_linestring, create_polyline):
+        assert decode_linestring(encode(segment)) == expected
@@ -0,0 +1,76 @@
+import csv
+
+import lib.convert
+import lib.incremental
+import lib.pipeline
+from lib.incremental import convert_file_incremental
+from lib.pipeline import convert_file
+from lib.zip_code_lookup import ZipCodeLookup
+
+def way(tlid, geom, rfromadd, rtoadd):
+    return (geom, {'tiger:way_id': tlid, 'name': 'Main Rd', 'tiger:rfromadd': rfromadd, 'tiger:rtoadd': rtoadd,
+                   'tiger:zip_right': '27944', 'tiger:county': 'Perquimans', 'tiger:state': 'NC'})
+
+FEATURES_2020 = [
+    way(1, [(1.1, 2.1), (1.2, 2.2)], '1', '9'),
+    way(2, [(1.2, 2.2), (1.3, 2.3)], '11', '19'),
+    way(3, [(1.3, 2.3), (1.4, 2.4)], '21', '29'),
+]
+
+FEATURES_2021 = [
+    way(1, [(1.1, 2.1), (1.2, 2.2)], '1', '9'),
+    way(2, [(1.2, 2.2), (1.3, 2.3)], '11', '17'),
+    way(4, [(1.4, 2.4), (1.5, 2.5)], '31', '39'),
+]
+
+def convert(monkeypatch, tmp_path, zip_db, features, name):
+    monkeypatch.setattr(lib.incremental, 'iter_shp_for_geom_and_tags', lambda _filename, _use_arrow: iter(features))
+    monkeypatch.setattr(lib.pipeline, 'iter_shp_for_geom_and_tags', lambda _filename, _use_arrow: iter(features))
+    zip_lookup = ZipCodeLookup(zip_db)
+
+    input_file = tmp_path / (name + '.zip')
+    input_file.write_text(repr(features))
+    output_file = tmp_path / (name + '.csv')
+    delta_file = tmp_path / (name + '.delta.csv')
+    expected_file = tmp_path / (name + '.expected.csv')
+
+    counts = convert_file_incremental(str(input_file), str(output_file), str(delta_file), str(tmp_path / 'state'),
+                                      zip_lookup, 'zip-db', True)
+    convert_file(str(input_file), str(expected_file), zip_lookup, True)
+
+    assert output_file.read_text() == expected_file.read_text()
+    with open(delta_file) as file:
+        delta = [(row['change'], row['tlid'], row['from'], row['to']) for row in csv.DictReader(file, delimiter=';')]
+    return counts, delta
+
+def test_convert_file_incremental(monkeypatch, tmp_path, zip_db):
+
+    counts, delta = convert(monkeypatch, tmp_path, zip_db, FEATURES_2020, '2020')
+    assert counts == (3, 3)
+    assert delta == [('added', '1', '1', '9'), ('added', '2', '11', '19'), ('added', '3', '21', '29')]
+
+    counts, delta = convert(monkeypatch, tmp_path, zip_db, FEATURES_2021, '2021')
+    assert counts == (3, 2)
+    assert delta == [('changed', '2', '11', '17'), ('added', '4', '31', '39'), ('deleted', '3', '', '')]
+
+    # Nothing changed, the input isn't even read
+    monkeypatch.setattr(lib.incremental, 'iter_shp_for_geom_and_tags', None)
+    counts = convert_file_incremental(str(tmp_path / '2021.zip'), str(tmp_path / 'again.csv'),
+                                      str(tmp_path / 'again.delta.csv'), str(tmp_path / 'state'),
+                                      ZipCodeLookup(zip_db), 'zip-db', True)
+    assert counts == (3, 0)
+    assert (tmp_path / 'again.csv').read_text() == (tmp_path / '2021.csv').read_text()
+
+def test_identity_decision_change_converts_all(monkeypatch, tmp_path, zip_db):
+    convert(monkeypatch, tmp_path, zip_db, FEATURES_2020, '2020')
+
+    # Same coordinates, but recorded as taken over without transformation
+    def unproject_points(nodes, identity_tolerance):
+        i, nodes = lib.convert.unproject_points(nodes, identity_tolerance)
+        nodes.identity_swap = False
+        return i, nodes
+    monkeypatch.setattr(lib.incremental, 'unproject_points', unproject_points)
+
+    counts, delta = convert(monkeypatch, tmp_path, zip_db, FEATURES_2021, '2021')
+    assert counts == (3, 3)
+    assert [change for change, *_ in delta] == ['changed', 'changed', 'added', 'deleted']
@@ -0,0 +1,22 @@
+from lib.nodes import NodeStore, quantize
+from lib.helpers import round_point
+
+def test_quantize_matches_round_point():
+    points = [(-76.123456785, 36.1), (-76.12345679, 36.1), (-76.123456795, 36.1),
+              (0.1 + 0.2, -0.3), (0.3, -0.3), (179.99999999, -89.99999999), (-179.99999999, 89.99999999), (0.0, -0.0)]
+    for p1 in points:
+        for p2 in points:
+            assert (quantize(p1) == quantize(p2)) == (round_point(p1) == round_point(p2))
+
+def test_node_store():
+    nodes = NodeStore()
+    assert [nodes.add(point) for point in [(1.1, 2.1), (1.2, 2.2), (1.1000000001, 2.1)]] == [0, 1, 0]
+    assert nodes.add_all([(1.2, 2.2), (1.3, -2.3), (1.1, 2.1)]) == [1, 2, 0]
+    assert nodes.source_points() == [(1.1, 2.1), (1.2, 2.2), (1.3, -2.3)]
+    assert nodes.next_id == 4
+
+    nodes.set_unprojected([(2.1, 1.1), (2.2, 1.2), (-2.3, 1.3)])
+    assert nodes.coordinates(1) == (2.2, 1.2)
+    lat, lon = nodes.arrays()
+    assert lat[[1, 0]].tolist() == [2.2, 2.1]
+    assert nodes.source_points() == []
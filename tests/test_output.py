@@ -0,0 +1,97 @@
+import io
+import os
+
+import pytest
+
+from lib.output import write_to_csv, write_to_parquet, write_to_copy, export_parquet_to_csv, \
+                       HNR_FIELDNAMES, RANGE_FIELDNAMES
+from lib.helpers import create_ewkb_linestring, create_wkt_linestring
+
+def test_write_to_csv_streams_ranges(tmp_path):
+    def rows():
+        yield {'from': '1', 'to': '9', 'interpolation': 'odd', 'street': 'Main Rd', 'way': 'F'}
+        yield {'from': '2', 'to': '10', 'interpolation': 'even', 'street': 'Main Rd', 'way': 'F'}
+
+    csv_file = tmp_path / 'out.csv'
+    write_to_csv(str(csv_file), rows(), RANGE_FIELDNAMES)
+
+    assert csv_file.read_text().splitlines() == [
+        'from;to;interpolation;lat;lon;street;county;city;state;postcode;zip4;geometry;way',
+        '1;9;odd;;;Main Rd;;;;;;;F',
+        '2;10;even;;;Main Rd;;;;;;;F',
+    ]
+
+def test_parquet_export_matches_csv(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+
+    rows = [
+        {'hnr': str(hnr), 'lat': 36.1 + hnr / 1e6, 'lon': -76.5, 'street': 'Main Rd',
+         'city': 'Hertford' if hnr % 3 else None, 'state': 'NC', 'postcode': '27944', 'zip4': ''}
+        for hnr in range(1, 100, 2)
+    ]
+    csv_file = tmp_path / 'out.csv'
+    parquet_file = tmp_path / 'out.parquet'
+    exported_file = tmp_path / 'exported.csv'
+
+    write_to_csv(str(csv_file), iter(rows), HNR_FIELDNAMES)
+    write_to_parquet(str(parquet_file), iter(rows), HNR_FIELDNAMES, row_group_size=16)
+    export_parquet_to_csv(str(parquet_file), str(exported_file))
+
+    assert pq.ParquetFile(str(parquet_file)).num_row_groups == 4
+    assert exported_file.read_text() == csv_file.read_text()
+
+def test_write_to_copy():
+    rows = [
+        {'hnr': '1', 'lat': 36.5, 'lon': -76.25, 'street': 'Main\tRd', 'county': 'C:\\x',
+         'city': None, 'state': 'NC', 'postcode': '27944', 'zip4': ''},
+    ]
+    output = io.StringIO()
+    write_to_copy(output, iter(rows), HNR_FIELDNAMES)
+
+    assert output.getvalue() == '1\t36.5\t-76.25\tMain\\tRd\tC:\\\\x\t\\N\tNC\t27944\t\n'
+
+def wkt_coordinates(wkt):
+    return [float(value) for value in wkt[wkt.index('(') + 1:-1].replace(',', ' ').split()]
+
+def test_copy_into_postgis():
+    # Opt-in, needs a database where the postgis extension can be created:
+    # TIGER_TEST_POSTGIS_DSN=postgresql://localhost/test python -m pytest tests/test_output.py
+    dsn = os.environ.get('TIGER_TEST_POSTGIS_DSN')
+    if not dsn:
+        pytest.skip('TIGER_TEST_POSTGIS_DSN is not set')
+    psycopg2 = pytest.importorskip('psycopg2')
+
+    segments = [
+        [(1, (36.2001, -76.5)), (2, (36.2001, -76.499)), (3, (36.2003, -76.498))],
+        [(4, (36.19999949, -76.50000051)), (5, (36.1999, -76.499))],
+    ]
+    rows = [
+        {'from': str(2 * i + 1), 'to': '99', 'interpolation': 'odd', 'lat': segment[0][1][0], 'lon': segment[0][1][1],
+         'street': "O'Neil\tRd", 'county': 'C:\\x', 'city': None, 'state': 'NC', 'postcode': '27944', 'zip4': '',
+         'geometry': create_ewkb_linestring(segment), 'way': 'F'}
+        for i, segment in enumerate(segments)
+    ]
+    output = io.StringIO()
+    write_to_copy(output, iter(rows), RANGE_FIELDNAMES)
+    output.seek(0)
+
+    columns = ', '.join('"%s"' % name for name in RANGE_FIELDNAMES)
+    with psycopg2.connect(dsn) as connection, connection.cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS postgis')
+        cursor.execute('CREATE TEMP TABLE ranges (%s)' % ', '.join(
+            '"%s" %s' % (name, 'geometry(LineString,4326)' if name == 'geometry' else 'text')
+            for name in RANGE_FIELDNAMES))
+        cursor.copy_expert('COPY ranges (%s) FROM STDIN' % columns, output)
+
+        cursor.execute('SELECT "from", street, county, city, zip4, ST_SRID(geometry), ST_AsText(geometry) '
+                       'FROM ranges ORDER BY "from"')
+        loaded = cursor.fetchall()
+        connection.rollback()
+
+    assert [row[:6] for row in loaded] == [
+        ('1', "O'Neil\tRd", 'C:\\x', None, '', 4326),
+        ('3', "O'Neil\tRd", 'C:\\x', None, '', 4326),
+    ]
+    # The same coordinates as the WKT of the CSV output
+    for (*_values, wkt), segment in zip(loaded, segments):
+        assert wkt_coordinates(wkt) == wkt_coordinates(create_wkt_linestring(segment))
@@ -1,4 +1,18 @@
-from lib.parse import parse_shp_for_geom_and_tags
+import struct
+
+import pytest
+
+from lib.parse import parse_shp_for_geom_and_tags, iter_shp_for_geom_and_tags, \
+                      get_geometry_from_wkb, get_county_and_state, \
+                      get_shapefile_path, extract_fips_code, ogr
+
+def has_arrow_stream(filename):
+    """
+    Whether the GDAL build reads layers through the Arrow stream interface
+    (GDAL >= 3.6 with NumPy), otherwise use_arrow falls back silently.
+    """
+    layer = ogr.GetDriverByName("ESRI Shapefile").Open(filename).GetLayer(0)
+    return hasattr(layer, "GetArrowStreamAsNumPy")
 
 def test_parse_shp_for_geom_and_tags():
     shapefile = 'tests/fixtures/tl_2020_37143_edges/tl_2020_37143_edges.shp'
@@ -46,3 +60,39 @@ def test_parse_shp_for_geom_and_tags():
             'tiger:zip_right': '27919'
         }
     )
+
+def test_iter_shp_for_geom_and_tags():
+    shapefile = 'tests/fixtures/tl_2020_37143_edges/tl_2020_37143_edges.shp'
+    features = iter_shp_for_geom_and_tags(shapefile)
+
+    assert not isinstance(features, list)
+    assert list(features) == parse_shp_for_geom_and_tags(shapefile)
+
+def test_iter_shp_for_geom_and_tags_arrow():
+    shapefile = 'tests/fixtures/tl_2020_37143_edges/tl_2020_37143_edges.shp'
+    if not has_arrow_stream(shapefile):
+        pytest.skip("GDAL without the Arrow stream interface")
+
+    for filename in (shapefile, 'tests/fixtures/tl_2020_37143_edges.zip'):
+        assert list(iter_shp_for_geom_and_tags(filename, use_arrow=True)) == \
+            list(iter_shp_for_geom_and_tags(filename, use_arrow=False))
+
+def test_get_geometry_from_wkb():
+    wkb = struct.pack('<bII4d', 1, 2, 2, -76.5, 36.3, -76.4, 36.2)
+    assert get_geometry_from_wkb(wkb) == [(-76.5, 36.3), (-76.4, 36.2)]
+
+    wkb = struct.pack('>bII6d', 0, 1002, 2, -76.5, 36.3, 1.0, -76.4, 36.2, 2.0)
+    assert get_geometry_from_wkb(wkb) == [(-76.5, 36.3), (-76.4, 36.2)]
+
+def test_get_county_and_state():
+    assert get_county_and_state('37143') == ('Perquimans', 'NC')
+    assert get_county_and_state('99999') is None
+
+def test_parse_zip_archive():
+    archive = 'tests/fixtures/tl_2020_37143_edges.zip'
+    shapefile = 'tests/fixtures/tl_2020_37143_edges/tl_2020_37143_edges.shp'
+
+    assert get_shapefile_path(archive) == \
+        '/vsizip/tests/fixtures/tl_2020_37143_edges.zip/tl_2020_37143_edges.shp'
+    assert extract_fips_code(get_shapefile_path(archive)) == '37143'
+    assert parse_shp_for_geom_and_tags(archive) == parse_shp_for_geom_and_tags(shapefile)
@@ -0,0 +1,68 @@
+import json
+import os
+import shutil
+
+from lib.pipeline import convert_file, convert_all, find_input_files
+from lib.zip_code_lookup import ZipCodeLookup
+
+ARCHIVE = 'tests/fixtures/tl_2020_37143_edges.zip'
+
+def test_find_input_files(tmp_path):
+    (tmp_path / 'tl_2020_37001_edges.zip').write_bytes(b'x' * 10)
+    (tmp_path / 'tl_2020_37003_edges.zip').write_bytes(b'x' * 100)
+    (tmp_path / 'tl_2020_37003_edges.shp.xml').write_bytes(b'x' * 1000)
+    (tmp_path / 'readme.txt').write_bytes(b'x')
+
+    assert find_input_files(str(tmp_path)) == [
+        (str(tmp_path / 'tl_2020_37003_edges.zip'), '37003_edges'),
+        (str(tmp_path / 'tl_2020_37001_edges.zip'), '37001_edges'),
+    ]
+
+def test_find_input_files_extracted(tmp_path):
+    # The .shp is preferred over the archive it was extracted from
+    (tmp_path / 'tl_2024_37143_edges.zip').write_bytes(b'x' * 100)
+    (tmp_path / 'tl_2024_37143_edges.shp').write_bytes(b'x' * 1000)
+    (tmp_path / 'tl_2024_37001_edges.shp').write_bytes(b'x' * 10)
+    (tmp_path / 'tl_2024_37001_edges.zip').write_bytes(b'x' * 10000)
+
+    assert find_input_files(str(tmp_path)) == [
+        (str(tmp_path / 'tl_2024_37143_edges.shp'), '37143_edges'),
+        (str(tmp_path / 'tl_2024_37001_edges.shp'), '37001_edges'),
+    ]
+
+def test_convert_all(tmp_path, zip_db):
+    input_dir = tmp_path / 'input'
+    output_dir = tmp_path / 'output'
+    input_dir.mkdir()
+    output_dir.mkdir()
+    shutil.copy(ARCHIVE, input_dir)
+
+    failed = convert_all(str(input_dir), str(output_dir), True, workers=1, zip_code_file=zip_db)
+
+    assert failed == []
+    assert os.listdir(output_dir) == ['37143_edges.csv']
+
+    expected = tmp_path / 'expected.csv'
+    convert_file(ARCHIVE, str(expected), ZipCodeLookup(zip_db), True)
+    assert (output_dir / '37143_edges.csv').read_text() == expected.read_text()
+
+def test_convert_all_profile(tmp_path, zip_db):
+    input_dir = tmp_path / 'input'
+    output_dir = tmp_path / 'output'
+    profile_dir = tmp_path / 'profile'
+    input_dir.mkdir()
+    output_dir.mkdir()
+    shutil.copy(ARCHIVE, input_dir)
+
+    failed = convert_all(str(input_dir), str(output_dir), True, workers=1, zip_code_file=zip_db,
+                         profile_dir=str(profile_dir))
+
+    assert failed == []
+    assert sorted(os.listdir(profile_dir)) == ['37143_edges.json', 'summary.json']
+    report = json.loads((profile_dir / '37143_edges.json').read_text())
+    assert list(report['stages']) == ['parse', 'collect', 'transform', 'join', 'addressways', 'write']
+    assert report['stages']['parse']['features'] == 3260
+    assert report['stages']['addressways']['rows'] == len((output_dir / '37143_edges.csv').read_text().splitlines()) - 1
+    summary = json.loads((profile_dir / 'summary.json').read_text())
+    assert summary['counties'] == 1
+    assert summary['slowest'][0]['county'] == '37143_edges'
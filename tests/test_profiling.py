@@ -0,0 +1,35 @@
+from lib.profiling import Profile, summarize
+
+def test_profile_accounts_nested_stages():
+    profile = Profile()
+
+    with profile.stage('write'):
+        assert list(profile.iterate('addressways', iter(range(3)), 'rows')) == [0, 1, 2]
+    with profile.stage('join'):
+        pass
+
+    report = profile.report(input='county.shp')
+    assert report['input'] == 'county.shp'
+    # In the order of a conversion, not the order they were entered
+    assert list(report['stages']) == ['join', 'addressways', 'write']
+    addressways = report['stages']['addressways']
+    assert addressways['rows'] == 3
+    assert 'rows_per_second' in addressways
+    # The rows are counted where they are made, not in the enclosing stage
+    assert 'rows' not in report['stages']['write']
+    assert all(stage['seconds'] >= 0 for stage in report['stages'].values())
+
+def test_summarize():
+    def report(seconds, vertices):
+        return {'seconds': seconds, 'peak_rss_mb': vertices / 10,
+                'stages': {'parse': {'seconds': seconds, 'features': 1, 'vertices': vertices}}}
+
+    summary = summarize({'large': report(4.0, 400), 'slow': report(2.0, 20), 'small': report(1.0, 50)}, top=2)
+
+    assert summary['counties'] == 3
+    assert summary['seconds'] == 7.0
+    assert summary['max_peak_rss_mb'] == 40
+    assert summary['stages']['parse']['vertices'] == 470
+    assert summary['stages']['parse']['share'] == 1.0
+    assert [county['county'] for county in summary['slowest']] == ['large', 'slow']
+    assert [county['county'] for county in summary['slowest_per_vertex']] == ['slow', 'small']
@@ -1,4 +1,26 @@
-from lib.project import unproject
+import pytest
+
+from lib.convert import PROJCS_WKT
+from lib.project import CoordinateTransformer
 
 def test_unproject():
-    assert(unproject([-76.521714, 36.330247])) == (36.330247, -76.521714)
+    transformer = CoordinateTransformer(PROJCS_WKT)
+    assert(transformer.unproject([-76.521714, 36.330247])) == (36.330247, -76.521714)
+
+def test_unproject_many():
+    points = [(-76.522227, 36.329937), (-76.521714, 36.330247), (-76.500427, 36.332319999999996)]
+    transformer = CoordinateTransformer(PROJCS_WKT)
+
+    assert transformer.unproject_many(points) == [transformer.unproject(p) for p in points]
+    assert transformer.unproject_many([]) == []
+
+def test_check_identity():
+    points = [(-76.522227, 36.329937), (-76.521714, 36.330247), (-76.500427, 36.332319999999996)]
+    transformer = CoordinateTransformer(PROJCS_WKT)
+    transformed = transformer.unproject_many(points)
+
+    assert transformer.check_identity(points, 1e-7) <= 1e-7
+    assert transformer.identity_swap is True
+    for skipped, expected in zip(transformer.unproject_many(points), transformed):
+        assert skipped == pytest.approx(expected, abs=1e-7)
+    assert transformer.unproject(points[0]) == (points[0][1], points[0][0])
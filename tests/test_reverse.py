@@ -0,0 +1,134 @@
+import csv
+
+import numpy as np
+import pytest
+
+import lib.reverse
+from lib.reverse import build_index, RangeIndex, query_csv, METERS_PER_DEGREE
+from lib.convert import interpolate_along_line, house_numbers
+
+HEADER = 'from;to;interpolation;lat;lon;street;county;city;state;postcode;zip4;geometry;way\n'
+
+# Address ways on both sides of an east-west street at latitude 36.2
+LEFT = [(-76.5, 36.2001), (-76.499, 36.2001), (-76.498, 36.2003)]
+RIGHT = [(-76.5, 36.1999), (-76.499, 36.1999), (-76.498, 36.1997)]
+
+def wkt(points):
+    return 'LINESTRING(%s)' % ','.join('%f %f' % tuple(point) for point in points)
+
+def write_ranges(tmp_path):
+    ranges = tmp_path / 'ranges.csv'
+    ranges.write_text(
+        HEADER +
+        '2;98;even;0;0;Main St;Perquimans;Hertford;NC;27944;;%s;L1\n' % wkt(LEFT) +
+        '99A;1A;odd;0;0;Main St;Perquimans;Hertford;NC;27944;1234;%s;R1\n' % wkt(RIGHT) +
+        HEADER +
+        'A;B;odd;0;0;Main St;Perquimans;Hertford;NC;27944;;%s;R2\n' % wkt(RIGHT) +
+        '5;5;all;0;0;Oak St;Perquimans;Hertford;NC;27944;;LINESTRING(-76.49 36.21,-76.489 36.21);W1\n')
+    return ranges
+
+def interpolated_points(points, from_hnr, to_hnr, interpolation):
+    """
+    The points of all house numbers of a range as addressways() places them.
+    """
+    coordinates = [(lat, lon) for lon, lat in points]
+    for hnr in house_numbers(from_hnr, to_hnr, interpolation):
+        lat, lon = interpolate_along_line(coordinates, from_hnr, to_hnr, hnr)
+        yield hnr, lon, lat
+
+def test_build_index(tmp_path):
+    assert build_index([str(write_ranges(tmp_path))], str(tmp_path / 'index')) == 3
+
+    index = RangeIndex(str(tmp_path / 'index'))
+    assert len(index) == 3
+    assert index.line_offsets.tolist() == [0, 3, 6, 8]
+    assert index.from_hnr.tolist() == [2, 99, 5]
+    assert index.to_hnr.tolist() == [98, 1, 5]
+    assert index.steps.tolist() == [2, 2, 1]
+    assert index.measures[:3] == pytest.approx([0.0, 0.001, 0.001 + np.hypot(0.001, 0.0002)])
+    assert index.strings['zip4'][1] == '1234'
+
+def test_query_interpolated(tmp_path):
+    build_index([str(write_ranges(tmp_path))], str(tmp_path / 'index'))
+    index = RangeIndex(str(tmp_path / 'index'))
+
+    for range_id, points, from_hnr, to_hnr, interpolation in [(0, LEFT, 2, 98, 'even'), (1, RIGHT, 99, 1, 'odd')]:
+        expected = list(interpolated_points(points, from_hnr, to_hnr, interpolation))
+        result = index.query([lon for _hnr, lon, _lat in expected], [lat for _hnr, _lon, lat in expected])
+        assert result['range'].tolist() == [range_id] * len(expected)
+        assert result['housenumber'].tolist() == [hnr for hnr, _lon, _lat in expected]
+        assert result['distance'].max() < 1e-6
+
+def test_query_side(tmp_path):
+    build_index([str(write_ranges(tmp_path))], str(tmp_path / 'index'))
+    index = RangeIndex(str(tmp_path / 'index'))
+
+    # Houses set back 20 m north and south of the street, a third along it
+    offset = 20 / METERS_PER_DEGREE
+    north = index.lookup(-76.49933, 36.2 + offset)
+    south = index.lookup(-76.49933, 36.2 - offset)
+    assert (north['housenumber'], south['housenumber']) == ('34', '33A')
+    assert south['zip4'] == '1234'
+    assert abs(north['distance'] - (20 - 0.0001 * METERS_PER_DEGREE)) < 1e-6
+
+    # Ranges of a single number
+    assert index.lookup(-76.4895, 36.21)['housenumber'] == '5'
+
+def test_query_max_distance(tmp_path):
+    build_index([str(write_ranges(tmp_path))], str(tmp_path / 'index'))
+    index = RangeIndex(str(tmp_path / 'index'))
+
+    result = index.query([-76.499, -76.0], [36.2 + 300 / METERS_PER_DEGREE, 36.2])
+    assert result['range'].tolist() == [-1, -1]
+    assert result['housenumber'].tolist() == [-1, -1]
+    assert index.lookup(-76.499, 36.2 + 300 / METERS_PER_DEGREE) is None
+    assert index.query([-76.499], [36.2 + 300 / METERS_PER_DEGREE], max_distance=400)['range'].tolist() == [0]
+
+def test_query_matches_brute_force(tmp_path, monkeypatch):
+    rng = np.random.default_rng(0)
+    ranges = tmp_path / 'ranges.csv'
+    lines = []
+    with open(ranges, 'w', encoding='utf-8') as file:
+        file.write(HEADER)
+        for way in range(200):
+            start = rng.uniform([-76.6, 36.1], [-76.55, 36.15])
+            points = np.cumsum(np.vstack([start, rng.normal(0, 0.0005, (rng.integers(1, 6), 2))]), axis=0).round(6)
+            lines.append(points)
+            file.write('1;99;odd;0;0;Main St;C;Town;NC;27944;;%s;W%d\n' % (wkt(points), way))
+
+    build_index([str(ranges)], str(tmp_path / 'index'), cell_size=0.003)
+    index = RangeIndex(str(tmp_path / 'index'))
+
+    lon = rng.uniform(-76.61, -76.54, 500)
+    lat = rng.uniform(36.09, 36.16, 500)
+    # Several batches of points, compared in several parts each
+    monkeypatch.setattr(lib.reverse, 'MAX_CANDIDATES', 50)
+    result = index.query(lon, lat, max_distance=150, batch_size=120)
+
+    for i in range(len(lon)):
+        scale = np.cos(np.radians(lat[i])) * METERS_PER_DEGREE
+        distances = []
+        for points in lines:
+            a = (points[:-1] - [lon[i], lat[i]]) * [scale, METERS_PER_DEGREE]
+            d = np.diff(points, axis=0) * [scale, METERS_PER_DEGREE]
+            t = np.clip(-(a * d).sum(axis=1) / (d * d).sum(axis=1), 0, 1)
+            distances.append(np.hypot(*(a + t[:, None] * d).T).min())
+        nearest = int(np.argmin(distances))
+        if distances[nearest] > 150:
+            assert result['range'][i] == -1
+        else:
+            assert result['range'][i] == nearest
+            assert abs(result['distance'][i] - distances[nearest]) < 1e-6
+
+def test_query_csv(tmp_path):
+    build_index([str(write_ranges(tmp_path))], str(tmp_path / 'index'))
+    points = tmp_path / 'points.csv'
+    points.write_text('id,lon,lat\n1,-76.49933,36.20018\n2,-76.0,36.0\n')
+
+    found = query_csv(RangeIndex(str(tmp_path / 'index')), str(points), str(tmp_path / 'out.csv'), batch_size=1)
+    assert found == 1
+    with open(tmp_path / 'out.csv', encoding='utf-8') as file:
+        rows = list(csv.DictReader(file))
+    assert [row['id'] for row in rows] == ['1', '2']
+    assert (rows[0]['housenumber'], rows[0]['street'], rows[0]['postcode']) == ('34', 'Main St', '27944')
+    assert rows[1]['housenumber'] == '' and rows[1]['distance'] == ''
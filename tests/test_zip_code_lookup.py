@@ -0,0 +1,72 @@
+import pytest
+
+from lib.zip_code_lookup import ZipCodeLookup, is_snapshot
+
+ZIP_DB = ('zip,type,primary_city,acceptable_cities,unacceptable_cities,state,county\n'
+          '27944,STANDARD,Hertford,"Durants Neck, Winfall",,NC,Perquimans County\n'
+          '27946,STANDARD,,"Hobbsville, Gates",Sunbury,NC,Gates County\n'
+          '27919,STANDARD,Belvidere,,,NC,Perquimans County\n'
+          '27980,PO BOX,,,,NC,\n')
+
+@pytest.fixture
+def zip_db(tmp_path):
+    path = tmp_path / 'zip_db.csv'
+    path.write_text(ZIP_DB)
+    return str(path)
+
+def check_lookup(lookup):
+    assert lookup.get_primary_city('27944') == 'Hertford'
+    assert lookup.get_primary_city('27946') == ''
+    assert lookup.get_state('27946') == 'NC'
+    assert lookup.get_county('27944') == 'Perquimans County'
+    assert lookup.get_acceptable_cities('27944') == ['Durants Neck', 'Winfall']
+    assert lookup.get_unacceptable_cities('27946') == ['Sunbury']
+    assert lookup.get_unacceptable_cities('27944') == []
+
+    assert lookup.get_fallback_city('27944') == 'Hertford'
+    assert lookup.get_fallback_city('27946') == 'Hobbsville'
+    assert lookup.get_fallback_city('27980') is None
+    assert lookup.get_fallback_city('') is None
+
+    assert lookup.lookup('27919') == {
+        'zip': '27919',
+        'primary_city': 'Belvidere',
+        'acceptable_cities': '',
+        'unacceptable_cities': '',
+        'state': 'NC',
+        'county': 'Perquimans County'
+    }
+
+    for zip_code in ['00000', '27945', '99999', '2794', '279440']:
+        assert lookup.lookup(zip_code) is None
+        assert lookup.get_primary_city(zip_code) is None
+        assert lookup.get_fallback_city(zip_code) is None
+        assert lookup.get_acceptable_cities(zip_code) == []
+
+def test_csv_lookup(zip_db):
+    assert not is_snapshot(zip_db)
+    check_lookup(ZipCodeLookup(zip_db))
+
+def test_snapshot_lookup(zip_db, tmp_path):
+    snapshot = str(tmp_path / 'zip_db.snapshot')
+    ZipCodeLookup(zip_db).save_snapshot(snapshot)
+
+    assert is_snapshot(snapshot)
+    lookup = ZipCodeLookup(snapshot)
+    check_lookup(lookup)
+
+    # A snapshot of a snapshot is the same file
+    copy = str(tmp_path / 'copy.snapshot')
+    lookup.save_snapshot(copy)
+    with open(snapshot, 'rb') as a, open(copy, 'rb') as b:
+        assert a.read() == b.read()
+
+def test_snapshot_skips_invalid_zip(tmp_path):
+    path = tmp_path / 'zip_db.csv'
+    path.write_text('zip,primary_city\n27944,Hertford\n1234,Nowhere\n')
+    snapshot = str(tmp_path / 'zip_db.snapshot')
+    assert ZipCodeLookup(str(path)).save_snapshot(snapshot) == 1
+
+    lookup = ZipCodeLookup(snapshot)
+    assert lookup.get_primary_city('27944') == 'Hertford'
+    assert lookup.lookup('1234') is None
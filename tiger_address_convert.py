@@ -10,61 +10,38 @@ BUGS:
 - It would be nice if the ends of the address ways were not pulled back from dead ends
 """
 
-import os
-import sys
-import csv
-
-from lib.parse import parse_shp_for_geom_and_tags
-from lib.convert import addressways, compile_nodelist, compile_waylist
+from lib.pipeline import convert_file, ZIP_CODE_FILE
+from lib.output import WRITERS
 from lib.zip_code_lookup import ZipCodeLookup
 
-def write_to_csv(file_name, generator, headers):
-    """
-    Write results from a generator to a CSV file.
-    
-    Parameters:
-    - file_name: The CSV file to write to.
-    - generator: A generator yielding rows of data (as dictionaries).
-    - headers: A list of column headers for the CSV file.
-    """
-    with open(file_name, mode='w', encoding='utf-8') as csvfile:
-        writer = csv.DictWriter(csvfile, delimiter=';', fieldnames=headers)
-        writer.writeheader()
-        for rows in generator:
-            writer.writerow(rows)
-
-def shape_to_hnr_csv(shp_filename, csv_filename):
+def shape_to_hnr_csv(shp_filename, csv_filename, identity_tolerance=None, vectorized=False, use_arrow=False,
+                     output_format='csv', profile_file=None):
     """
     Main feature: reads a file, writes a file
     """
-    print("parsing shpfile %s" % shp_filename)
-    parsed_features = parse_shp_for_geom_and_tags(shp_filename)
-
-    i , nodelist = compile_nodelist(parsed_features)
-
-    waylist = compile_waylist(parsed_features)
-
-    current_file_dir = os.path.dirname(os.path.abspath(__file__))
-
-    zip_code_file = os.path.join(current_file_dir, "zip_db.csv")
-    
-    print("writing %s" % csv_filename)
-    fieldnames = [
-        'hnr',
-        'lat',
-        'lon',
-        'street',
-        'county',
-        'city',
-        'state',
-        'postcode',
-        'zip4',
-    ]
-
-    write_to_csv(csv_filename, addressways(waylist, nodelist, i, ZipCodeLookup(zip_code_file), False), fieldnames)
-
-if len(sys.argv) < 3:
-    print("%s input.shp output.csv" % sys.argv[0])
-    sys.exit()
-
-shape_to_hnr_csv(sys.argv[1], sys.argv[2])
+    convert_file(shp_filename, csv_filename, ZipCodeLookup(ZIP_CODE_FILE), False,
+                 identity_tolerance, vectorized, use_arrow, output_format, profile_file=profile_file)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert a TIGER EDGES shapefile into a CSV of interpolated house numbers.")
+    parser.add_argument('input_file', help="Input shapefile or zip archive path")
+    parser.add_argument('output_file', help="Output file path")
+    parser.add_argument('--identity-tolerance', type=float, metavar='DEGREES',
+                        help="Skip the NAD83 to WGS84 transformation if a sample of "
+                             "the nodes moves less than this")
+    parser.add_argument('--vectorized', action='store_true',
+                        help="Calculate the address ways with NumPy array operations")
+    parser.add_argument('--arrow', action='store_true',
+                        help="Read the shapefile in column batches through OGR's Arrow "
+                             "stream interface (GDAL >= 3.6)")
+    parser.add_argument('--format', choices=sorted(WRITERS), default='csv',
+                        help="Output format, parquet needs pyarrow (default: %(default)s)")
+    parser.add_argument('--profile', metavar='FILE',
+                        help="Write the wall time, throughput and peak memory of every stage "
+                             "of the conversion to FILE as JSON")
+    args = parser.parse_args()
+
+    shape_to_hnr_csv(args.input_file, args.output_file, args.identity_tolerance, args.vectorized, args.arrow,
+                     args.format, args.profile)
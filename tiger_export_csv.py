@@ -0,0 +1,18 @@
+#!/usr/bin/python3
+
+"""
+Exports a Parquet file written with --format parquet as the CSV file
+Nominatim imports.
+"""
+
+from lib.output import export_parquet_to_csv
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export a Parquet file of house numbers or address ranges as CSV.")
+    parser.add_argument('input_file', help="Input Parquet file path")
+    parser.add_argument('output_file', help="Output CSV file path")
+    args = parser.parse_args()
+
+    export_parquet_to_csv(args.input_file, args.output_file)
@@ -0,0 +1,60 @@
+#!/usr/bin/python3
+
+"""
+Converts all TIGER EDGES files of a directory in one process pool.
+
+Each worker process loads GDAL and the ZIP code database once and then
+converts counties until none are left, largest files first.
+"""
+
+import sys
+
+from lib.pipeline import convert_all, ZIP_CODE_FILE
+from lib.output import WRITERS, GEOMETRY_ENCODERS
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert a directory of TIGER EDGES files into CSV or Parquet files.")
+    parser.add_argument('input_dir', help="Directory with the TIGER zip archives or shapefiles")
+    parser.add_argument('output_dir', help="Directory for the output files")
+    parser.add_argument('--ranges', action='store_true',
+                        help="Write address ranges (like tiger_address_range_convert.py) "
+                             "instead of interpolated house numbers")
+    parser.add_argument('--workers', type=int,
+                        help="Number of worker processes (default: number of CPUs)")
+    parser.add_argument('--zip-db', default=ZIP_CODE_FILE,
+                        help="ZIP code database, CSV or a snapshot written by "
+                             "'python3 -m lib.zip_code_lookup' (default: %(default)s)")
+    parser.add_argument('--identity-tolerance', type=float, metavar='DEGREES',
+                        help="Skip the NAD83 to WGS84 transformation if a sample of "
+                             "the nodes moves less than this")
+    parser.add_argument('--vectorized', action='store_true',
+                        help="Calculate the address ways with NumPy array operations")
+    parser.add_argument('--arrow', action='store_true',
+                        help="Read the shapefiles in column batches through OGR's Arrow "
+                             "stream interface (GDAL >= 3.6)")
+    parser.add_argument('--format', choices=sorted(WRITERS), default='csv',
+                        help="Output format, parquet needs pyarrow (default: %(default)s)")
+    parser.add_argument('--geometry', choices=sorted(GEOMETRY_ENCODERS),
+                        help="Encoding of the geometry column of ranges (default: wkt, "
+                             "ewkb for copy). Nominatim only reads WKT.")
+    parser.add_argument('--state-dir',
+                        help="Convert incrementally: keep the state of every county in this "
+                             "directory, only convert the ways that changed since the last run "
+                             "with it and write a .delta file per county")
+    parser.add_argument('--profile-dir',
+                        help="Write the wall time, throughput and peak memory of every stage "
+                             "as JSON per county to this directory, and a summary of all "
+                             "counties to summary.json")
+    args = parser.parse_args()
+
+    failed = convert_all(args.input_dir, args.output_dir, args.ranges, args.workers, args.zip_db,
+                         state_dir=args.state_dir,
+                         profile_dir=args.profile_dir,
+                         identity_tolerance=args.identity_tolerance,
+                         vectorized=args.vectorized,
+                         use_arrow=args.arrow,
+                         output_format=args.format,
+                         geometry_format=args.geometry)
+    sys.exit(1 if failed else 0)